@@ -0,0 +1,129 @@
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings in the order they are preferred at the same quality.
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def accepted_encodings(request):
+    """Return {content coding: quality} from Accept-Encoding."""
+    accepted = {}
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(request, encodings=ENCODINGS):
+    """The coding of encodings the client prefers, or None."""
+    accepted = accepted_encodings(request)
+    ranked = [(accepted.get(coding, accepted.get('*', 0.0)), -order, coding)
+              for order, coding in enumerate(encodings)]
+    quality, _, coding = max(ranked, default=(0.0, 0, None))
+    return coding if quality > 0 else None
+
+
+def compress(content, coding, level):
+    if coding == 'br':
+        return brotli.compress(content, quality=level)
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def decompress(content, coding):
+    if coding == 'br':
+        return brotli.decompress(content)
+    if coding == 'gzip':
+        return gzip.decompress(content)
+    return content
+
+
+def compressible(response):
+    """Whether a body of this type and size is worth compressing."""
+    content_type = response.get('Content-Type', '').split(';')[0].strip()
+    return (not response.streaming
+            and not response.has_header('Content-Encoding')
+            and content_type in settings.COMPRESSION_TYPES
+            and len(response.content) >= settings.COMPRESSION_MIN_SIZE)
+
+
+def encode(response, content, coding):
+    """Replace the body of response with content in coding.
+
+    A strong ETag is made weak as the body is no longer the same byte
+    for byte, as in django.middleware.gzip.GZipMiddleware.
+    """
+    response.content = content
+    response['Content-Length'] = str(len(content))
+    response['Content-Encoding'] = coding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = f'W/{etag}'
+
+
+def precompress(response):
+    """Return {coding: body} of the compressed variants to store with
+    the body of response, compressed once at COMPRESSION_STORED_LEVELS;
+    variants no smaller than the body are left out."""
+    if not compressible(response):
+        return {}
+    variants = {coding: compress(response.content, coding,
+                                 settings.COMPRESSION_STORED_LEVELS[coding])
+                for coding in ENCODINGS}
+    return {coding: content for coding, content in variants.items()
+            if len(content) < len(response.content)}
+
+
+def use_variant(request, response, variants):
+    """Answer with the stored variant the client prefers, if any."""
+    if not variants:
+        return
+    patch_vary_headers(response, ('Accept-Encoding',))
+    coding = choose_encoding(request, [coding for coding in ('br', 'gzip')
+                                       if coding in variants])
+    if coding is not None:
+        encode(response, variants[coding], coding)
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip by Accept-Encoding.
+
+    Only bodies of COMPRESSION_TYPES of at least COMPRESSION_MIN_SIZE
+    bytes are compressed, at COMPRESSION_LEVELS. Streaming responses,
+    the shopping list downloads, and responses already encoded, such as
+    the precompressed reference data, are passed as they are. Brotli
+    is used when the brotli package is installed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = choose_encoding(request)
+        if coding is None:
+            return response
+        content = compress(response.content, coding,
+                           settings.COMPRESSION_LEVELS[coding])
+        if len(content) < len(response.content):
+            encode(response, content, coding)
+        return response
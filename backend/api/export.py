@@ -0,0 +1,304 @@
+import csv
+import json
+import os
+import re
+import struct
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+SHOPPING_LIST_FILENAME = 'shopping_list'
+
+
+class Echo:
+    """File-like object that hands back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+class TextRenderer:
+    """Plain text shopping list, one ingredient per line."""
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def render(self, rows):
+        for name, unit, amount in rows:
+            yield f'{name} : {amount} {unit}\n'
+
+
+class CsvRenderer(TextRenderer):
+    """Shopping list as CSV with a header row."""
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def render(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class JsonRenderer(TextRenderer):
+    """Shopping list as a JSON array written item by item."""
+    extension = 'json'
+    content_type = 'application/json'
+
+    def render(self, rows):
+        separator = '['
+        for name, unit, amount in rows:
+            yield separator + json.dumps(
+                {'name': name, 'measurement_unit': unit, 'amount': amount},
+                ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+class PdfRenderer(TextRenderer):
+    """Shopping list as PDF written page by page.
+
+    Only the current page and the object offsets are kept in memory.
+    Text is set in the TrueType font from SHOPPING_LIST_PDF_FONT,
+    embedded as is with the width of every glyph it uses, and addressed
+    through cp1251 so Cyrillic names come out right.
+    """
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    title = 'Список покупок'
+    encoding = 'cp1251'
+    page_width = 595
+    page_height = 842
+    margin = 50
+    font_size = 11
+    leading = 16
+    chunk_size = 64 * 1024
+
+    @classmethod
+    def available(cls):
+        return os.path.isfile(settings.SHOPPING_LIST_PDF_FONT)
+
+    def render(self, rows):
+        self.offset = 0
+        self.offsets = {}
+        pages = []
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        yield self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield from self.write_font(font_path, first=3)
+        next_number = 8
+        lines_per_page = (
+            (self.page_height - 2 * self.margin) // self.leading)
+        lines = [self.title, '']
+        for name, unit, amount in rows:
+            lines.append(f'{name} ({unit}) — {amount:g}')
+            if len(lines) == lines_per_page:
+                yield from self.write_page(next_number, lines)
+                pages.append(next_number + 1)
+                next_number += 2
+                lines = []
+        if lines or not pages:
+            yield from self.write_page(next_number, lines)
+            pages.append(next_number + 1)
+            next_number += 2
+        kids = b' '.join(b'%d 0 R' % number for number in pages)
+        yield self.write_object(
+            2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                kids, len(pages)))
+        yield self.write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        yield self.write_xref(next_number)
+
+    def write(self, data):
+        self.offset += len(data)
+        return data
+
+    def write_object(self, number, body):
+        self.offsets[number] = self.offset
+        return self.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def write_stream(self, number, content):
+        return self.write_object(
+            number, b'<< /Length %d >>\nstream\n%s\nendstream' % (
+                len(content), content))
+
+    def write_font(self, path, first):
+        """Write the font with its descriptor, encoding and file."""
+        base_font = re.sub(
+            r'[^A-Za-z0-9-]', '',
+            os.path.splitext(os.path.basename(path))[0]).encode()
+        chars = {}
+        for code in range(32, 256):
+            try:
+                chars[code] = ord(bytes([code]).decode(self.encoding))
+            except UnicodeDecodeError:
+                continue
+        differences = [b'%d /uni%04X' % (code, char)
+                       for code, char in chars.items() if code >= 128]
+        metrics = font_metrics(path, chars.values())
+        widths = b' '.join(
+            b'%d' % metrics['widths'].get(chars.get(code), 0)
+            for code in range(32, 256))
+        fixed_pitch = len(set(metrics['widths'].values())) == 1
+        yield self.write_object(first, (
+            b'<< /Type /Font /Subtype /TrueType /BaseFont /%s '
+            b'/FirstChar 32 /LastChar 255 /Widths [%s] '
+            b'/FontDescriptor %d 0 R /Encoding %d 0 R '
+            b'/ToUnicode %d 0 R >>') % (
+                base_font, widths, first + 1, first + 2, first + 4))
+        yield self.write_object(first + 1, (
+            b'<< /Type /FontDescriptor /FontName /%s /Flags %d '
+            b'/FontBBox [%d %d %d %d] /ItalicAngle 0 /Ascent %d '
+            b'/Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>') % (
+                base_font, 32 | fixed_pitch, *metrics['bbox'],
+                metrics['ascent'], metrics['descent'], metrics['ascent'],
+                first + 3))
+        yield self.write_object(first + 2, (
+            b'<< /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            b'/Differences [%s] >>') % b' '.join(differences))
+        size = os.path.getsize(path)
+        self.offsets[first + 3] = self.offset
+        yield self.write(
+            b'%d 0 obj\n<< /Length %d /Length1 %d >>\nstream\n' % (
+                first + 3, size, size))
+        with open(path, 'rb') as font:
+            for chunk in iter(lambda: font.read(self.chunk_size), b''):
+                yield self.write(chunk)
+        yield self.write(b'\nendstream\nendobj\n')
+        yield self.write_stream(first + 4, to_unicode_cmap(chars))
+
+    def write_page(self, number, lines):
+        """Write a content stream and the page object that shows it."""
+        content = [b'BT /F1 %d Tf %d TL %d %d Td' % (
+            self.font_size, self.leading, self.margin,
+            self.page_height - self.margin)]
+        for line in lines:
+            text = line.encode(self.encoding, 'replace')
+            text = text.replace(b'\\', b'\\\\').replace(
+                b'(', b'\\(').replace(b')', b'\\)')
+            content.append(b'(%s) Tj T*' % text)
+        content.append(b'ET')
+        yield self.write_stream(number, b'\n'.join(content))
+        yield self.write_object(number + 1, (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>') % (
+                self.page_width, self.page_height, number))
+
+    def write_xref(self, size):
+        xref = [b'xref\n0 %d\n0000000000 65535 f \n' % size]
+        for number in range(1, size):
+            xref.append(b'%010d 00000 n \n' % self.offsets[number])
+        xref.append(b'trailer\n<< /Size %d /Root 1 0 R >>\n'
+                    b'startxref\n%d\n%%%%EOF\n' % (size, self.offset))
+        return b''.join(xref)
+
+
+def font_metrics(path, chars):
+    """Read the metrics PdfRenderer needs from a TrueType font.
+
+    Widths are those of the glyphs the chars, Unicode code points, map
+    to through the font's format 4 cmap; chars it lacks get the width
+    of the missing glyph.
+    """
+    with open(path, 'rb') as font:
+        num_tables, = struct.unpack('>H', font.read(12)[4:6])
+        directory = font.read(16 * num_tables)
+        tables = {}
+        for index in range(num_tables):
+            tag, _, offset, length = struct.unpack(
+                '>4sIII', directory[index * 16:index * 16 + 16])
+            tables[tag] = offset
+
+        def read(tag, start, fmt):
+            font.seek(tables[tag] + start)
+            return struct.unpack(fmt, font.read(struct.calcsize(fmt)))
+
+        units, = read(b'head', 18, '>H')
+        bbox = read(b'head', 36, '>hhhh')
+        ascent, descent = read(b'hhea', 4, '>hh')
+        metrics_count, = read(b'hhea', 34, '>H')
+        advances = read(b'hmtx', 0, '>%dH' % (2 * metrics_count))[::2]
+        glyphs = read_cmap(font, tables[b'cmap'])
+    scale = 1000 / units
+    return {
+        'bbox': [round(value * scale) for value in bbox],
+        'ascent': round(ascent * scale),
+        'descent': round(descent * scale),
+        'widths': {char: round(advances[min(
+            glyphs(char), metrics_count - 1)] * scale) for char in chars},
+    }
+
+
+def read_cmap(font, offset):
+    """Return a lookup from code point to glyph id of the Unicode BMP
+    cmap subtable; every char maps to the missing glyph without one."""
+    font.seek(offset)
+    _, count = struct.unpack('>HH', font.read(4))
+    records = [struct.unpack('>HHI', font.read(8)) for _ in range(count)]
+    for platform, encoding, start in records:
+        if (platform, encoding) not in ((3, 1), (0, 3)):
+            continue
+        font.seek(offset + start)
+        table_format, length = struct.unpack('>HH', font.read(4))
+        if table_format == 4:
+            return format4_lookup(font.read(length - 4))
+    return lambda char: 0
+
+
+def format4_lookup(data):
+    """Glyph lookup over a format 4 cmap subtable, after its first two
+    fields."""
+    segments = struct.unpack('>H', data[2:4])[0] // 2
+    words = struct.unpack('>%dH' % ((len(data) - 12) // 2), data[12:])
+    ends = words[:segments]
+    starts = words[segments + 1:2 * segments + 1]
+    deltas = words[2 * segments + 1:3 * segments + 1]
+    range_start = 3 * segments + 1
+    ranges = words[range_start:range_start + segments]
+
+    def glyph(char):
+        index = bisect_left(ends, char)
+        if index == segments or starts[index] > char:
+            return 0
+        if not ranges[index]:
+            return (char + deltas[index]) & 0xffff
+        position = (range_start + index + ranges[index] // 2
+                    + char - starts[index])
+        if position >= len(words) or not words[position]:
+            return 0
+        return (words[position] + deltas[index]) & 0xffff
+    return glyph
+
+
+def to_unicode_cmap(chars):
+    """Build a ToUnicode CMap so PDF text can be copied and searched."""
+    entries = [b'<%02X> <%04X>' % item for item in chars.items()]
+    blocks = []
+    for start in range(0, len(entries), 100):
+        block = entries[start:start + 100]
+        blocks.append(b'%d beginbfchar\n%s\nendbfchar' % (
+            len(block), b'\n'.join(block)))
+    return (
+        b'/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n'
+        b'/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+        b'/Supplement 0 >> def\n/CMapName /Adobe-Identity-UCS def\n'
+        b'/CMapType 2 def\n1 begincodespacerange\n<00> <FF>\n'
+        b'endcodespacerange\n%s\nendcmap\n'
+        b'CMapName currentdict /CMap defineresource pop\nend\nend'
+    ) % b'\n'.join(blocks)
+
+
+RENDERERS = {renderer.extension: renderer for renderer in (
+    TextRenderer, CsvRenderer, JsonRenderer, PdfRenderer)}
+
+
+def shopping_list_response(rows, renderer_class):
+    """Stream the shopping list rows through the given renderer."""
+    response = StreamingHttpResponse(
+        renderer_class().render(rows),
+        content_type=renderer_class.content_type)
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+        SHOPPING_LIST_FILENAME, renderer_class.extension)
+    return response
@@ -1,20 +1,34 @@
-from app.models import Ingredient, Recipe, Tag
+from app.models import Ingredient, Recipe
+from app.search import search_recipes
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Case, IntegerField, When
 from django_filters import rest_framework as filters
 
+from .function import tag_slugs
+
 User = get_user_model()
 
+ORDERINGS = (
+    ('-pub_date', 'Сначала новые'),
+    ('-favorites_count', 'Сначала популярные'),
+)
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_slugs()]
+
 
 class FilterForRecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart')
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug', to_field_name='slug',
-    )
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='get_tags')
     author = filters.CharFilter(lookup_expr='exact')
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(choices=ORDERINGS, method='get_ordering')
 
     class Meta:
         model = Recipe
@@ -22,9 +36,34 @@ class FilterForRecipeFilter(filters.FilterSet):
             'is_favorited',
             'is_in_shopping_cart',
             'tags',
-            'author'
+            'author',
+            'search',
+            'ordering'
         )
 
+    def get_search(self, queryset, field_name, value):
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, field_name, value):
+        """Order by the chosen field, newest first among equals."""
+        return queryset.order_by(*dict.fromkeys((value, '-pub_date', '-id')))
+
+    def get_tags(self, queryset, field_name, value):
+        """Recipes with any of the tags, as an IN semi-join.
+
+        Django 2.2 filters on Exists() only through an annotation,
+        which PostgreSQL runs as a hashed subplan over every tagged
+        recipe; an IN subquery is planned as a semi-join that stops at
+        the page limit and never duplicates a recipe. Slugs of tags
+        deleted since the choices were read match nothing.
+        """
+        if not value:
+            return queryset
+        slugs = tag_slugs()
+        return queryset.filter(pk__in=Recipe.tags.through.objects.filter(
+            tag_id__in=[slugs[slug] for slug in value if slug in slugs]
+        ).values('recipe_id'))
+
     def get_is_favorited(self, queryset, field_name, value):
         if field_name == 'is_favorited' and value is not None:
             queryset = queryset.filter(
@@ -41,8 +80,22 @@ class FilterForRecipeFilter(filters.FilterSet):
 
 
 class FilterForIngredients(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
+    measurement_unit = filters.CharFilter(lookup_expr='exact')
+    name = filters.CharFilter(method='get_autocomplete')
 
     class Meta:
         model = Ingredient
         fields = ('name', 'measurement_unit')
+
+    def get_autocomplete(self, queryset, field_name, value):
+        """Prefix matches first, then substring matches, capped."""
+        limit = settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+        ids = list(queryset.filter(name__istartswith=value).order_by(
+            'name').values_list('pk', flat=True)[:limit])
+        if len(ids) < limit and len(value) >= 3:
+            ids += queryset.filter(name__icontains=value).exclude(
+                name__istartswith=value).order_by('name').values_list(
+                    'pk', flat=True)[:limit - len(ids)]
+        return queryset.filter(pk__in=ids).order_by(Case(
+            *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+            output_field=IntegerField()))
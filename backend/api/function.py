@@ -1,32 +1,49 @@
-from app.models import Download, Favorite, Follow
-from django.contrib.auth import get_user_model
+from app.models import IngredientForRecipe, Recipe, Tag
+from app.relations import get_relations
+from app.versions import current_version
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Prefetch, Subquery
 from rest_framework import serializers
 
-User = get_user_model()
+
+def user_relations(request):
+    """Relation sets of the request user, loaded once per request."""
+    relations = getattr(request, 'user_relations', None)
+    if relations is None:
+        relations = request.user_relations = get_relations(request.user)
+    return relations
 
 
 def get_subscribed(self, obj):
     """Method to get subscribers."""
-    user = self.context.get('request').user
-    if user.is_anonymous:
-        return False
-    return Follow.objects.filter(author=obj, user=user).exists()
+    return obj.pk in user_relations(self.context.get('request')).follows
 
 
 def get_favorited(self, obj):
     """ Get favorite recipe."""
-    user = self.context.get('request').user
-    if user.is_anonymous:
-        return False
-    return Favorite.objects.filter(recipe=obj, user=user).exists()
+    return obj.pk in user_relations(self.context.get('request')).favorites
 
 
 def get_shopping_cart(self, obj):
     """ Get get recipe in shopping cart."""
-    user = self.context.get('request').user
-    if user.is_anonymous:
-        return False
-    return Download.objects.filter(recipe=obj, user=user).exists()
+    return obj.pk in user_relations(self.context.get('request')).cart
+
+
+def recipe_rendition(view):
+    """Feed cards in lists, the detail rendition everywhere else."""
+    action = getattr(view, 'action', None)
+    return 'card' if action in ('list', 'feed', 'what_to_cook') else 'detail'
+
+
+def tag_slugs():
+    """Map tag slugs to ids, cached until a tag changes."""
+    key = f'tag_slugs:{current_version(Tag)}'
+    slugs = cache.get(key)
+    if slugs is None:
+        slugs = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, slugs, settings.REFERENCE_CACHE_TIMEOUT)
+    return slugs
 
 
 def val_cooking_time(self, cooking_time):
@@ -35,3 +52,36 @@ def val_cooking_time(self, cooking_time):
         raise serializers.ValidationError("Время приготовления должно"
                                           " быть от 1 минуты")
     return cooking_time
+
+
+def annotate_recipes(queryset):
+    """Preload author, tags and ingredients for recipes.
+
+    The per-user flags come from the cached relation sets, so the
+    queryset is the same for every user.
+    """
+    return queryset.prefetch_related(
+        'author',
+        'tags',
+        Prefetch('ingredients_recipe',
+                 queryset=IngredientForRecipe.objects.select_related(
+                     'ingredient')))
+
+
+def annotate_follows(queryset, recipes_limit=None):
+    """Preload recipe counts and the latest recipes of followed authors.
+
+    The prefetch reads the recipes of the authors on the page only, and
+    keeps those among the latest recipes_limit of their author, so the
+    page takes one query for recipes whatever the value of the limit.
+    """
+    recipes = Recipe.objects.all()
+    if recipes_limit is not None:
+        latest = Recipe.objects.filter(
+            author_id=OuterRef('author_id')
+        ).order_by('-pub_date', '-id').values('id')[:recipes_limit]
+        recipes = recipes.filter(id__in=Subquery(latest))
+    return queryset.annotate(
+        recipes_count=Count('recipes')
+    ).prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='recipes_preview'))
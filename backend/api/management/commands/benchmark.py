@@ -0,0 +1,278 @@
+import base64
+import io
+import json
+import math
+import random
+import statistics
+import time
+
+from api.compression import decompress
+from app.models import Download, Follow, Ingredient, Recipe, Tag
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+# Name, method, URL; names ending in .anonymous are sent without a user.
+SCENARIOS = (
+    ('recipes', 'get', '/api/recipes/'),
+    ('recipes.anonymous', 'get', '/api/recipes/'),
+    ('recipes.cursor', 'get', '/api/recipes/?pagination=cursor'),
+    ('recipes.tags', 'get', '/api/recipes/?tags={tag}'),
+    ('recipes.author', 'get', '/api/recipes/?author={author}'),
+    ('recipes.favorited', 'get', '/api/recipes/?is_favorited=1'),
+    ('recipes.in_cart', 'get', '/api/recipes/?is_in_shopping_cart=1'),
+    ('recipes.search', 'get', '/api/recipes/?search={word}'),
+    ('recipe', 'get', '/api/recipes/{recipe}/'),
+    ('recipe.anonymous', 'get', '/api/recipes/{recipe}/'),
+    ('feed', 'get', '/api/recipes/feed/'),
+    ('subscriptions', 'get', '/api/users/subscriptions/?recipes_limit=3'),
+    ('download_shopping_cart', 'get', '/api/recipes/download_shopping_cart/'),
+    ('ingredients.autocomplete', 'get', '/api/ingredients/?name={prefix}'),
+    ('ingredients', 'get', '/api/ingredients/'),
+    ('tags', 'get', '/api/tags/'),
+    ('recipe.create', 'post', '/api/recipes/'),
+    ('recipe.update', 'patch', '/api/recipes/{own_recipe}/'),
+)
+SAMPLE_SIZE = 100
+INGREDIENTS_PER_PAYLOAD = 10
+
+
+def nearest_rank(samples, share):
+    """Percentile of sorted samples by the nearest-rank method."""
+    return samples[max(math.ceil(len(samples) * share) - 1, 0)]
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+def test_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (220, 120, 40)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class Command(BaseCommand):
+    help = ('Measure the main API endpoints on the current database and '
+            'write p50/p95/p99 latency, queries and bytes on the wire per '
+            'request to a JSON file, optionally compared with an earlier '
+            'run. Writes are rolled back, so runs repeat on the same data; '
+            'seed it with seed_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--user', type=int,
+                            help='Id of the user to send requests as; by '
+                                 'default someone with recipes, follows '
+                                 'and a shopping cart.')
+        parser.add_argument('--only', action='append',
+                            choices=[name for name, _, _ in SCENARIOS],
+                            help='Scenario to run; repeatable.')
+        parser.add_argument('--clear-cache', action='store_true',
+                            help='Clear the cache before every request to '
+                                 'measure the uncached path.')
+        parser.add_argument('--accept-encoding', default='br, gzip',
+                            help='Accept-Encoding of every request; empty '
+                                 'for uncompressed responses.')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', metavar='BASELINE',
+                            help='JSON file of an earlier run to compare '
+                                 'with.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.user = self.get_user(options['user'])
+        self.params = self.get_params()
+        self.image = test_image()
+        results = {}
+        for name, method, url in SCENARIOS:
+            if options['only'] and name not in options['only']:
+                continue
+            results[name] = self.measure(name, method, url, options)
+            self.report(name, results[name])
+        report = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': {model._meta.model_name: model.objects.count()
+                        for model in (User, Recipe, Ingredient, Follow)},
+            'options': {key: options[key] for key in (
+                'repeat', 'warmup', 'seed', 'clear_cache',
+                'accept_encoding')},
+            'user': self.user.pk,
+            'scenarios': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def get_user(self, pk):
+        if pk is not None:
+            user = User.objects.filter(pk=pk).first()
+        else:
+            user = User.objects.annotate(
+                follows=Exists(Follow.objects.filter(user=OuterRef('pk'))),
+                cart=Exists(Download.objects.filter(user=OuterRef('pk'))),
+                authored=Exists(Recipe.objects.filter(
+                    author=OuterRef('pk'))),
+            ).filter(follows=True, cart=True, authored=True).order_by(
+                'pk').first() or User.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError('Нет данных: заполните базу (seed_data)')
+        return user
+
+    def get_params(self):
+        """Values for the URL templates; recipes and prefixes rotate."""
+        recipes = list(Recipe.objects.order_by('-pk').values_list(
+            'pk', flat=True)[:SAMPLE_SIZE * 10])
+        ingredients = list(Ingredient.objects.order_by('pk').values_list(
+            'pk', 'name')[:SAMPLE_SIZE * 10])
+        tags = list(Tag.objects.values_list('pk', 'slug'))
+        own = Recipe.objects.filter(author=self.user).values_list(
+            'pk', flat=True).first()
+        if not recipes or not ingredients or not tags or own is None:
+            raise CommandError('Нет данных: заполните базу (seed_data)')
+        author = Recipe.objects.values('author').annotate(
+            count=Count('pk')).order_by('-count').values_list(
+                'author', flat=True).first()
+        return {
+            'recipes': self.rng.sample(recipes, min(len(recipes),
+                                                    SAMPLE_SIZE)),
+            'ingredients': ingredients,
+            'tags': tags,
+            'own_recipe': own,
+            'author': author,
+            'word': ingredients[0][1].split()[0],
+        }
+
+    def url(self, template):
+        params = self.params
+        return template.format(
+            recipe=self.rng.choice(params['recipes']),
+            prefix=self.rng.choice(params['ingredients'])[1][:3],
+            tag=self.rng.choice(params['tags'])[1],
+            own_recipe=params['own_recipe'],
+            author=params['author'],
+            word=params['word'])
+
+    def payload(self):
+        ingredients = self.rng.sample(self.params['ingredients'], min(
+            INGREDIENTS_PER_PAYLOAD, len(self.params['ingredients'])))
+        return {
+            'name': f'тест {self.rng.randint(1, 10 ** 6)}',
+            'text': 'Тестовый рецепт',
+            'cooking_time': self.rng.randint(5, 120),
+            'image': self.image,
+            'tags': [pk for pk, _ in self.rng.sample(
+                self.params['tags'], 1)],
+            'ingredients': [{'id': pk, 'amount': self.rng.randint(1, 500)}
+                            for pk, _ in ingredients],
+        }
+
+    def send(self, client, method, template):
+        """Send a request; writes are rolled back once it is answered."""
+        url = self.url(template)
+        send = getattr(client, method)
+        if method == 'get':
+            started = time.perf_counter()
+            response = send(url)
+            return response, time.perf_counter() - started
+        with transaction.atomic():
+            started = time.perf_counter()
+            response = send(url, self.payload(), format='json')
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return response, elapsed
+
+    def measure(self, name, method, template, options):
+        client = APIClient(HTTP_ACCEPT_ENCODING=options['accept_encoding'])
+        if not name.endswith('.anonymous'):
+            client.force_authenticate(self.user)
+        timings, queries, phases = [], [], {}
+        sizes = {'bytes': [], 'raw_bytes': []}
+        first = None
+        for number in range(options['warmup'] + options['repeat']):
+            if options['clear_cache']:
+                cache.clear()
+            response, elapsed = self.send(client, method, template)
+            if response.status_code >= 400:
+                raise CommandError(f'{name}: HTTP {response.status_code} '
+                                   f'{response.content[:200]}')
+            first = elapsed if first is None else first
+            if number < options['warmup']:
+                continue
+            timings.append(elapsed)
+            content = response.getvalue()
+            sizes['bytes'].append(len(content))
+            sizes['raw_bytes'].append(len(decompress(
+                content, response.get('Content-Encoding'))))
+            profile = getattr(response.wsgi_request, 'profile', None)
+            if profile is not None:
+                queries.append(profile.queries)
+                for phase, seconds in (('db', profile.db),
+                                       *profile.phases.items()):
+                    phases.setdefault(phase, []).append(seconds)
+        return self.summary(method, template, response, first, timings,
+                            queries, phases, sizes)
+
+    @staticmethod
+    def summary(method, template, response, first, timings, queries,
+                phases, sizes):
+        ordered = sorted(timings)
+        return {
+            'method': method.upper(),
+            'url': template,
+            'status': response.status_code,
+            'requests': len(timings),
+            'first_ms': milliseconds(first),
+            'mean_ms': milliseconds(statistics.mean(timings)),
+            **{f'p{round(share * 100)}_ms':
+               milliseconds(nearest_rank(ordered, share))
+               for share in (0.5, 0.95, 0.99)},
+            'max_ms': milliseconds(ordered[-1]),
+            'queries': statistics.mean(queries) if queries else None,
+            'max_queries': max(queries, default=None),
+            **{name: round(statistics.mean(values))
+               for name, values in sizes.items()},
+            **{f'{phase}_ms': milliseconds(statistics.mean(seconds))
+               for phase, seconds in phases.items()},
+        }
+
+    def report(self, name, result):
+        queries = result['queries']
+        self.stdout.write(
+            f'{name:26} p50 {result["p50_ms"]:8.1f} мс  '
+            f'p95 {result["p95_ms"]:8.1f} мс  '
+            f'p99 {result["p99_ms"]:8.1f} мс  '
+            f'первый {result["first_ms"]:8.1f} мс  '
+            f'запросов {"-" if queries is None else f"{queries:.1f}"}  '
+            f'байт {result["bytes"]} из {result["raw_bytes"]}')
+
+    def compare(self, path, results):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)['scenarios']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        self.stdout.write(f'Сравнение с {path}:')
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            changes = '  '.join(
+                f'{field} {before[field]:.1f} → {result[field]:.1f} '
+                f'({(result[field] / before[field] - 1) * 100:+.0f}%)'
+                for field in ('p50_ms', 'p95_ms', 'queries', 'bytes')
+                if before.get(field) and result.get(field) is not None)
+            self.stdout.write(f'{name:26} {changes}')
@@ -0,0 +1,135 @@
+import random
+import statistics
+import time
+
+from app.models import Ingredient, IngredientForRecipe, Recipe, Tag
+from app.search import index_recipes
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import urlencode
+from rest_framework import status
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+DISHES = ('суп', 'салат', 'пирог', 'запеканка', 'рагу', 'омлет', 'паста',
+          'каша', 'котлеты', 'блины', 'борщ', 'плов', 'жаркое', 'десерт',
+          'соус', 'суфле', 'рулет', 'оладьи', 'гратен', 'ризотто')
+INGREDIENTS_PER_RECIPE = (3, 8)
+WORDS_PER_TEXT = (20, 60)
+
+
+class Command(BaseCommand):
+    help = ('Measure recipe search through the API, optionally after '
+            'generating a corpus of recipes to search.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', type=int, metavar='COUNT',
+                            help='Add generated recipes until there are '
+                                 'COUNT of them, e.g. 500000.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Search string to measure; repeatable. '
+                                 'By default terms of several frequencies.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ingredients = list(Ingredient.objects.exclude(
+            name__startswith='ингредиент ').values_list('id', 'name'))
+        if not ingredients:
+            ingredients = list(Ingredient.objects.values_list(
+                'id', 'name')[:10000])
+        if not ingredients:
+            raise CommandError('Нет ингредиентов: загрузите каталог')
+        if options['generate']:
+            self.generate(options['generate'], options['batch_size'],
+                          ingredients, rng)
+        queries = options['queries'] or self.default_queries(ingredients)
+        client = APIClient()
+        self.stdout.write(f'Рецептов: {Recipe.objects.count()}')
+        for query in queries:
+            self.measure(client, query, options['repeat'])
+
+    @staticmethod
+    def default_queries(ingredients):
+        """A frequent, a rare and a two-word query, and a typed prefix."""
+        words = {}
+        for _, name in ingredients:
+            for word in name.split():
+                if len(word) > 3:
+                    words[word] = words.get(word, 0) + 1
+        ranked = sorted(words, key=lambda word: (-words[word], word))
+        common, rare = ranked[0], ranked[len(ranked) // 2]
+        return [common, rare, f'{DISHES[0]} {common}', common[:3],
+                f'{DISHES[1]} {rare[:4]}']
+
+    def generate(self, count, batch_size, ingredients, rng):
+        authors = list(User.objects.values_list('id', flat=True)[:1000])
+        tags = list(Tag.objects.values_list('id', flat=True))
+        if not authors or not tags:
+            raise CommandError('Нет пользователей или тегов')
+        vocabulary = [word for _, name in ingredients for word in name.split()]
+        through = Recipe.tags.through
+        missing = count - Recipe.objects.count()
+        started = time.monotonic()
+        while missing > 0:
+            size = min(batch_size, missing)
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    self.recipe(rng, authors, ingredients, vocabulary)
+                    for _ in range(size))
+                if not recipes[0].pk:
+                    recipes = Recipe.objects.order_by('-id')[:size]
+                ids = [recipe.pk for recipe in recipes]
+                IngredientForRecipe.objects.bulk_create(
+                    IngredientForRecipe(recipe_id=pk, ingredient_id=ingredient,
+                                        amount=rng.randint(1, 500))
+                    for pk in ids
+                    for ingredient, _ in rng.sample(
+                        ingredients, rng.randint(*INGREDIENTS_PER_RECIPE)))
+                through.objects.bulk_create(
+                    through(recipe_id=pk, tag_id=rng.choice(tags))
+                    for pk in ids)
+                index_recipes(ids)
+            missing -= size
+            self.stdout.write(f'Добавлено {size}, осталось {missing}')
+        self.stdout.write(
+            f'Корпус готов за {time.monotonic() - started:.0f} с')
+
+    @staticmethod
+    def recipe(rng, authors, ingredients, vocabulary):
+        # Text words follow a Zipf-like law: a few are everywhere.
+        words = [vocabulary[int(len(vocabulary) * rng.random() ** 3)]
+                 for _ in range(rng.randint(*WORDS_PER_TEXT))]
+        return Recipe(
+            author_id=rng.choice(authors),
+            name=f'{rng.choice(DISHES)} {rng.choice(ingredients)[1]}',
+            text=' '.join(words),
+            image='media/generated.jpg',
+            cooking_time=rng.randint(5, 180))
+
+    def measure(self, client, query, repeat):
+        url = '/api/recipes/?' + urlencode({'search': query})
+        response = client.get(url)
+        if response.status_code != status.HTTP_200_OK:
+            raise CommandError(f'{url}: HTTP {response.status_code}')
+        found = response.json()['count']
+        timings, sql = [], []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                client.get(url)
+                timings.append(time.perf_counter() - started)
+            sql.append(sum(float(query['time']) for query in queries))
+        timings.sort()
+        median = statistics.median(timings)
+        self.stdout.write(
+            f'{query!r:30} найдено {found:7d}  '
+            f'медиана {median * 1000:7.1f} мс  '
+            f'p95 {timings[int(len(timings) * 0.95) - 1] * 1000:7.1f} мс  '
+            f'SQL {statistics.median(sql) * 1000:7.1f} мс  '
+            f'{1 / median:6.0f} запросов/с')
@@ -0,0 +1,132 @@
+import time
+
+from api.fast_serializers import (FastIngredientSerializer,
+                                  FastMatchedRecipeSerializer,
+                                  FastRecipeSerializer)
+from api.function import annotate_recipes
+from api.renderers import ORJSONRenderer
+from api.serializers import (IngredientsSerializer, ListRecipeSerializer,
+                             MatchedRecipeSerializer)
+from api.views import IngredientViewSet, RecipeViewSet
+from app.catalogue import get_catalogue
+from app.models import Recipe
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+User = get_user_model()
+
+PAIRS = (
+    ('list', ListRecipeSerializer, FastRecipeSerializer),
+    ('retrieve', ListRecipeSerializer, FastRecipeSerializer),
+    ('what_to_cook', MatchedRecipeSerializer, FastMatchedRecipeSerializer),
+)
+ROUNDS = 3
+
+
+def timed(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Serialize recipes and the ingredient catalogue from the '
+            'database with the DRF and the fast serializers, check that '
+            'both render the same JSON, DRF with JSONRenderer and fast '
+            'with ORJSONRenderer, and report objects a second for each.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--user', type=int,
+                            help='Id of the user to serialize for; '
+                                 'anonymous by default.')
+
+    def handle(self, *args, **options):
+        recipes = list(annotate_recipes(Recipe.objects.order_by(
+            '-pub_date', '-id'))[:options['recipes']])
+        if not recipes:
+            raise CommandError('Нет рецептов: заполните базу (seed_data)')
+        for number, recipe in enumerate(recipes):
+            recipe.match_ratio = 1 / (number + 1)
+            recipe.matched_ingredients = number
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        if options['user'] is not None:
+            request.user = User.objects.get(pk=options['user'])
+        if not ORJSONRenderer.available():
+            self.stderr.write('orjson не установлен: ORJSONRenderer '
+                              'работает через json')
+        renderers = (JSONRenderer(), ORJSONRenderer())
+        for action, slow, fast in PAIRS:
+            context = {'request': request, 'format': None, 'view':
+                       RecipeViewSet(action=action, request=request)}
+            self.check_same(action, recipes, (slow, fast), context,
+                            renderers)
+            timings = [self.measure(serializer, recipes, context, renderer,
+                                    options['repeat'])
+                       for serializer, renderer in zip((slow, fast),
+                                                       renderers)]
+            self.report(action, len(recipes) * options['repeat'], timings)
+        self.ingredients(renderers, options['repeat'])
+
+    @staticmethod
+    def data(serializer, recipes, context, action):
+        if action == 'retrieve':
+            return [serializer(recipe, context=context).data
+                    for recipe in recipes]
+        return serializer(recipes, many=True, context=context).data
+
+    def check_same(self, action, recipes, serializers, context, renderers):
+        for recipe in recipes:
+            expected, actual = (
+                renderer.render(self.data(serializer, [recipe], context,
+                                          action))
+                for serializer, renderer in zip(serializers, renderers))
+            if expected != actual:
+                raise CommandError(
+                    f'{action}: рецепт {recipe.pk} отличается\n'
+                    f'{expected.decode()}\n{actual.decode()}')
+
+    def ingredients(self, renderers, repeat):
+        """The whole catalogue, as the ingredient list returns it."""
+        rows = get_catalogue().search()
+        if not rows:
+            return
+        context = {'view': IngredientViewSet(action='list')}
+        serializers = (IngredientsSerializer, FastIngredientSerializer)
+        expected, actual = (
+            renderer.render(serializer(rows, many=True).data)
+            for serializer, renderer in zip(serializers, renderers))
+        if expected != actual:
+            raise CommandError('ingredients: список отличается')
+        timings = [self.measure(serializer, rows, context, renderer, repeat)
+                   for serializer, renderer in zip(serializers, renderers)]
+        self.report('ingredients', len(rows) * repeat, timings)
+
+    def measure(self, serializer, recipes, context, renderer, repeat):
+        """Seconds to serialize, and to serialize and render, repeat
+        times; the best of ROUNDS runs after one to warm up."""
+        action = context['view'].action
+
+        def serialize():
+            return self.data(serializer, recipes, context, action)
+
+        def render():
+            return renderer.render(serialize())
+        return tuple(min(timed(function, repeat) for _ in range(ROUNDS + 1))
+                     for function in (serialize, render))
+
+    def report(self, action, count, timings):
+        (slow, slow_rendered), (fast, fast_rendered) = timings
+        self.stdout.write(
+            f'{action:13} DRF {count / slow:8.0f} объектов/с, '
+            f'быстрый {count / fast:8.0f} объектов/с, '
+            f'x{slow / fast:.1f}; с JSON '
+            f'{count / slow_rendered:8.0f} → {count / fast_rendered:8.0f}, '
+            f'x{slow_rendered / fast_rendered:.1f}')
@@ -0,0 +1,112 @@
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Upper bounds of the latency buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, math.inf)
+NAMES_KEY = 'metrics:names'
+
+_pending = Counter()
+_names = {}
+_flushed = time.monotonic()
+_lock = threading.Lock()
+
+
+def metric_key(name, field):
+    return f'metrics:{name}:{field}'
+
+
+def observe(name, seconds, **totals):
+    """Count an event of the named metric and its latency.
+
+    Integer totals, e.g. queries=5, add up per metric and are reported
+    as means; totals named *_us are microseconds reported as *_ms.
+    Events add up in the process and go to the cache every
+    METRICS_FLUSH_INTERVAL seconds, where every process adds its own,
+    so recording costs no cache round trip.
+    """
+    bucket = next(bound for bound in LATENCY_BUCKETS if seconds <= bound)
+    with _lock:
+        _pending[metric_key(name, 'count')] += 1
+        _pending[metric_key(name, 'micros')] += round(seconds * 10 ** 6)
+        _pending[metric_key(name, bucket)] += 1
+        for field, value in totals.items():
+            _pending[metric_key(name, f'total:{field}')] += value
+        _names.setdefault(name, set()).update(totals)
+        if time.monotonic() - _flushed >= settings.METRICS_FLUSH_INTERVAL:
+            flush()
+
+
+def flush():
+    """Add the pending counts to the cache; called under _lock."""
+    global _flushed
+    _flushed = time.monotonic()
+    known = cache.get(NAMES_KEY, {})
+    if any(not fields <= known.get(name, frozenset())
+           for name, fields in _names.items()):
+        cache.set(NAMES_KEY, {
+            name: frozenset(known.get(name, ())) | _names.get(name, set())
+            for name in known.keys() | _names.keys()}, timeout=None)
+    for key, value in _pending.items():
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            cache.set(key, value, timeout=None)
+    _pending.clear()
+
+
+def percentile(buckets, count, share):
+    """Upper bound of the bucket holding the given share of events, in
+    milliseconds; None past the last finite bound."""
+    seen = 0
+    for bound in LATENCY_BUCKETS:
+        seen += buckets[bound]
+        if seen >= count * share:
+            break
+    return bound * 1000 if bound != math.inf else None
+
+
+def snapshot():
+    """Counts and latencies of every metric, with hit rates of caches.
+
+    Latency percentiles are bucket bounds, in milliseconds.
+    """
+    with _lock:
+        flush()
+    names = cache.get(NAMES_KEY, {})
+    stored = cache.get_many([
+        metric_key(name, field) for name, totals in names.items()
+        for field in ('count', 'micros', *LATENCY_BUCKETS,
+                      *(f'total:{total}' for total in totals))])
+    metrics = {}
+    for name in sorted(names):
+        count = stored.get(metric_key(name, 'count'), 0)
+        if not count:
+            continue
+        buckets = {bound: stored.get(metric_key(name, bound), 0)
+                   for bound in LATENCY_BUCKETS}
+        metrics[name] = {
+            'count': count,
+            'mean_ms': stored.get(metric_key(name, 'micros'), 0)
+            / count / 1000,
+            **{f'p{round(share * 100)}_ms': percentile(buckets, count, share)
+               for share in (0.5, 0.95, 0.99)},
+        }
+        for total in sorted(names[name]):
+            value = stored.get(metric_key(name, f'total:{total}'), 0) / count
+            if total.endswith('_us'):
+                total, value = f'{total[:-3]}_ms', value / 1000
+            metrics[name][f'mean_{total}'] = value
+    for prefix in {name.rpartition('.')[0] for name in names
+                   if name.endswith(('.hit', '.miss'))}:
+        hits, misses = (metrics.get(f'{prefix}.{outcome}', {}).get('count', 0)
+                        for outcome in ('hit', 'miss'))
+        if hits + misses:
+            metrics[f'{prefix}.hit_rate'] = hits / (hits + misses)
+    return metrics
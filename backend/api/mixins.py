@@ -0,0 +1,170 @@
+import hashlib
+import time
+
+from app.versions import current_stamps, current_versions, version_key
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+from rest_framework import status
+
+from .compression import precompress, use_variant
+from .metrics import observe
+
+
+class ReferenceCacheMixin:
+    """Conditional and cached GET for reference data.
+
+    ETag and Last-Modified are derived from the version stamps of
+    version_models, so a request carrying a current If-None-Match or
+    If-Modified-Since is answered with 304 before the database is
+    touched. Rendered bodies are cached under the same stamps and
+    outdated by the signals that bump them, together with their
+    compressed variants, so a cached body is not compressed again.
+    """
+    version_models = ()
+
+    def perform_authentication(self, request):
+        """Reference data is public; resolve the user only if asked."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    def cached(self, handler, request, *args, **kwargs):
+        renderer_format = request.accepted_renderer.format
+        if renderer_format == 'api':
+            return handler(request, *args, **kwargs)
+        versions = current_versions(self.version_models)
+        digest = hashlib.md5(repr((
+            versions, request.path, renderer_format,
+            sorted(request.query_params.lists()),
+        )).encode()).hexdigest()
+        etag = quote_etag(digest)
+        last_modified = max(versions) // 10 ** 9
+        variants = None
+        if self.not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            key = f'reference.encoded:{digest}'
+            stored = cache.get(key)
+            if stored is not None:
+                content, content_type, variants = stored
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                response.add_post_render_callback(self.store(key))
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept',))
+        use_variant(request, response, variants)
+        return response
+
+    @staticmethod
+    def store(key):
+        def callback(response):
+            cache.set(key, (response.content, response['Content-Type'],
+                            precompress(response)),
+                      settings.REFERENCE_CACHE_TIMEOUT)
+        return callback
+
+    @staticmethod
+    def not_modified(request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags or f'W/{etag}' in etags
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return (if_modified_since is not None
+                and last_modified <= if_modified_since)
+
+
+def normalized_query(request):
+    """Query parameters in a canonical order, without empty values."""
+    return sorted(
+        (name, sorted(value for value in values if value))
+        for name, values in request.query_params.lists()
+        if any(values))
+
+
+class AnonymousCacheMixin:
+    """Cached list and retrieve for anonymous users.
+
+    Per-user flags are all false for an anonymous user, so the body
+    depends on the query string alone. It is cached with the stamps it
+    was rendered under: the versions of version_models, taken before
+    rendering, and the stamps of the rows on it that dependencies()
+    names, taken after; a row changed in between is outdated again by
+    RESPONSE_CACHE_TIMEOUT. A cached body is served while every stamp is
+    unchanged. Hits, misses and authenticated requests are observed
+    in the metrics as <metrics_name>.response_cache.hit/miss/bypass.
+    """
+    version_models = ()
+    metrics_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.anonymous_cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.anonymous_cached(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_version_models(self):
+        return self.version_models
+
+    def dependencies(self, data):
+        """Return {stamp key: stamp} of the rows shown in data."""
+        return {}
+
+    def anonymous_cached(self, handler, request, *args, **kwargs):
+        renderer_format = request.accepted_renderer.format
+        if not settings.RESPONSE_CACHE or renderer_format == 'api':
+            return handler(request, *args, **kwargs)
+        started = time.perf_counter()
+        metric = f'{self.metrics_name or self.basename}.response_cache'
+        if not request.user.is_anonymous:
+            response = handler(request, *args, **kwargs)
+            response.add_post_render_callback(
+                self.observer(f'{metric}.bypass', started))
+            return response
+        key = 'response:%s' % hashlib.md5(repr((
+            request.path, renderer_format, normalized_query(request),
+        )).encode()).hexdigest()
+        stored = cache.get(key)
+        if stored is not None:
+            content, content_type, stamps = stored
+            if current_stamps(list(stamps)) == stamps:
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Cache'] = 'HIT'
+                observe(f'{metric}.hit', time.perf_counter() - started)
+                return response
+        stamps = current_stamps(
+            [version_key(model) for model in self.get_version_models()])
+        response = handler(request, *args, **kwargs)
+        response['X-Cache'] = 'MISS'
+        if response.status_code == status.HTTP_200_OK:
+            response.add_post_render_callback(
+                self.store_response(key, stamps))
+        response.add_post_render_callback(
+            self.observer(f'{metric}.miss', started))
+        return response
+
+    def store_response(self, key, stamps):
+        def callback(response):
+            stamps.update(self.dependencies(response.data))
+            cache.set(key, (response.content, response['Content-Type'],
+                            stamps), settings.RESPONSE_CACHE_TIMEOUT)
+        return callback
+
+    @staticmethod
+    def observer(name, started):
+        def callback(response):
+            observe(name, time.perf_counter() - started)
+        return callback
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+
+
+class LimitOffsetPagination(PageNumberPagination):
+    page_size_query_param = 'limit'
+
+
+class IdCountPaginator(Paginator):
+    """Counts the ids of the filtered rows only.
+
+    Django 2.2 wraps an annotated queryset in a subquery to count it and
+    evaluates every annotation on every row; counting the ids leaves
+    the per-user flags out.
+    """
+
+    @cached_property
+    def count(self):
+        return self.object_list.values('pk').count()
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination on (-pub_date, -id).
+
+    DRF's CursorPagination keeps only the first ordering field in the
+    cursor and steps over rows sharing it with an offset; this cursor
+    holds both fields, so every page is an index range scan from the
+    last recipe shown and costs the same at any depth, however many
+    recipes share a pub_date. The total is counted only when the client
+    asks for it with ?count=true.
+    """
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.count = None
+        if request.query_params.get(self.count_query_param) in (
+                'true', '1'):
+            self.count = queryset.count()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        after = self.cursor is not None and self.cursor.position is not None
+        if after:
+            queryset = queryset.filter(
+                self.beyond(self.cursor.position, reverse))
+        if reverse:
+            queryset = queryset.reverse()
+        self.page = list(queryset[:self.page_size + 1])
+        more = len(self.page) > self.page_size
+        del self.page[self.page_size:]
+        if reverse:
+            self.page.reverse()
+        self.has_next, self.has_previous = (
+            (after, more) if reverse else (more, after))
+        return self.page
+
+    def beyond(self, position, reverse):
+        """Filter for the recipes after position in the walk order."""
+        pub_date, _, pk = position.rpartition(' ')
+        try:
+            pub_date, pk = datetime.fromisoformat(pub_date), int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if reverse:
+            return Q(pub_date__gte=pub_date) & (
+                Q(pub_date__gt=pub_date) | Q(id__gt=pk))
+        return Q(pub_date__lte=pub_date) & (
+            Q(pub_date__lt=pub_date) | Q(id__lt=pk))
+
+    def link(self, recipe, reverse):
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=reverse,
+            position=f'{recipe.pub_date.isoformat()} {recipe.pk}'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = OrderedDict(
+                [('count', self.count), *response.data.items()])
+        return response
+
+
+class RecipePagination(LimitOffsetPagination):
+    """Page numbers by default, cursor pages when the request asks.
+
+    Sending ?pagination=cursor, or a cursor from a previous response,
+    switches to RecipeCursorPagination, so page-number clients keep
+    working unchanged. A cursor only walks its own order, so it is
+    refused for recipes ordered otherwise, such as search results
+    ranked by relevance.
+    """
+    cursor_class = RecipeCursorPagination
+    django_paginator_class = IdCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        params = request.query_params
+        if (self.cursor_class.cursor_query_param in params
+                or params.get('pagination') == 'cursor'):
+            self.cursor = self.cursor_class()
+            if (queryset.query.extra_order_by or tuple(
+                    queryset.query.order_by) != self.cursor.ordering):
+                raise ValidationError({'pagination': [
+                    'Курсор доступен только для сортировки по новизне']})
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -3,7 +3,7 @@ from rest_framework import permissions, status
 
 class AnonymAdminAuthor(permissions.BasePermission):
     message = status.HTTP_403_FORBIDDEN
-    edit_methods = ("PATCH", "DELETE",)
+    edit_methods = ("PUT", "PATCH", "DELETE",)
 
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
@@ -0,0 +1,161 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import observe
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetError(Exception):
+    """A view ran more queries than its budget allows."""
+
+
+class RequestProfile:
+    """Queries, database time and phases of one request.
+
+    An instance is installed as the execute wrapper of every database
+    connection for the duration of the request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0
+        self.view = None
+        self.queries = 0
+        self.db = 0
+        self.phases = {}
+        self.open = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    def start(self, name):
+        self.open.setdefault(name, time.perf_counter())
+
+    def stop(self, name):
+        started = self.open.pop(name, None)
+        if started is not None:
+            self.phases[name] = (self.phases.get(name, 0)
+                                 + time.perf_counter() - started)
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Server-Timing header value; phases include their queries."""
+        timings = [
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"']
+        timings += [f'{name};dur={seconds * 1000:.1f}'
+                    for name, seconds in self.phases.items()]
+        timings.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(timings)
+
+
+def view_name(request, view_func):
+    """ViewClass.action for DRF views, module.function otherwise."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class QueryBudgetMiddleware:
+    """Profile every request and hold views to their query budgets.
+
+    Budgets come from QUERY_BUDGETS by view name, e.g.
+    'RecipeViewSet.list', with QUERY_BUDGET_DEFAULT for the rest. A
+    request over budget is logged, or raises QueryBudgetError with
+    QUERY_BUDGET_STRICT, which is on in tests. Requests slower than
+    SLOW_REQUEST_THRESHOLD seconds are logged too, every profiled
+    request goes to the api.metrics as view.<name>, and SERVER_TIMING
+    adds the profile to the response as a Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = request.profile = RequestProfile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        profile.finish()
+        if profile.view is not None:
+            self.report(request, response, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile.view = view_name(request, view_func)
+
+    def report(self, request, response, profile):
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = profile.server_timing()
+        observe(f'view.{profile.view}', profile.total,
+                queries=profile.queries, db_us=round(profile.db * 10 ** 6),
+                **{f'{name}_us': round(seconds * 10 ** 6)
+                   for name, seconds in profile.phases.items()})
+        message = (f'{request.method} {request.get_full_path()} '
+                   f'{profile.view}: {response.status_code}, '
+                   f'{profile.queries} queries, {profile.server_timing()}')
+        budget = settings.QUERY_BUDGETS.get(
+            profile.view, settings.QUERY_BUDGET_DEFAULT)
+        if budget is not None and profile.queries > budget:
+            message = f'{message}; query budget {budget} exceeded'
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetError(message)
+            logger.warning(message)
+        elif profile.total >= settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(message)
+        else:
+            logger.debug(message)
+
+
+class ProfiledViewMixin:
+    """Time serialization and rendering of a DRF view.
+
+    Serialization runs from the first get_serializer() call to the
+    response and includes the queries it runs, rendering is timed when
+    the response renders. Views outside QueryBudgetMiddleware are left
+    untouched.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        profile = getattr(self.request, 'profile', None)
+        if profile is not None:
+            profile.start('serialize')
+        return super().get_serializer(*args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        profile = getattr(request, 'profile', None)
+        if profile is None:
+            return response
+        profile.stop('serialize')
+        render = getattr(response, 'render', None)
+        if render is not None:
+            def timed_render():
+                with profile.phase('render'):
+                    return render()
+            response.render = timed_render
+        return response
@@ -0,0 +1,105 @@
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fragments are spliced in by orjson from 3.9.11, older versions are
+# given their decoded value.
+orjson_fragment = getattr(orjson, 'Fragment', None)
+
+# JSONRenderer escapes these, which JavaScript takes for line breaks.
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'),
+                   (b'\xe2\x80\xa9', b'\\u2029'))
+_missing = object()
+
+
+class Fragment:
+    """JSON encoded in advance and spliced into a response as it is.
+
+    Code reading the data rather than rendering it, the stdlib encoder
+    included, sees the decoded value, decoded once on first access.
+    """
+    __slots__ = ('encoded', '_value')
+
+    def __init__(self, encoded):
+        self.encoded = encoded
+        self._value = _missing
+
+    @property
+    def value(self):
+        if self._value is _missing:
+            self._value = json.loads(self.encoded)
+        return self._value
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, Fragment):
+            other = other.value
+        return self.value == other
+
+    __hash__ = None
+
+
+class FragmentEncoder(JSONEncoder):
+    """DRF encoder that also takes fragments."""
+
+    def default(self, obj):
+        if isinstance(obj, Fragment):
+            return obj.value
+        return super().default(obj)
+
+
+_encoder = FragmentEncoder()
+
+
+def default(obj):
+    """Types orjson does not know: fragments are spliced in, the rest
+    (Decimal, lazy strings, querysets...) converted as by the DRF
+    encoder."""
+    if isinstance(obj, Fragment):
+        if orjson_fragment is None:
+            return obj.value
+        return orjson_fragment(obj.encoded)
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer writing the same JSON with orjson.
+
+    Dates and times are written by orjson natively, in the ISO format
+    with Z for UTC that the DRF encoder writes. It falls back to the
+    stdlib encoder when orjson is not installed and for output orjson
+    cannot write: ASCII only, non-compact, indents other than two.
+    """
+    encoder_class = FragmentEncoder
+
+    @classmethod
+    def available(cls):
+        return orjson is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (data is None or not self.available() or self.ensure_ascii
+                or not self.compact or indent not in (None, 2)):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        content = orjson.dumps(data, default=default, option=option)
+        for separator, escaped in LINE_SEPARATORS:
+            content = content.replace(separator, escaped)
+        return content
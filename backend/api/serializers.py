@@ -1,43 +1,81 @@
 import base64
-import imghdr
-import uuid
+import binascii
+from io import BytesIO
 
+from app.catalogue import ingredients_in_bulk
+from app.deletion import delete_accounted
+from app.feed import publish_recipe
+from app.images import image_url
 from app.models import (Download, Favorite, Follow, Ingredient,
-                        IngredientForRecipe, Recipe, Tag)
+                        IngredientForRecipe, Recipe, ShoppingCartTotals, Tag)
+from app.search import index_recipes
+from app.versions import bump_version
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
-from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer
+from PIL import Image
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from .function import (get_favorited, get_shopping_cart, get_subscribed,
-                       val_cooking_time)
+from .function import (annotate_recipes, get_favorited, get_shopping_cart,
+                       get_subscribed, recipe_rendition, val_cooking_time)
 
 User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):
-    """Serializer for image field."""
+    """Serializer for image field.
+
+    The size is checked before decoding, the payload is decoded in
+    chunks into an upload file that goes to disk past
+    FILE_UPLOAD_MAX_MEMORY_SIZE, and the type is read by Pillow.
+    """
+    chunk_size = 64 * 1024
+    extensions = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
 
     def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid_image')
         if 'data:' in data and ';base64,' in data:
             header, data = data.split(';base64,')
+        if '\n' in data:
+            data = data.replace('\r', '').replace('\n', '')
+        size = len(data) // 4 * 3 - data[-2:].count('=')
+        limit = settings.RECIPE_IMAGE_MAX_SIZE
+        if size > limit:
+            raise serializers.ValidationError(
+                f'Размер изображения больше {limit // 2 ** 20} МБ')
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile('image', None, size, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, 'image', None, size, None)
         try:
-            decoded_file = base64.b64decode(data)
-        except TypeError:
+            for start in range(0, len(data), self.chunk_size):
+                file.write(base64.b64decode(
+                    data[start:start + self.chunk_size], validate=True))
+        except (binascii.Error, ValueError):
             self.fail('invalid_image')
-        file_name = str(uuid.uuid4())[:20]
-        file_extension = self.get_file_extension(file_name, decoded_file)
-        complete_file_name = "%s.%s" % (file_name, file_extension, )
-        data = ContentFile(decoded_file, name=complete_file_name)
-        return super(Base64ImageField, self).to_internal_value(data)
+        file.size = file.tell()
+        file.name = 'image.%s' % self.get_file_extension(file)
+        file.seek(0)
+        return super(Base64ImageField, self).to_internal_value(file)
 
-    def get_file_extension(self, file_name, decoded_file):
-        extension = imghdr.what(file_name, decoded_file)
-        extension = "jpg" if extension == "jpeg" else extension
-        return extension
+    def get_file_extension(self, file):
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+        except (OSError, Image.DecompressionBombError):
+            image_format = None
+        if image_format not in self.extensions:
+            self.fail('invalid_image')
+        return self.extensions[image_format]
 
 
 class UserSerializer(UserCreateSerializer):
@@ -48,7 +86,7 @@ class UserSerializer(UserCreateSerializer):
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'password')
+                  'is_subscribed', 'followers_count', 'password')
 
     def get_is_subscribed(self, obj):
         return get_subscribed(self, obj)
@@ -71,17 +109,37 @@ class IngredientsSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class IngredientsForCreateRecipeListSerializer(serializers.ListSerializer):
+    """Resolves all ingredients of a recipe with a single query."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = ingredients_in_bulk(
+            {item['ingredient_id'] for item in items})
+        errors = []
+        for item in items:
+            pk = item.pop('ingredient_id')
+            if pk in ingredients:
+                item['ingredient'] = ingredients[pk]
+                errors.append({})
+            else:
+                errors.append({'id': [serializers.PrimaryKeyRelatedField(
+                    read_only=True).error_messages['does_not_exist'].format(
+                        pk_value=pk)]})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+
 class IngredientsForCreateRecipeSerializer(serializers.ModelSerializer):
     """Serializer for ingredients for create recipe requests."""
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(source='ingredient_id')
     amount = serializers.FloatField()
 
     class Meta:
         model = IngredientForRecipe
         fields = ('id', 'amount')
+        list_serializer_class = IngredientsForCreateRecipeListSerializer
 
 
 class IngredientsForRecipeSerializer(serializers.ModelSerializer):
@@ -122,19 +180,20 @@ class ListRecipeSerializer(serializers.ModelSerializer):
             'name',
             'image',
             'text',
-            'cooking_time'
+            'cooking_time',
+            'favorites_count',
+            'in_carts_count'
         )
 
     def get_image(self, obj):
-        return obj.image.url
+        return image_url(obj, recipe_rendition(self.context.get('view')))
 
     def validate_cooking_time(self, cooking_time):
         return val_cooking_time(self, cooking_time)
 
     def get_ingredients(self, recipe):
         """ Get pull of ingreients for recipe."""
-        queryset = IngredientForRecipe.objects.filter(
-            recipe__id=recipe.id).all()
+        queryset = recipe.ingredients_recipe.all()
         return IngredientsForRecipeSerializer(queryset, many=True).data
 
     def get_is_favorited(self, obj):
@@ -144,6 +203,29 @@ class ListRecipeSerializer(serializers.ModelSerializer):
         return get_shopping_cart(self, obj)
 
 
+class MatchedRecipeSerializer(ListRecipeSerializer):
+    """Recipe found by ingredients, with the share of them at hand."""
+    match_ratio = serializers.FloatField(read_only=True)
+    matched_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(ListRecipeSerializer.Meta):
+        fields = ListRecipeSerializer.Meta.fields + (
+            'match_ratio', 'matched_ingredients')
+
+
+class WhatToCookSerializer(serializers.Serializer):
+    """Query parameters of the search by ingredients at hand."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False,
+        max_length=settings.RECIPE_INDEX_MAX_INGREDIENTS)
+    tags = serializers.ListField(child=serializers.SlugField(),
+                                 required=False)
+    cooking_time = serializers.IntegerField(min_value=1, required=False)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.RECIPE_INDEX_MAX_LIMIT,
+        default=settings.RECIPE_INDEX_LIMIT)
+
+
 class RecipeFollowtSerializer(serializers.ModelSerializer):
     """ Auxiliary serializer for dispensing prescriptions."""
     image = serializers.SerializerMethodField()
@@ -153,7 +235,7 @@ class RecipeFollowtSerializer(serializers.ModelSerializer):
         fields = ('id', 'image', 'name', 'cooking_time')
 
     def get_image(self, obj):
-        return obj.image.url
+        return image_url(obj, 'preview')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -193,6 +275,9 @@ class FollowListSerializer(serializers.ModelSerializer):
         return get_subscribed(self, obj)
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'recipes_preview'):
+            return RecipeFollowtSerializer(
+                obj.recipes_preview, many=True).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         queryset = Recipe.objects.filter(author=obj)
@@ -204,12 +289,15 @@ class FollowListSerializer(serializers.ModelSerializer):
 
     def get_recipes_count(self, obj):
         """Recipe counting method."""
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj).count()
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count')
+                  'is_subscribed', 'followers_count', 'recipes',
+                  'recipes_count')
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -284,11 +372,23 @@ class RecipeSerializer(serializers.ModelSerializer):
     def validate_cooking_time(self, cooking_time):
         return val_cooking_time(self, cooking_time)
 
+    def save(self, **kwargs):
+        """Close the decoded upload once storage has taken it."""
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
     def to_representation(self, instance):
         """Method to override response fields."""
+        request = self.context.get('request')
+        instance = annotate_recipes(
+            Recipe.objects.filter(pk=instance.pk)).get()
         serializer = ListRecipeSerializer(
             instance,
-            context={'request': self.context.get('request')})
+            context={'request': request})
         return serializer.data
 
     def validate_ingredients(self, data):
@@ -308,20 +408,23 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Добавьте теги')
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         author = self.context.get('request').user
         recipe = Recipe.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
-        for ingredient in ingredients_data:
-            ing_for_rec = IngredientForRecipe.objects.create(
-                ingredient=ingredient['ingredient'],
-                amount=ingredient['amount'],
-                recipe=recipe)
-            ing_for_rec.save()
+        IngredientForRecipe.objects.bulk_create(
+            IngredientForRecipe(ingredient=ingredient['ingredient'],
+                                amount=ingredient['amount'],
+                                recipe=recipe)
+            for ingredient in ingredients_data)
+        index_recipes([recipe.pk])
+        transaction.on_commit(lambda: publish_recipe(recipe))
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         instance.tags.set(tags)
@@ -332,16 +435,43 @@ class RecipeSerializer(serializers.ModelSerializer):
         instance.cooking_time = validated_data.get('cooking_time',
                                                    instance.cooking_time)
         instance.pub_date = validated_data.get('pub_date', instance.pub_date)
-        IngredientForRecipe.objects.filter(recipe=instance).all().delete()
-        ingredients_data = validated_data.pop('ingredients')
-        for ingredient in ingredients_data:
-            IngredientForRecipe.objects.create(
-                ingredient=ingredient['ingredient'],
-                amount=ingredient['amount'],
-                recipe=instance)
+        self.update_ingredients(instance, validated_data.pop('ingredients'))
         instance.save()
+        index_recipes([instance.pk])
         return instance
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """Write only the rows that differ from the stored ones."""
+        incoming = {}
+        for ingredient in ingredients_data:
+            pk = ingredient['ingredient'].id
+            incoming[pk] = incoming.get(pk, 0) + ingredient['amount']
+        changed, stale, totals = [], [], {}
+        for row in recipe.ingredients_recipe.all():
+            amount = incoming.pop(row.ingredient_id, None)
+            if amount is None:
+                stale.append(row)
+                total, entries = totals.get(row.ingredient_id, (0, 0))
+                totals[row.ingredient_id] = (total - row.amount, entries - 1)
+            elif amount != row.amount:
+                totals[row.ingredient_id] = (amount - row.amount, 0)
+                row.amount = amount
+                changed.append(row)
+        delete_accounted(stale)
+        IngredientForRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientForRecipe.objects.bulk_create(
+            IngredientForRecipe(ingredient_id=pk, amount=amount,
+                                recipe=recipe)
+            for pk, amount in incoming.items())
+        totals.update((pk, (amount, 1)) for pk, amount in incoming.items())
+        if stale or incoming:
+            # The ingredient index and the lists go by the ingredients.
+            transaction.on_commit(lambda: bump_version(Recipe))
+        # Recipe rows are written in bulk and deleted as accounted, so
+        # their handlers stay out: cart totals are adjusted here, and
+        # instance.save() in update() outdates the recipe afterwards.
+        ShoppingCartTotals.objects.change_recipe(recipe.id, totals)
+
 
 class PasswordSerializer(serializers.Serializer):
     new_password = serializers.CharField(required=True)
@@ -1,8 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (FollowAPI, FollowList, IngredientViewSet, RecipeViewSet,
-                    TagViewSet, UserViewSet)
+from .views import (FollowAPI, FollowList, IngredientViewSet, MetricsView,
+                    RecipeViewSet, TagViewSet, UserViewSet)
 
 router = DefaultRouter()
 router.register("users", UserViewSet, basename='users')
@@ -15,4 +15,5 @@ urlpatterns = [path('users/subscriptions/', FollowList.as_view(),
                     name='follow_list'),
                path('users/<int:user_id>/subscribe/', FollowAPI.as_view(),
                     name='follow'),
+               path('metrics/', MetricsView.as_view(), name='metrics'),
                path('', include(router.urls)), ]
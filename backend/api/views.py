@@ -1,42 +1,58 @@
-from app.models import (Download, Favorite, Follow, Ingredient,
-                        IngredientForRecipe, Recipe, Tag)
+from app.catalogue import get_catalogue
+from app.deletion import delete_recipe
+from app.feed import follow_author, forget_feed, get_feed
+from app.matching import drop_recipes, match_recipes
+from app.models import (Download, Favorite, Follow, Ingredient, Recipe,
+                        ShoppingCartTotals, Tag)
+from app.versions import current_instance_versions
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.shortcuts import HttpResponse
+from django.db import transaction
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .export import RENDERERS, shopping_list_response
+from .fast_serializers import (FastIngredientSerializer,
+                               FastMatchedRecipeSerializer,
+                               FastRecipeSerializer)
 from .filter import FilterForIngredients, FilterForRecipeFilter
+from .function import (annotate_follows, annotate_recipes, tag_slugs,
+                       user_relations)
+from .metrics import snapshot
+from .mixins import AnonymousCacheMixin, ReferenceCacheMixin
+from .pagination import LimitOffsetPagination, RecipePagination
 from .permissions import AnonymAdminAuthor
+from .profiling import ProfiledViewMixin
 from .serializers import (DownloadSerializer, FavoriteSerializer,
                           FollowListSerializer, FollowSerializer,
                           IngredientsSerializer, ListRecipeSerializer,
-                          PasswordSerializer, RecipeSerializer, TagSerializer,
-                          UserSerializer)
+                          MatchedRecipeSerializer, PasswordSerializer,
+                          RecipeSerializer, TagSerializer, UserSerializer,
+                          WhatToCookSerializer)
 
 User = get_user_model()
 
 
-class LimitOffsetPagination(PageNumberPagination):
-    page_size_query_param = 'limit'
-
-
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ProfiledViewMixin, ReferenceCacheMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Tag endpoint handler."""
+    version_models = (Tag,)
     permission_classes = [AllowAny]
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ProfiledViewMixin, ReferenceCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Ingredient endpoint handler."""
+    version_models = (Ingredient,)
     permission_classes = [AllowAny]
     queryset = Ingredient.objects.all()
     serializer_class = IngredientsSerializer
@@ -44,8 +60,33 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = FilterForIngredients
     pagination_class = None
 
+    def get_serializer_class(self):
+        """Lists from the snapshot are spliced from its encoded rows;
+        the browsable API gets the serializer for its filter form."""
+        if (self.action == 'list' and settings.INGREDIENT_CATALOGUE_CACHE
+                and self.request.accepted_renderer.format != 'api'):
+            return FastIngredientSerializer
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        if not settings.INGREDIENT_CATALOGUE_CACHE:
+            return super().filter_queryset(queryset)
+        params = self.request.query_params
+        return get_catalogue().search(
+            name=params.get('name'),
+            measurement_unit=params.get('measurement_unit'))
+
+    def get_object(self):
+        if not settings.INGREDIENT_CATALOGUE_CACHE:
+            return super().get_object()
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        ingredient = get_catalogue().get(int(pk)) if pk.isdigit() else None
+        if ingredient is None:
+            raise Http404
+        return ingredient
+
 
-class FollowAPI(APIView):
+class FollowAPI(ProfiledViewMixin, APIView):
     """Follow change/create endpoint handler."""
     permission_classes = (permissions.IsAuthenticated,)
 
@@ -54,6 +95,8 @@ class FollowAPI(APIView):
         serializer = FollowSerializer(data=data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        transaction.on_commit(
+            lambda: follow_author(request.user.id, user_id))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, user_id):
@@ -62,11 +105,12 @@ class FollowAPI(APIView):
         if not Follow.objects.filter(user=user, author=author).exists():
             return Response('Нельзя удалить подписку, которой нет!')
         Follow.objects.filter(user=user, author=author).delete()
+        transaction.on_commit(lambda: forget_feed(user.id))
         return Response('Подписка успешно удалена!',
                         status=status.HTTP_204_NO_CONTENT)
 
 
-class FollowList(generics.ListAPIView):
+class FollowList(ProfiledViewMixin, generics.ListAPIView):
     """Follow list endpoint handler."""
     serializer_class = FollowListSerializer
     permission_classes = (permissions.IsAuthenticated,)
@@ -74,25 +118,55 @@ class FollowList(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return User.objects.filter(
-            following__user=user
+        limit = self.request.query_params.get('recipes_limit')
+        return annotate_follows(
+            User.objects.filter(following__user=user).order_by('id'),
+            int(limit) if limit and limit.isdigit() else None
         )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ProfiledViewMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     """Recipe/favorite/shopping_cart/download endpoint handler."""
+    version_models = (Recipe, Tag, Ingredient)
+    metrics_name = 'recipes'
     permission_classes = [AnonymAdminAuthor]
-    queryset = Recipe.objects.all().order_by('-pub_date')
-    pagination_class = LimitOffsetPagination
+    queryset = Recipe.objects.all().order_by('-pub_date', '-id')
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
-    ordering_fields = ('pub_date')
     filterset_class = FilterForRecipeFilter
 
+    def get_queryset(self):
+        return annotate_recipes(super().get_queryset())
+
     def get_serializer_class(self):
-        if self.request.method == 'GET':
-            return ListRecipeSerializer
-        else:
+        if self.request.method != 'GET':
             return RecipeSerializer
+        fast = settings.FAST_RECIPE_SERIALIZERS
+        if self.action == 'what_to_cook':
+            return (FastMatchedRecipeSerializer if fast
+                    else MatchedRecipeSerializer)
+        return FastRecipeSerializer if fast else ListRecipeSerializer
+
+    def get_version_models(self):
+        """A recipe page shows no other recipe, so only its own rows and
+        the reference data outdate it."""
+        if self.action == 'retrieve':
+            return (Tag, Ingredient)
+        return self.version_models
+
+    def dependencies(self, data):
+        """Stamps of the recipes and authors of a page or a recipe."""
+        recipes = data.get('results', [data])
+        return {
+            **current_instance_versions(
+                Recipe, [recipe['id'] for recipe in recipes]),
+            **current_instance_versions(
+                User, {recipe['author']['id'] for recipe in recipes}),
+        }
+
+    def perform_destroy(self, instance):
+        delete_recipe(instance)
 
     @action(
         detail=True,
@@ -108,14 +182,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
             if download.exists():
                 return Response('Этот рецепт уже в корзине',
                                 status=status.HTTP_400_BAD_REQUEST)
-            Download.objects.create(user=user, recipe=recipe)
+            with transaction.atomic():
+                Download.objects.create(user=user, recipe=recipe)
             serializer = DownloadSerializer(download, many=True)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             if not download.exists():
                 return Response('Этот рецепт отсутствует в корзине',
                                 status=status.HTTP_400_BAD_REQUEST)
-            Download.objects.filter(user=user, recipe=recipe).delete()
+            with transaction.atomic():
+                Download.objects.filter(user=user, recipe=recipe).delete()
             return Response('Рецепт успешно удален из ссписка покупок',
                             status=status.HTTP_204_NO_CONTENT)
 
@@ -125,14 +201,56 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
         user = self.request.user
-        obj = IngredientForRecipe.objects.filter(
-            recipe__download__user=user).values_list(
-                'ingredient__name', 'ingredient__measurement_unit').annotate(
-                    Sum('amount')).order_by('ingredient__name')
-        download = [f'{item[0]} : {item[2]} {item[1]}\n' for item in obj]
-        response = HttpResponse(download, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; my_product_list.txt'
-        return response
+        renderer = RENDERERS.get(request.query_params.get('type', 'txt'))
+        if renderer is None or not renderer.available():
+            return Response('Такой формат списка покупок недоступен',
+                            status=status.HTTP_400_BAD_REQUEST)
+        rows = ShoppingCartTotals.objects.filter(user=user).values_list(
+            'ingredient__name', 'ingredient__measurement_unit',
+            'amount').order_by('ingredient__name').iterator()
+        return shopping_list_response(rows, renderer)
+
+    @action(detail=False, methods=['get'], url_path='what_to_cook')
+    def what_to_cook(self, request):
+        """Recipes using the largest share of the given ingredients."""
+        query = WhatToCookSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        query = query.validated_data
+        slugs = tag_slugs()
+        tag_ids = [slugs[slug] for slug in query.get('tags', ())
+                   if slug in slugs]
+        found = []
+        if tag_ids or not query.get('tags'):
+            found = match_recipes(query['ingredients'], tag_ids,
+                                  query.get('cooking_time'), query['limit'])
+        recipes = annotate_recipes(Recipe.objects.all()).in_bulk(
+            [pk for _, _, pk in found])
+        drop_recipes(pk for _, _, pk in found if pk not in recipes)
+        results = []
+        for ratio, matched, pk in found:
+            if pk in recipes:
+                recipe = recipes[pk]
+                recipe.match_ratio = ratio
+                recipe.matched_ingredients = matched
+                results.append(recipe)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='feed',
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Recipes of the followed authors, newest first.
+
+        The page is cut from the cached timeline of ids and loaded in
+        one bulk query.
+        """
+        ids = get_feed(request.user.id, user_relations(request).follows)
+        paginator = LimitOffsetPagination()
+        page = paginator.paginate_queryset(ids, request, view=self)
+        recipes = annotate_recipes(Recipe.objects.all()).in_bulk(page)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in page if pk in recipes], many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(
         detail=True,
@@ -160,7 +278,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_204_NO_CONTENT)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ProfiledViewMixin, viewsets.ModelViewSet):
     """User endpoint handler."""
     permission_classes = [AllowAny]
     queryset = User.objects.all()
@@ -186,3 +304,11 @@ class UserViewSet(viewsets.ModelViewSet):
         else:
             return Response(serializer.errors,
                             status=status.HTTP_400_BAD_REQUEST)
+
+
+class MetricsView(ProfiledViewMixin, APIView):
+    """Counts and latencies collected by api.metrics."""
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(snapshot())
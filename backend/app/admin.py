@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 
 from .models import (Download, Favorite, Follow, Ingredient,
                      IngredientForRecipe, Recipe, Tag)
+from .search import index_recipes
 
 User = get_user_model()
 
@@ -22,7 +23,12 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientForRecipeSubjectInline,)
 
     def show_favorite(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
+    show_favorite.admin_order_field = 'favorites_count'
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        index_recipes([form.instance.pk])
 
 
 @admin.register(Ingredient)
@@ -0,0 +1,225 @@
+import json
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from itertools import accumulate, chain, islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Ingredient
+from .versions import current_version
+
+FIELDS = ('id', 'name', 'measurement_unit')
+SEPARATOR = '\0'
+LAST_CHAR = '\U0010ffff'
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def fold(value):
+    """Upper-case value a character at a time, as the UPPER that the
+    database filter's __istartswith and __icontains apply.
+
+    str.upper turns some characters, such as ß, into two; UPPER keeps
+    them, so a name matches here exactly when it matches in SQL.
+    """
+    folded = value.upper()
+    if len(folded) == len(value):
+        return folded
+    return ''.join(char if len(char.upper()) > 1 else char.upper()
+                   for char in value)
+
+
+class Keys:
+    """Sequence of the folded names in sorted order, for bisect."""
+
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+
+    def __len__(self):
+        return len(self.catalogue)
+
+    def __getitem__(self, position):
+        return self.catalogue.key(position)
+
+
+class Rows(Sequence):
+    """Search result of a catalogue; ingredients are made on access."""
+
+    def __init__(self, catalogue, positions):
+        self.catalogue = catalogue
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Rows(self.catalogue, self.positions[index])
+        return self.catalogue.ingredient(self.positions[index])
+
+    def json(self):
+        return self.catalogue.json(self.positions)
+
+
+class IngredientCatalogue:
+    """Read-only snapshot of the ingredient table kept in flat arrays.
+
+    Rows are ordered by their folded name. The folded names are
+    joined into one string, so every prefix covers a contiguous range
+    of positions found by binary search: the same answer a trie walk
+    gives, without a node per character. Substring matches come from
+    str.find over the same string. Primary keys are kept sorted next
+    to the positions they point at. The rows are also kept encoded
+    as IngredientsSerializer renders them, in one byte string built on
+    first use, so a list is answered by joining slices of it.
+    """
+
+    def __init__(self, version, rows):
+        self.version = version
+        rows = sorted(rows, key=lambda row: (fold(row[1]), row[0]))
+        self.pks = array('q')
+        self.units = []
+        self.unit_codes = {}
+        self.unit_of = array('H')
+        self.name_starts = array('L', [0])
+        self.key_starts = array('L', [0])
+        names, keys = [], []
+        for pk, name, unit in rows:
+            key = fold(name).replace(SEPARATOR, '') + SEPARATOR
+            if unit not in self.unit_codes:
+                self.unit_codes[unit] = len(self.units)
+                self.units.append(unit)
+            self.pks.append(pk)
+            self.unit_of.append(self.unit_codes[unit])
+            self.name_starts.append(self.name_starts[-1] + len(name))
+            self.key_starts.append(self.key_starts[-1] + len(key))
+            names.append(name)
+            keys.append(key)
+        self.names = ''.join(names)
+        self.keys = ''.join(keys)
+        self.by_pk = array('L', sorted(range(len(rows)),
+                                       key=self.pks.__getitem__))
+        self.sorted_pks = array('q', (self.pks[position]
+                                      for position in self.by_pk))
+        self.encoded = None
+
+    def name(self, position):
+        return self.names[self.name_starts[position]:
+                          self.name_starts[position + 1]]
+
+    def __len__(self):
+        return len(self.pks)
+
+    def key(self, position):
+        return self.keys[
+            self.key_starts[position]:self.key_starts[position + 1] - 1]
+
+    def ingredient(self, position):
+        return Ingredient.from_db(DEFAULT_DB_ALIAS, FIELDS, (
+            self.pks[position], self.name(position),
+            self.units[self.unit_of[position]]))
+
+    def encode(self):
+        units = [json.dumps(unit, ensure_ascii=False) for unit in self.units]
+        rows = [
+            f'{{"id":{self.pks[position]},"name":'
+            f'{json.dumps(self.name(position), ensure_ascii=False)},'
+            f'"measurement_unit":{units[self.unit_of[position]]}}}'.encode()
+            for position in range(len(self))]
+        return b''.join(rows), array('Q', accumulate(
+            (len(row) for row in rows), initial=0))
+
+    def json(self, positions):
+        """JSON array of the rows at positions."""
+        if self.encoded is None:
+            self.encoded = self.encode()
+        encoded, starts = self.encoded
+        return b'[%s]' % b','.join(
+            encoded[starts[position]:starts[position + 1]]
+            for position in positions)
+
+    def position(self, pk):
+        index = bisect_left(self.sorted_pks, pk)
+        if index < len(self) and self.sorted_pks[index] == pk:
+            return self.by_pk[index]
+        return None
+
+    def get(self, pk):
+        """Return the ingredient with the given id or None."""
+        position = self.position(pk)
+        return None if position is None else self.ingredient(position)
+
+    def in_bulk(self, pks):
+        """Same as Ingredient.objects.in_bulk(pks)."""
+        positions = ((pk, self.position(pk)) for pk in pks)
+        return {pk: self.ingredient(position)
+                for pk, position in positions if position is not None}
+
+    def starting_with(self, prefix):
+        keys = Keys(self)
+        start = bisect_left(keys, prefix)
+        return range(start, bisect_left(keys, prefix + LAST_CHAR, start))
+
+    def containing(self, part):
+        """Yield positions whose name contains part but does not start
+        with it, in name order."""
+        found = self.keys.find(part)
+        while found != -1:
+            position = bisect_right(self.key_starts, found) - 1
+            if found != self.key_starts[position]:
+                yield position
+            found = self.keys.find(part, self.key_starts[position + 1])
+
+    def matching(self, positions, unit):
+        return (position for position in positions
+                if unit is None or self.unit_of[position] == unit)
+
+    def search(self, name=None, measurement_unit=None, limit=None):
+        """Mirror FilterForIngredients: prefix matches first, then
+        substring matches, capped at limit."""
+        return Rows(self, array('L', self.found(name, measurement_unit,
+                                                limit)))
+
+    def found(self, name, measurement_unit, limit):
+        if measurement_unit is None:
+            unit = None
+        elif measurement_unit in self.unit_codes:
+            unit = self.unit_codes[measurement_unit]
+        else:
+            return ()
+        if not name:
+            return self.matching(self.by_pk, unit)
+        value = fold(name)
+        if SEPARATOR in value:
+            return ()
+        stages = [self.starting_with(value)]
+        if len(value) >= 3:
+            stages.append(self.containing(value))
+        return islice(self.matching(chain.from_iterable(stages), unit),
+                      limit or settings.INGREDIENT_AUTOCOMPLETE_LIMIT)
+
+
+def get_catalogue():
+    """Return the snapshot of this process, rebuilt if it is outdated."""
+    global _snapshot
+    version = current_version(Ingredient)
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        with _lock:
+            if _snapshot is None or _snapshot.version != version:
+                _snapshot = IngredientCatalogue(
+                    version,
+                    Ingredient.objects.values_list(*FIELDS).iterator())
+            snapshot = _snapshot
+    return snapshot
+
+
+def ingredients_in_bulk(pks):
+    """Resolve ingredient ids from the snapshot when it is enabled."""
+    if settings.INGREDIENT_CATALOGUE_CACHE:
+        return get_catalogue().in_bulk(pks)
+    return Ingredient.objects.in_bulk(pks)
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Download, Favorite, Follow, Recipe
+from .versions import bump_instance_versions
+
+User = get_user_model()
+
+# Relation model: (counted model, relation field, counter column).
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    Download: (Recipe, 'recipe_id', 'in_carts_count'),
+    Follow: (User, 'author_id', 'followers_count'),
+}
+
+
+def change_counter(relation, target_id, step):
+    """Add step to the counter of a relation row's target in the database.
+
+    The counter is changed with an F() expression, so concurrent
+    changes add up; it is never taken below zero. Cached responses
+    showing the target are outdated after commit.
+    """
+    model, _, counter = COUNTERS[relation]
+    rows = model.objects.filter(pk=target_id)
+    if step < 0:
+        rows = rows.filter(**{f'{counter}__gte': -step})
+    rows.update(**{counter: F(counter) + step})
+    transaction.on_commit(
+        lambda: bump_instance_versions(model, [target_id]))
+
+
+def live_counts(relation, target_ids=None):
+    """Count the relation rows of every target, or of the given ones."""
+    _, field, _ = COUNTERS[relation]
+    rows = relation.objects.all()
+    if target_ids is not None:
+        rows = rows.filter(**{f'{field}__in': target_ids})
+    return dict(rows.values_list(field).annotate(
+        count=Count('pk')).order_by())
+
+
+def drifted(relation):
+    """Targets whose stored counter differs from the live count.
+
+    Yields (target id, stored, live).
+    """
+    model, _, counter = COUNTERS[relation]
+    live = live_counts(relation)
+    stored = dict(model.objects.filter(
+        **{f'{counter}__gt': 0}).values_list('pk', counter).iterator())
+    for pk in live.keys() | stored.keys():
+        if live.get(pk, 0) != stored.get(pk, 0):
+            yield pk, stored.get(pk, 0), live.get(pk, 0)
+
+
+def correct(relation, target_ids):
+    """Set counters of the targets to the live count.
+
+    The targets are locked before they are counted: a relation row
+    committed meanwhile then either is counted or changes the counter
+    after the correction, never both.
+    """
+    model, _, counter = COUNTERS[relation]
+    with transaction.atomic():
+        targets = list(model.objects.select_for_update().filter(
+            pk__in=target_ids).only('pk'))
+        live = live_counts(relation, target_ids)
+        for target in targets:
+            setattr(target, counter, live.get(target.pk, 0))
+        model.objects.bulk_update(targets, (counter,))
+        transaction.on_commit(
+            lambda: bump_instance_versions(model, target_ids))
+
+
+def recount(relation):
+    """Set the counters of every target from the relation rows in one
+    update, for rows loaded without signals; caches are not outdated."""
+    model, field, counter = COUNTERS[relation]
+    rows = relation.objects.filter(**{field: OuterRef('pk')}).order_by(
+    ).values(field).annotate(count=Count('pk')).values('count')
+    model.objects.update(**{counter: Coalesce(Subquery(rows), 0)})
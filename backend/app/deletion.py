@@ -0,0 +1,51 @@
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+
+from .models import (Download, Favorite, IngredientForRecipe, Recipe,
+                     ShoppingCartTotals)
+
+# Rows deleted along with a recipe by delete_recipe(); their delete
+# handlers leave the cart totals and the recipe counters alone.
+ACCOUNTED_MODELS = (IngredientForRecipe, Download, Favorite)
+
+
+def delete_recipe(recipe):
+    """Delete a recipe, taking it out of every cart at once.
+
+    Without this, every ingredient row and cart entry deleted with the
+    recipe updates the carts and the recipe on its own. Other ways of
+    deleting recipes (querysets, deleted authors) are still accounted
+    for, row by row.
+    """
+    using = router.db_for_write(Recipe, instance=recipe)
+    with transaction.atomic(using=using):
+        collector = Collector(using=using)
+        collector.collect([recipe])
+        ShoppingCartTotals.objects.remove_recipe(recipe.pk)
+        delete_collected(collector)
+
+
+def delete_accounted(rows):
+    """Delete loaded rows whose delete handlers' work the caller does.
+
+    The rows go through the collector as QuerySet.delete() would send
+    them, in one statement a model; the handlers see them accounted
+    and skip them instead of adjusting the carts row by row.
+    """
+    if not rows:
+        return
+    collector = Collector(using=router.db_for_write(type(rows[0])))
+    collector.collect(rows)
+    delete_collected(collector)
+
+
+def delete_collected(collector):
+    for model in ACCOUNTED_MODELS:
+        for row in collector.data.get(model, ()):
+            row._accounted = True
+    collector.delete()
+
+
+def accounted(row):
+    """Whether the caller deleting a row has done its handlers' work."""
+    return getattr(row, '_accounted', False)
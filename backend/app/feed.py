@@ -0,0 +1,185 @@
+import heapq
+from array import array
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .models import Follow, Recipe
+
+User = get_user_model()
+
+CELEBRITIES_KEY = 'feed:celebrities'
+# The set last computed, kept to tell the authors who dropped out of it.
+KNOWN_CELEBRITIES_KEY = 'feed:celebrities:known'
+
+
+def timeline_key(user_id):
+    return f'feed:timeline:{user_id}'
+
+
+def author_key(author_id):
+    return f'feed:author:{author_id}'
+
+
+def pack(ids):
+    return array('q', ids).tobytes()
+
+
+def unpack(data):
+    return array('q', data)
+
+
+def newest(*timelines):
+    """Merge timelines of ids, newest first, into one without repeats."""
+    merged = heapq.merge(*timelines, reverse=True)
+    return list(islice((pk for pk, _ in groupby(merged)),
+                       settings.FEED_TIMELINE_LENGTH))
+
+
+def recent_recipes(author_ids):
+    """Ids of the newest recipes of the authors, newest first."""
+    if not author_ids:
+        return []
+    return list(Recipe.objects.filter(author_id__in=author_ids).order_by(
+        '-id').values_list('pk', flat=True)[:settings.FEED_TIMELINE_LENGTH])
+
+
+def get_celebrities(stored=None):
+    """Authors followed by more than FEED_FANOUT_LIMIT users.
+
+    Their recipes are not copied into the timelines of the followers
+    but read from a list of the author's own when a feed is shown.
+    The set is computed from the followers counters anew every
+    FEED_CELEBRITIES_TIMEOUT seconds, and authors who dropped out of
+    it get their recipes copied into the timelines again.
+    """
+    if stored is None:
+        stored = cache.get_many([CELEBRITIES_KEY])
+    if CELEBRITIES_KEY in stored:
+        return frozenset(unpack(stored[CELEBRITIES_KEY]))
+    celebrities = sorted(User.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_LIMIT).values_list(
+            'pk', flat=True))
+    known = cache.get(KNOWN_CELEBRITIES_KEY)
+    if known is not None:
+        for author_id in set(unpack(known)).difference(celebrities):
+            fan_out(author_id, recent_recipes([author_id]))
+    cache.set(CELEBRITIES_KEY, pack(celebrities),
+              settings.FEED_CELEBRITIES_TIMEOUT)
+    cache.set(KNOWN_CELEBRITIES_KEY, pack(celebrities), timeout=None)
+    return frozenset(celebrities)
+
+
+def get_feed(user_id, follows):
+    """Ids of the recipes of the followed authors, newest first.
+
+    The timeline of the user and the set of celebrities come in one
+    cache read; lists of followed celebrities, if any, in another.
+    A missing timeline or list is rebuilt from the database. Ids go
+    in creation order, which is the order recipes are published in.
+    """
+    key = timeline_key(user_id)
+    stored = cache.get_many([key, CELEBRITIES_KEY])
+    if CELEBRITIES_KEY not in stored:
+        # Computing the set may copy recipes into the timeline.
+        get_celebrities(stored)
+        stored = cache.get_many([key, CELEBRITIES_KEY])
+    celebrities = get_celebrities(stored) & follows
+    timelines = []
+    if key in stored:
+        timelines.append(unpack(stored[key]))
+    else:
+        timeline = recent_recipes(follows - celebrities)
+        cache.set(key, pack(timeline), settings.FEED_TIMELINE_TIMEOUT)
+        timelines.append(timeline)
+    if celebrities:
+        keys = {author_id: author_key(author_id)
+                for author_id in celebrities}
+        stored = cache.get_many(keys.values())
+        missing = {}
+        for author_id, key in keys.items():
+            if key in stored:
+                timelines.append(unpack(stored[key]))
+                continue
+            timeline = recent_recipes([author_id])
+            missing[key] = pack(timeline)
+            timelines.append(timeline)
+        if missing:
+            cache.set_many(missing, settings.FEED_TIMELINE_TIMEOUT)
+    return newest(*timelines)
+
+
+def add_to_timelines(keys, ids):
+    """Merge recipe ids into the timelines cached under keys.
+
+    Timelines that are not cached are left for the next read to
+    rebuild. Writes take no lock, so a recipe lost to a concurrent
+    write shows up again once the timeline expires.
+    """
+    stored = cache.get_many(keys)
+    if stored:
+        cache.set_many(
+            {key: pack(newest(unpack(data), ids))
+             for key, data in stored.items()},
+            settings.FEED_TIMELINE_TIMEOUT)
+
+
+def remove_from_timelines(keys, ids):
+    """Take recipe ids out of the timelines cached under keys."""
+    ids = set(ids)
+    stored = cache.get_many(keys)
+    changed = {}
+    for key, data in stored.items():
+        timeline = unpack(data)
+        if ids.intersection(timeline):
+            changed[key] = pack(pk for pk in timeline if pk not in ids)
+    if changed:
+        cache.set_many(changed, settings.FEED_TIMELINE_TIMEOUT)
+
+
+def follower_timelines(author_id):
+    """Timeline keys of the followers of an author."""
+    return [timeline_key(user_id) for user_id in Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)]
+
+
+def fan_out(author_id, ids):
+    """Put recipe ids into the timelines of the author's followers."""
+    add_to_timelines(follower_timelines(author_id), ids)
+
+
+def publish_recipe(recipe):
+    """Put a new recipe into the timelines of the author's followers.
+
+    The recipe of a celebrity goes into the author's list only, which
+    every follower reads along with the timeline.
+    """
+    if recipe.author_id in get_celebrities():
+        add_to_timelines([author_key(recipe.author_id)], [recipe.pk])
+    else:
+        fan_out(recipe.author_id, [recipe.pk])
+
+
+def unpublish_recipe(recipe_id, author_id):
+    """Take a deleted recipe out of the timelines holding it.
+
+    The recipes of a celebrity are in the author's list only. Timelines
+    filled before the author became one may still hold some; they
+    expire, and the feed skips recipes that are gone.
+    """
+    keys = [author_key(author_id)]
+    if author_id not in get_celebrities():
+        keys += follower_timelines(author_id)
+    remove_from_timelines(keys, [recipe_id])
+
+
+def follow_author(user_id, author_id):
+    """Backfill the timeline of a user with a newly followed author."""
+    add_to_timelines([timeline_key(user_id)], recent_recipes([author_id]))
+
+
+def forget_feed(user_id):
+    """Drop the timeline of a user who stopped following an author."""
+    cache.delete(timeline_key(user_id))
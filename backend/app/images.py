@@ -0,0 +1,203 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.signals import request_started
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+from .versions import bump_instance_versions
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+RENDITION_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+RECONCILE_KEY = 'recipe-images:reconcile'
+
+_executor = None
+_lock = threading.Lock()
+
+
+def rendition_name(name, rendition):
+    """Storage name of a rendition, derived from the original's name."""
+    return '%s.%s.%s' % (os.path.splitext(name)[0], rendition,
+                         RENDITION_EXTENSIONS[RENDITION_FORMAT])
+
+
+def image_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def image_url(recipe, rendition):
+    """URL of a rendition once it is made, of the original until then,
+    and None for a recipe without an image."""
+    if not recipe.image:
+        return None
+    if recipe.images_ready:
+        return default_storage.url(
+            rendition_name(recipe.image.name, rendition))
+    return recipe.image.url
+
+
+def resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail((width, height), Image.LANCZOS)
+    return image
+
+
+def make_renditions(recipe_id, name, overwrite=False):
+    """Write every rendition of an uploaded image and mark the recipe.
+
+    The recipe is marked only while it still holds this image, so a
+    slow job never flags renditions of an image replaced meanwhile.
+    Images are named by content, so renditions that exist already are
+    kept unless overwrite is set.
+    """
+    try:
+        renditions = {}
+        for rendition, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+            target = rendition_name(name, rendition)
+            if overwrite or not default_storage.exists(target):
+                renditions[target] = size
+        if renditions:
+            write_renditions(name, renditions)
+        if Recipe.objects.filter(pk=recipe_id, image=name).update(
+                images_ready=True):
+            bump_instance_versions(Recipe, [recipe_id])
+    except Exception:
+        logger.exception('Не удалось подготовить изображение %s', name)
+
+
+def write_renditions(name, renditions):
+    with image_storage().open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image = image.convert(
+            'RGBA' if RENDITION_FORMAT == 'WEBP'
+            and 'A' in image.getbands() else 'RGB')
+    for target, size in renditions.items():
+        buffer = BytesIO()
+        resize(image, *size).save(
+            buffer, RENDITION_FORMAT, quality=settings.RECIPE_IMAGE_QUALITY)
+        default_storage.delete(target)
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def stored_images(storage):
+    """Names of the uploaded originals, without their renditions."""
+    upload_to = Recipe._meta.get_field('image').upload_to
+    directories, _ = storage.listdir(upload_to)
+    for directory in directories:
+        _, files = storage.listdir(os.path.join(upload_to, directory))
+        for file in files:
+            if os.path.splitext(os.path.splitext(file)[0])[1]:
+                continue
+            yield os.path.join(upload_to, directory, file)
+
+
+def collect_images(grace, batch_size=500):
+    """Delete the images no recipe refers to, with their renditions.
+
+    One file may back several recipes, and saving an image that is
+    stored already only touches its file, before the recipe row naming
+    it is committed. So only files left untouched for grace seconds are
+    deleted. Returns the names of the deleted images.
+    """
+    storage = image_storage()
+    cutoff = datetime.now() - timedelta(seconds=grace)
+    names = [name for name in stored_images(storage)
+             if storage.get_modified_time(name) < cutoff]
+    deleted = []
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        referenced = set(Recipe.objects.filter(
+            image__in=batch).values_list('image', flat=True))
+        for name in batch:
+            if name in referenced:
+                continue
+            storage.delete(name)
+            for rendition in settings.RECIPE_IMAGE_RENDITIONS:
+                default_storage.delete(rendition_name(name, rendition))
+            deleted.append(name)
+    return deleted
+
+
+def reconcile_renditions(overwrite=False):
+    """Make the renditions of every recipe still waiting for them.
+
+    Jobs queued in the worker pool die with their process, leaving
+    images_ready False; this catches up on them. With overwrite every
+    rendition is made again. Returns the number of recipes processed.
+    """
+    recipes = Recipe.objects.exclude(image='')
+    if not overwrite:
+        recipes = recipes.filter(images_ready=False)
+    pending = list(recipes.values_list('pk', 'image'))
+    for pk, name in pending:
+        make_renditions(pk, name, overwrite=overwrite)
+    return len(pending)
+
+
+def reconcile_in_worker():
+    try:
+        reconcile_renditions()
+    finally:
+        connection.close()
+
+
+def reconcile_on_start(**kwargs):
+    """Queue a reconcile pass in the pool of a newly started process.
+
+    Runs on the first request of each process; of the processes started
+    together only the one claiming the cache key scans, at most once
+    per RECIPE_IMAGE_RECONCILE_INTERVAL.
+    """
+    if not settings.RECIPE_IMAGE_WORKERS:
+        return
+    request_started.disconnect(dispatch_uid=RECONCILE_KEY)
+    if cache.add(RECONCILE_KEY, True,
+                 settings.RECIPE_IMAGE_RECONCILE_INTERVAL):
+        get_executor().submit(reconcile_in_worker)
+
+
+def make_renditions_in_worker(recipe_id, name):
+    try:
+        make_renditions(recipe_id, name)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images')
+    return _executor
+
+
+def schedule_renditions(recipe):
+    """Make the renditions in the worker pool after the commit.
+
+    With RECIPE_IMAGE_WORKERS = 0 they are made right away instead.
+    """
+    def submit():
+        if settings.RECIPE_IMAGE_WORKERS:
+            get_executor().submit(
+                make_renditions_in_worker, recipe.pk, name)
+        else:
+            make_renditions(recipe.pk, name)
+
+    name = recipe.image.name
+    transaction.on_commit(submit)
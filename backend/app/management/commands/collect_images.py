@@ -0,0 +1,18 @@
+from app.images import collect_images
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Delete recipe images no recipe refers to, with their '
+            'renditions. Meant to run periodically.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.RECIPE_IMAGE_COLLECT_GRACE,
+            help='Keep images touched within this many seconds.')
+
+    def handle(self, *args, **options):
+        deleted = collect_images(options['grace'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено изображений: {len(deleted)}'))
@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from app.models import Ingredient
+from app.versions import bump_version
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv')
+SKIP = '[], \r\n\t'
+SYNTHETIC_UNITS = ('г', 'кг', 'мл', 'л', 'шт', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+def read_csv(path):
+    """Yield (name, measurement_unit) rows of a CSV file."""
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) >= 2 and row[:2] != ['name', 'measurement_unit']:
+                yield row[0], row[1]
+
+
+def read_json(path, chunk_size=64 * 1024):
+    """Yield rows of a JSON array of objects without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    with open(path, encoding='utf-8') as file:
+        for chunk in iter(lambda: file.read(chunk_size), ''):
+            buffer += chunk
+            position = 0
+            while True:
+                while position < len(buffer) and buffer[position] in SKIP:
+                    position += 1
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    break
+                yield item['name'], item['measurement_unit']
+            buffer = buffer[position:]
+    if buffer.strip(SKIP):
+        raise CommandError(f'Не удалось разобрать конец файла: {buffer[:50]}')
+
+
+def synthetic(count):
+    """Yield a generated catalogue of the given size."""
+    for number in range(count):
+        yield (f'ингредиент {number:07d}',
+               SYNTHETIC_UNITS[number % len(SYNTHETIC_UNITS)])
+
+
+def unique(rows):
+    """Drop repeated (name, measurement_unit) pairs."""
+    seen = set()
+    for name, unit in rows:
+        name, unit = name.strip(), unit.strip()
+        if name and unit and (name, unit) not in seen:
+            seen.add((name, unit))
+            yield name, unit
+
+
+class CopyStream:
+    """File-like object feeding rows to COPY ... FROM STDIN."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+        self.count = 0
+
+    @staticmethod
+    def escape(value):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace(
+            '\n', '\\n').replace('\r', '\\r')
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.count += 1
+            self.buffer += '\t'.join(map(self.escape, row)) + '\n'
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class Command(BaseCommand):
+    help = ('Load the ingredient catalogue from CSV or JSON, skipping '
+            'rows already in the database. Uses COPY on PostgreSQL and '
+            'bulk_create elsewhere.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help='File format, by default taken from the '
+                                 'file extension.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Use bulk_create even on PostgreSQL.')
+        parser.add_argument('--synthetic', type=int, metavar='COUNT',
+                            help='Load COUNT generated rows instead of a '
+                                 'file, to benchmark the import.')
+
+    def handle(self, *args, **options):
+        rows = unique(self.read(options))
+        started = time.monotonic()
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        with transaction.atomic():
+            if use_copy:
+                read, created = self.copy(rows)
+            else:
+                read, created = self.bulk_create(rows, options['batch_size'])
+        if created:
+            bump_version(Ingredient)
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано: {read}, добавлено: {created}, '
+            f'пропущено: {read - created}, время: {elapsed:.2f} с, '
+            f'{read / elapsed:.0f} строк/с ({"COPY" if use_copy else "bulk"})'
+        ))
+
+    def read(self, options):
+        if options['synthetic'] is not None:
+            return synthetic(options['synthetic'])
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл {path} не найден')
+        file_format = options['format'] or os.path.splitext(
+            path)[1].lstrip('.').lower()
+        if file_format == 'csv':
+            return read_csv(path)
+        if file_format == 'json':
+            return read_json(path)
+        raise CommandError(f'Неизвестный формат файла: {file_format}')
+
+    def bulk_create(self, rows, batch_size):
+        # Rows already loaded hit the unique (name, measurement_unit)
+        # constraint and are left out.
+        before = Ingredient.objects.count()
+        read = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return read, Ingredient.objects.count() - before
+            read += len(batch)
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch), ignore_conflicts=True)
+
+    def copy(self, rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        stream = CopyStream(rows)
+        with connection.cursor() as cursor:
+            # An empty catalogue takes the rows directly; otherwise they
+            # pass through a temporary table to skip the loaded ones.
+            if not Ingredient.objects.exists():
+                cursor.cursor.copy_expert(
+                    f'COPY {table} (name, measurement_unit) FROM STDIN',
+                    stream)
+                return stream.count, stream.count
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name varchar(300), measurement_unit varchar(50)) '
+                'ON COMMIT DROP')
+            cursor.cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN', stream)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM ingredient_import '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            created = cursor.rowcount
+            # Dropped at once, not only on commit, so the command can run
+            # again inside an enclosing transaction.
+            cursor.execute('DROP TABLE ingredient_import')
+            return stream.count, created
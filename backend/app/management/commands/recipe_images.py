@@ -0,0 +1,18 @@
+from app.images import reconcile_renditions
+from app.models import Recipe
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Make the image renditions of recipes that have none yet, '
+            'such as those left unmade by a stopped process.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Remake the renditions of every recipe.')
+
+    def handle(self, *args, **options):
+        done = reconcile_renditions(overwrite=options['all'])
+        ready = Recipe.objects.filter(images_ready=True).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {done}, с готовыми изображениями: {ready}'))
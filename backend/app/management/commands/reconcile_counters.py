@@ -0,0 +1,33 @@
+from app.counters import COUNTERS, correct, drifted
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Correct favorites, shopping cart and followers counters that '
+            'drifted from the rows they count. Meant to run periodically.')
+    batch_size = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only report drifted counters, fail if there are any.')
+
+    def handle(self, *args, **options):
+        total = 0
+        for relation, (model, _, counter) in COUNTERS.items():
+            found = list(drifted(relation))
+            total += len(found)
+            for pk, stored, live in found:
+                self.stderr.write(
+                    f'{model._meta.label} id={pk} {counter}: '
+                    f'записано {stored}, на самом деле {live}')
+            if options['verify']:
+                continue
+            ids = [pk for pk, _, _ in found]
+            for start in range(0, len(ids), self.batch_size):
+                correct(relation, ids[start:start + self.batch_size])
+        if options['verify'] and total:
+            raise CommandError(f'Расхождений: {total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Расхождений: {total}' if options['verify']
+            else f'Исправлено счётчиков: {total}'))
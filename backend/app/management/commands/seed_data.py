@@ -0,0 +1,196 @@
+import random
+import time
+from itertools import accumulate, islice
+
+from app.counters import COUNTERS, recount
+from app.models import (Download, Favorite, Follow, Ingredient,
+                        IngredientForRecipe, Recipe, Tag)
+from app.search import index_recipes
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+User = get_user_model()
+
+# Users at every scale; the other sizes are per user.
+SCALES = {'small': 100, 'medium': 1000, 'large': 10000}
+USERNAME_PREFIX = 'seed'
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена',
+               'Дмитрий', 'Наталья', 'Алексей')
+LAST_NAMES = ('Иванова', 'Смирнов', 'Кузнецова', 'Попов', 'Соколова',
+              'Лебедев', 'Козлова', 'Новиков', 'Морозова', 'Волков')
+DISHES = ('суп', 'салат', 'пирог', 'запеканка', 'рагу', 'омлет', 'паста',
+          'каша', 'котлеты', 'блины', 'борщ', 'плов', 'жаркое', 'десерт')
+INGREDIENTS_PER_RECIPE = (5, 30, 10)
+TAGS_PER_RECIPE = (1, 3)
+WORDS_PER_TEXT = (20, 80)
+
+
+class Zipf:
+    """Draws items with weights falling as a power of a random rank, so
+    a few items are drawn most of the time, like popular authors."""
+
+    def __init__(self, items, rng, exponent=1.0):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            rank ** -exponent for rank in range(1, len(self.items) + 1)))
+        self.rng = rng
+
+    def choices(self, count):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights,
+                                k=count)
+
+    def sample(self, count, exclude=None):
+        """Up to count distinct items other than exclude."""
+        count = min(count, len(self.items) // 2)
+        chosen = set()
+        for _ in range(10):
+            chosen.update(self.choices(count - len(chosen)))
+            chosen.discard(exclude)
+            if len(chosen) >= count:
+                break
+        return sorted(chosen)
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset for benchmarks: users, follows with '
+            'a power law of followers, recipes of 5-30 ingredients, '
+            'favorites and shopping carts. The same --seed on an empty '
+            'database gives the same data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small')
+        parser.add_argument('--users', type=int,
+                            help='Number of users, overrides --scale.')
+        parser.add_argument('--recipes-per-user', type=float, default=10)
+        parser.add_argument('--follows-per-user', type=float, default=20)
+        parser.add_argument('--favorites-per-user', type=float, default=30)
+        parser.add_argument('--cart-per-user', type=float, default=4)
+        parser.add_argument('--password', default='password',
+                            help='Password of every seeded user.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+                username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError('Данные уже засеяны: начните с пустой базы '
+                               '(manage.py flush)')
+        ingredients = list(Ingredient.objects.exclude(
+            name__startswith='ингредиент ').values_list('id', 'name'))
+        if not ingredients:
+            raise CommandError('Нет ингредиентов: загрузите каталог '
+                               '(manage.py load_ingredients)')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        users = self.create_users(
+            options['users'] or SCALES[options['scale']],
+            options['password'])
+        tags = self.get_tags()
+        recipes = self.create_recipes(
+            Zipf(users, self.rng), round(
+                len(users) * options['recipes_per_user']),
+            ingredients, tags)
+        self.relate(Follow, 'author_id', users, Zipf(users, self.rng),
+                    options['follows_per_user'])
+        self.relate(Favorite, 'recipe_id', users, Zipf(recipes, self.rng),
+                    options['favorites_per_user'])
+        self.relate(Download, 'recipe_id', users, Zipf(recipes, self.rng),
+                    options['cart_per_user'])
+        for relation in COUNTERS:
+            recount(relation)
+        call_command('shopping_cart_totals', stdout=self.stdout)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(users)}, рецептов: {len(recipes)}, '
+            f'время: {time.monotonic() - started:.0f} с; кэш очищен'))
+
+    def batches(self, objects):
+        objects = iter(objects)
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def create_users(self, count, password):
+        password = make_password(password)
+        for batch in self.batches(range(count)):
+            User.objects.bulk_create(User(
+                username=f'{USERNAME_PREFIX}{number}',
+                email=f'{USERNAME_PREFIX}{number}@example.com',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password) for number in batch)
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by(
+                'pk').values_list('pk', flat=True))
+
+    @staticmethod
+    def get_tags():
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        if tags:
+            return tags
+        return [Tag.objects.create(name=name, color=color, slug=slug).pk
+                for name, color, slug in (('Завтрак', '#E26C2D', 'breakfast'),
+                                          ('Обед', '#49B64E', 'lunch'),
+                                          ('Ужин', '#8775D2', 'dinner'))]
+
+    def create_recipes(self, authors, count, ingredients, tags):
+        vocabulary = [word for _, name in ingredients for word in name.split()]
+        through = Recipe.tags.through
+        created = []
+        for batch in self.batches(authors.choices(count)):
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    self.recipe(author, ingredients, vocabulary)
+                    for author in batch)
+                if not recipes[0].pk:
+                    recipes = Recipe.objects.order_by('-pk')[:len(batch)]
+                ids = sorted(recipe.pk for recipe in recipes)
+                IngredientForRecipe.objects.bulk_create(
+                    IngredientForRecipe(
+                        recipe_id=pk, ingredient_id=ingredient,
+                        amount=self.rng.randint(1, 500))
+                    for pk in ids for ingredient, _ in self.rng.sample(
+                        ingredients, round(self.rng.triangular(
+                            *INGREDIENTS_PER_RECIPE))))
+                through.objects.bulk_create(
+                    through(recipe_id=pk, tag_id=tag) for pk in ids
+                    for tag in self.rng.sample(tags, min(len(tags), (
+                        self.rng.randint(*TAGS_PER_RECIPE)))))
+                index_recipes(ids)
+            created += ids
+            self.stdout.write(f'Рецептов: {len(created)} из {count}')
+        return created
+
+    def recipe(self, author, ingredients, vocabulary):
+        # Text words follow a Zipf-like law: a few are everywhere.
+        words = [vocabulary[int(len(vocabulary) * self.rng.random() ** 3)]
+                 for _ in range(self.rng.randint(*WORDS_PER_TEXT))]
+        _, ingredient = self.rng.choice(ingredients)
+        return Recipe(
+            author_id=author,
+            name=f'{self.rng.choice(DISHES)} {ingredient}',
+            text=' '.join(words),
+            image='media/generated.jpg',
+            cooking_time=self.rng.randint(5, 180))
+
+    def relate(self, model, field, users, targets, mean):
+        """Give every user an exponentially distributed number of rows
+        with Zipf-distributed targets; nobody follows themselves."""
+        own = field == 'author_id'
+        rows = (model(user_id=user, **{field: target}) for user in users
+                for target in targets.sample(
+                    round(mean * self.rng.expovariate(1)),
+                    exclude=user if own else None))
+        total = 0
+        for batch in self.batches(rows):
+            model.objects.bulk_create(batch)
+            total += len(batch)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {total}')
@@ -0,0 +1,68 @@
+from itertools import islice
+
+from app.models import ShoppingCartTotals
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the shopping cart totals table.'
+    batch_size = 1000
+    tolerance = 1e-6
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare stored totals with the live aggregate.')
+
+    def handle(self, *args, **options):
+        live = {
+            (row['recipe__download__user'], row['ingredient']):
+                (row['total'], row['entries'])
+            for row in ShoppingCartTotals.objects.live_totals().iterator()
+        }
+        if options['verify']:
+            self.verify(live)
+        else:
+            self.rebuild(live)
+
+    def rebuild(self, live):
+        rows = iter(live.items())
+        with transaction.atomic():
+            ShoppingCartTotals.objects.all().delete()
+            # Batches are cut here: an explicit batch_size would override
+            # the backend limit, e.g. 500 rows a statement on SQLite.
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                ShoppingCartTotals.objects.bulk_create(
+                    ShoppingCartTotals(user_id=user_id,
+                                       ingredient_id=ingredient_id,
+                                       amount=amount, entries=entries)
+                    for (user_id, ingredient_id), (amount, entries)
+                    in batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано строк: {len(live)}'))
+
+    def verify(self, live):
+        stored = {
+            (user_id, ingredient_id): (amount, entries)
+            for user_id, ingredient_id, amount, entries
+            in ShoppingCartTotals.objects.values_list(
+                'user_id', 'ingredient_id', 'amount', 'entries').iterator()
+        }
+        mismatches = 0
+        for key in live.keys() | stored.keys():
+            expected = live.get(key, (0, 0))
+            actual = stored.get(key, (0, 0))
+            if (expected[1] != actual[1]
+                    or abs(expected[0] - actual[0]) > self.tolerance):
+                mismatches += 1
+                self.stderr.write(
+                    f'user={key[0]} ingredient={key[1]}: '
+                    f'ожидалось {expected}, записано {actual}')
+        if mismatches:
+            raise CommandError(f'Расхождений: {mismatches}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги совпадают, строк: {len(live)}'))
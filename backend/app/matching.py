@@ -0,0 +1,417 @@
+import heapq
+import json
+import logging
+import os
+import stat
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import timedelta
+from itertools import chain, groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import IngredientForRecipe, Recipe
+from .versions import current_version
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SIZE_BITS = 8
+MAX_SIZE = (1 << SIZE_BITS) - 1
+
+_index = None
+_lock = threading.Lock()
+
+
+def grouped(rows):
+    """Return a lookup of the values grouped by the first column.
+
+    Rows come sorted by that column and keys are asked in the same
+    order, so the rows are read once, side by side with the recipes.
+    """
+    groups = groupby(rows, itemgetter(0))
+    current = next(groups, None)
+
+    def take(key):
+        nonlocal current
+        while current is not None and current[0] < key:
+            current = next(groups, None)
+        if current is None or current[0] != key:
+            return ()
+        values = [row[1] for row in current[1]]
+        current = next(groups, None)
+        return values
+    return take
+
+
+class RecipeIndex:
+    """Inverted index from ingredients to the recipes that use them.
+
+    Every recipe has a position and every ingredient sorted arrays of
+    the positions of its recipes, one per recipe size, so a query adds
+    up the arrays of its ingredients instead of dividing the recipe rows
+    by the ingredient set in SQL. Recipes changed after the build are
+    appended at new positions and their old ones are emptied, which
+    keeps the arrays sorted; the index is built anew once too many
+    positions are empty.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.horizon = self.next_horizon()
+        self.recipe_ids = array('q')
+        self.sizes = array('H')
+        self.cooking_times = array('H')
+        self.tag_masks = []
+        self.tag_bits = {}
+        self.postings = {}
+        self.max_size = 0
+        self.base = None
+        self.appended = {}
+        self.seen = {}
+        self.empty = 0
+        self.load()
+        self.base = len(self.recipe_ids)
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    @staticmethod
+    def next_horizon():
+        """Start of the window of changes the next refresh reloads.
+
+        A transaction may commit a change stamped a little before the
+        previous load, so the window reaches RECIPE_INDEX_OVERLAP
+        seconds back.
+        """
+        return timezone.now() - timedelta(
+            seconds=settings.RECIPE_INDEX_OVERLAP)
+
+    def load(self, pks=None):
+        """Append recipes with their ingredients and tags, in id order."""
+        recipes = Recipe.objects.order_by('pk')
+        ingredients = IngredientForRecipe.objects.order_by('recipe_id')
+        tags = Recipe.tags.through.objects.order_by('recipe_id')
+        if pks is not None:
+            recipes = recipes.filter(pk__in=pks)
+            ingredients = ingredients.filter(recipe_id__in=pks)
+            tags = tags.filter(recipe_id__in=pks)
+        ingredients = grouped(ingredients.values_list(
+            'recipe_id', 'ingredient_id').iterator())
+        tags = grouped(tags.values_list('recipe_id', 'tag_id').iterator())
+        for pk, cooking_time, modified in recipes.values_list(
+                'pk', 'cooking_time', 'modified').iterator():
+            if self.base is not None:
+                self.forget(pk)
+            self.append(pk, cooking_time, ingredients(pk), tags(pk))
+            if modified >= self.horizon:
+                self.seen[pk] = modified
+
+    def append(self, pk, cooking_time, ingredient_ids, tag_ids):
+        position = len(self.recipe_ids)
+        ingredient_ids = set(ingredient_ids)
+        size = min(len(ingredient_ids), MAX_SIZE)
+        self.recipe_ids.append(pk)
+        self.sizes.append(size)
+        self.cooking_times.append(min(int(cooking_time), 0xffff))
+        mask = 0
+        for tag_id in tag_ids:
+            bit = self.tag_bits.setdefault(tag_id, len(self.tag_bits))
+            mask |= 1 << bit
+        self.tag_masks.append(mask)
+        self.max_size = max(self.max_size, size)
+        for ingredient_id in ingredient_ids:
+            key = ingredient_id << SIZE_BITS | size
+            postings = self.postings.get(key)
+            if postings is None:
+                postings = self.postings[key] = array('l')
+            postings.append(position)
+        if self.base is not None:
+            self.appended[pk] = position
+
+    def position(self, pk):
+        position = self.appended.get(pk)
+        if position is None:
+            position = bisect_left(self.recipe_ids, pk, 0, self.base)
+            if position == self.base or self.recipe_ids[position] != pk:
+                return None
+        return position
+
+    def forget(self, pk):
+        """Empty the position of a recipe that changed or was deleted."""
+        position = self.position(pk)
+        if position is not None and self.sizes[position]:
+            self.sizes[position] = 0
+            self.empty += 1
+
+    def refresh(self, version):
+        """Reload the recipes changed since the last load.
+
+        Recipes already loaded with the same change stamp are skipped.
+        """
+        since, self.horizon = self.horizon, self.next_horizon()
+        changed = [
+            pk for pk, modified in Recipe.objects.filter(
+                modified__gte=since).values_list('pk', 'modified')
+            if self.seen.get(pk) != modified]
+        self.seen = {pk: modified for pk, modified in self.seen.items()
+                     if modified >= self.horizon}
+        if changed:
+            self.load(changed)
+        self.version = version
+
+    def outdated(self):
+        return self.empty > len(self) * settings.RECIPE_INDEX_EMPTY_SHARE
+
+    def dump(self, file):
+        """Write the index as a JSON header line and raw array buffers.
+
+        Tag masks are written as fixed-width integers, the postings as
+        their keys, lengths and positions laid end to end.
+        """
+        width = max(1, (len(self.tag_bits) + 7) // 8)
+        keys = array('q', self.postings)
+        arrays = {
+            'recipe_ids': self.recipe_ids,
+            'sizes': self.sizes,
+            'cooking_times': self.cooking_times,
+            'tag_masks': array('B', b''.join(
+                mask.to_bytes(width, 'little') for mask in self.tag_masks)),
+            'posting_keys': keys,
+            'posting_lengths': array(
+                'q', (len(self.postings[key]) for key in keys)),
+            'positions': array('l', chain.from_iterable(
+                self.postings[key] for key in keys)),
+            'appended': array('q', chain.from_iterable(
+                self.appended.items())),
+        }
+        header = {
+            'byteorder': sys.byteorder,
+            'version': self.version,
+            'horizon': self.horizon.isoformat(),
+            'max_size': self.max_size,
+            'base': self.base,
+            'empty': self.empty,
+            'mask_width': width,
+            'tag_bits': list(self.tag_bits.items()),
+            'seen': [(pk, modified.isoformat())
+                     for pk, modified in self.seen.items()],
+            'arrays': [(name, values.typecode, values.itemsize, len(values))
+                       for name, values in arrays.items()],
+        }
+        file.write(json.dumps(header).encode() + b'\n')
+        for values in arrays.values():
+            values.tofile(file)
+
+    @classmethod
+    def restore(cls, file):
+        """Read an index written by dump; ValueError if it does not fit
+        this platform or is cut short."""
+        header = json.loads(file.readline())
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError('snapshot written with another byte order')
+        arrays = {}
+        for name, typecode, itemsize, length in header['arrays']:
+            values = arrays[name] = array(typecode)
+            if values.itemsize != itemsize:
+                raise ValueError(f'{typecode} items differ in size')
+            try:
+                values.fromfile(file, length)
+            except EOFError:
+                raise ValueError('snapshot cut short')
+        index = cls.__new__(cls)
+        index.version = header['version']
+        index.horizon = parse_datetime(header['horizon'])
+        index.max_size = header['max_size']
+        index.base = header['base']
+        index.empty = header['empty']
+        index.tag_bits = dict(header['tag_bits'])
+        index.seen = {pk: parse_datetime(modified)
+                      for pk, modified in header['seen']}
+        index.recipe_ids = arrays['recipe_ids']
+        index.sizes = arrays['sizes']
+        index.cooking_times = arrays['cooking_times']
+        width = header['mask_width']
+        masks = arrays['tag_masks'].tobytes()
+        index.tag_masks = [int.from_bytes(masks[start:start + width],
+                                          'little')
+                           for start in range(0, len(masks), width)]
+        index.postings = {}
+        positions, start = arrays['positions'], 0
+        for key, length in zip(arrays['posting_keys'],
+                               arrays['posting_lengths']):
+            index.postings[key] = positions[start:start + length]
+            start += length
+        appended = arrays['appended']
+        index.appended = dict(zip(appended[::2], appended[1::2]))
+        return index
+
+    def search(self, ingredient_ids, tag_ids=(), max_cooking_time=None,
+               limit=None):
+        """Return (match ratio, matched, recipe id) of the best recipes.
+
+        Ratio is the share of the recipe's ingredients that were given;
+        ties go to the recipe that uses more of them, then the newest.
+        Recipes with any of tag_ids are kept when tags are given.
+        Postings are split by recipe size, so the ratio of a bucket
+        follows from the counts alone and buckets that cannot beat the
+        recipes found so far are never looked at.
+        """
+        tag_mask = 0
+        for tag_id in tag_ids:
+            if tag_id in self.tag_bits:
+                tag_mask |= 1 << self.tag_bits[tag_id]
+        if tag_ids and not tag_mask:
+            return []
+        ingredient_ids = set(ingredient_ids)
+        buckets = []
+        for size in range(1, self.max_size + 1):
+            counts = Counter()
+            for ingredient_id in ingredient_ids:
+                counts.update(self.postings.get(
+                    ingredient_id << SIZE_BITS | size, ()))
+            if counts:
+                buckets.append((max(counts.values()) / size, size, counts))
+        buckets.sort(key=itemgetter(0, 1), reverse=True)
+        best = []
+        limit = limit or settings.RECIPE_INDEX_LIMIT
+        for bound, size, counts in buckets:
+            if len(best) == limit and bound < best[0][0]:
+                break
+            self.collect(best, limit, size, counts,
+                         lambda position: self.admits(
+                             position, size, tag_mask, max_cooking_time))
+        return sorted(best, reverse=True)
+
+    def collect(self, best, limit, size, counts, admits):
+        """Push the best recipes of a size bucket into the heap best.
+
+        Positions are taken level by level of their matched count, from
+        the top, until no lower level can enter the heap.
+        """
+        for matched in sorted(set(counts.values()), reverse=True):
+            ratio = matched / size
+            if len(best) == limit and ratio < best[0][0]:
+                return
+            level = [position for position, count in counts.items()
+                     if count == matched]
+            level.sort(key=self.recipe_ids.__getitem__, reverse=True)
+            for position in level:
+                if not admits(position):
+                    continue
+                entry = (ratio, matched, self.recipe_ids[position])
+                if len(best) < limit:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+                else:
+                    break
+
+    def admits(self, position, size, tag_mask, max_cooking_time):
+        return (self.sizes[position] == size
+                and (not tag_mask or self.tag_masks[position] & tag_mask)
+                and (max_cooking_time is None
+                     or self.cooking_times[position] <= max_cooking_time))
+
+
+def snapshot_directory():
+    """RECIPE_INDEX_DIR, made if missing, or None when it is unset or
+    not private to this user."""
+    directory = settings.RECIPE_INDEX_DIR
+    if not directory:
+        return None
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if (not stat.S_ISDIR(info.st_mode) or info.st_mode & 0o077
+            or info.st_uid != getattr(os, 'getuid', lambda: -1)()):
+        logger.error('RECIPE_INDEX_DIR %s должен быть каталогом приложения '
+                     'с правами 0700; индекс строится в процессе',
+                     directory)
+        return None
+    return directory
+
+
+def read_snapshot(path):
+    try:
+        with open(path, 'rb') as file:
+            return RecipeIndex.restore(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.exception('Не удалось прочитать индекс %s', path)
+        return None
+
+
+def write_snapshot(index, path):
+    """Replace the snapshot at once, so readers never see half of it."""
+    with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), delete=False) as file:
+        index.dump(file)
+    os.replace(file.name, path)
+
+
+def load_index(version):
+    """Build the index, or take it over from another process.
+
+    Building reads every recipe row, which takes some 10 seconds over a
+    million recipes. With RECIPE_INDEX_DIR set, the workers of a host
+    share it through a snapshot there: the first to need the index
+    builds it while the others wait on the lock, and they load the
+    snapshot and catch up on the changes since it was taken. The
+    snapshot is built anew once too many of its positions are empty.
+    Without fcntl the workers do not wait and may build it side by
+    side.
+    """
+    directory = snapshot_directory()
+    if directory is None:
+        return RecipeIndex(version)
+    path = os.path.join(directory, 'recipe_index')
+    with open(path + '.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        index = read_snapshot(path)
+        if index is not None and index.version != version:
+            index.refresh(version)
+            if not index.outdated():
+                write_snapshot(index, path)
+        if index is None or index.outdated():
+            index = RecipeIndex(version)
+            write_snapshot(index, path)
+    return index
+
+
+def match_recipes(ingredient_ids, tag_ids=(), max_cooking_time=None,
+                  limit=None):
+    """Search the index of this process, brought up to date first.
+
+    The index is loaded on the first search. It is changed in place, so
+    searches and refreshes take turns under the lock.
+    """
+    global _index
+    version = current_version(Recipe)
+    with _lock:
+        if _index is None or _index.outdated():
+            _index = load_index(version)
+        elif _index.version != version:
+            _index.refresh(version)
+        return _index.search(ingredient_ids, tag_ids, max_cooking_time,
+                             limit)
+
+
+def drop_recipes(pks):
+    """Drop recipes found deleted while loading the search results."""
+    with _lock:
+        if _index is not None:
+            for pk in pks:
+                _index.forget(pk)
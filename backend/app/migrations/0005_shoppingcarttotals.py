@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_cart_totals(apps, schema_editor):
+    IngredientForRecipe = apps.get_model('app', 'IngredientForRecipe')
+    ShoppingCartTotals = apps.get_model('app', 'ShoppingCartTotals')
+    rows = IngredientForRecipe.objects.filter(
+        recipe__download__isnull=False
+    ).values('recipe__download__user', 'ingredient').annotate(
+        total=Sum('amount'), entries=Count('id')).order_by()
+    ShoppingCartTotals.objects.bulk_create(
+        (ShoppingCartTotals(user_id=row['recipe__download__user'],
+                            ingredient_id=row['ingredient'],
+                            amount=row['total'], entries=row['entries'])
+         for row in rows.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0004_auto_20220202_1956'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotals',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.FloatField(default=0, verbose_name='cart_totals_amount')),
+                ('entries', models.IntegerField(default=0, verbose_name='cart_totals_entries')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to='app.Ingredient', verbose_name='cart_totals_ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='user_who_has_cart_totals')),
+            ],
+            options={
+                'verbose_name': 'Shopping_cart_totals',
+                'verbose_name_plural': 'Shopping_cart_totals',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotals',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_totals_ingredient'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
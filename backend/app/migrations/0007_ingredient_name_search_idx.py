@@ -0,0 +1,58 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:40
+
+from django.db import migrations
+
+POSTGRESQL_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS ingredient_name_prefix_idx '
+    'ON app_ingredient (UPPER(name::text) text_pattern_ops)',
+)
+POSTGRESQL_TRIGRAM_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx '
+    'ON app_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+SQLITE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS ingredient_name_prefix_idx '
+    'ON app_ingredient (name COLLATE NOCASE)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS ingredient_name_prefix_idx',
+    'DROP INDEX IF EXISTS ingredient_name_trgm_idx',
+)
+
+
+def create_indexes(apps, schema_editor):
+    """Index the expressions Django uses for istartswith and icontains."""
+    vendor = schema_editor.connection.vendor
+    statements = ()
+    if vendor == 'postgresql':
+        statements = POSTGRESQL_INDEXES
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions "
+                           "WHERE name = 'pg_trgm'")
+            if cursor.fetchone():
+                statements += POSTGRESQL_TRIGRAM_INDEXES
+    elif vendor == 'sqlite':
+        statements = SQLITE_INDEXES
+    for statement in statements:
+        schema_editor.execute(statement)
+    if vendor == 'postgresql':
+        # Expression indexes get no statistics until the table is analyzed.
+        schema_editor.execute('ANALYZE app_ingredient')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        for statement in DROP_INDEXES:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_ingredient_name_unit_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='images_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='images_ready'),
+        ),
+    ]
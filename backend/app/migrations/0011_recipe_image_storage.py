@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 23:40
+
+import app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_recipe_images_ready'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, storage=app.storage.ContentAddressedStorage(), upload_to='media/', verbose_name='recipe_photo'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-19 00:20
+
+from django.db import migrations
+
+POSTGRESQL_CREATE = (
+    'ALTER TABLE app_recipe ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS recipe_search_idx '
+    'ON app_recipe USING gin (search_vector)',
+)
+POSTGRESQL_DROP = (
+    'DROP INDEX IF EXISTS recipe_search_idx',
+    'ALTER TABLE app_recipe DROP COLUMN IF EXISTS search_vector',
+)
+SQLITE_CREATE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS app_recipe_search USING fts5 '
+    "(name, ingredients, text, tokenize = 'unicode61 remove_diacritics 2')",
+)
+SQLITE_DROP = (
+    'DROP TABLE IF EXISTS app_recipe_search',
+)
+
+
+def create_search_index(apps, schema_editor):
+    """Add the full-text index of recipes and fill it."""
+    from app.search import index_recipes
+
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRESQL_CREATE,
+                  'sqlite': SQLITE_CREATE}.get(vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+    if statements:
+        index_recipes()
+    if vendor == 'postgresql':
+        schema_editor.execute('ANALYZE app_recipe')
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'postgresql': POSTGRESQL_DROP,
+                  'sqlite': SQLITE_DROP}.get(
+                      schema_editor.connection.vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
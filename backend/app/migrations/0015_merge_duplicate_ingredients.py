@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:40
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """Point rows of repeated catalogue pairs at the first copy."""
+    Ingredient = apps.get_model('app', 'Ingredient')
+    IngredientForRecipe = apps.get_model('app', 'IngredientForRecipe')
+    ShoppingCartTotals = apps.get_model('app', 'ShoppingCartTotals')
+    repeated = Ingredient.objects.order_by().values(
+        'name', 'measurement_unit').annotate(
+            first=Min('id'), copies=Count('id')).filter(copies__gt=1)
+    for pair in repeated:
+        copies = list(Ingredient.objects.filter(
+            name=pair['name'], measurement_unit=pair['measurement_unit'],
+        ).exclude(id=pair['first']).values_list('id', flat=True))
+        IngredientForRecipe.objects.filter(ingredient_id__in=copies).update(
+            ingredient_id=pair['first'])
+        for row in ShoppingCartTotals.objects.filter(
+                ingredient_id__in=copies):
+            total, _ = ShoppingCartTotals.objects.get_or_create(
+                user_id=row.user_id, ingredient_id=pair['first'])
+            total.amount += row.amount
+            total.entries += row.entries
+            total.save(update_fields=('amount', 'entries'))
+            row.delete()
+        Ingredient.objects.filter(id__in=copies).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -24,6 +27,9 @@ class Ingredient(models.Model):
         ordering = ('id',)
         verbose_name = 'Ingredient'
         verbose_name_plural = 'Ingredients'
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'measurement_unit'],
+                                    name='unique_ingredient_name_unit')]
 
     def __str__(self):
         return self.name
@@ -58,12 +64,14 @@ class Recipe(models.Model):
         User,
         on_delete=models.CASCADE,
         verbose_name='author_recipe',
-        related_name='recipes'
+        related_name='recipes',
+        db_index=False
     )
     name = models.CharField(max_length=300, verbose_name='recipe_name',
                             null=False, blank=False)
     image = models.ImageField(upload_to='media/', null=False, blank=False,
-                              verbose_name='recipe_photo')
+                              verbose_name='recipe_photo', db_index=True,
+                              storage=ContentAddressedStorage())
     text = models.TextField(null=False, blank=False,
                             verbose_name='recipe_text')
     ingredient = models.ManyToManyField(Ingredient, blank=False,
@@ -79,12 +87,28 @@ class Recipe(models.Model):
                                                )
     pub_date = models.DateTimeField(verbose_name='date of publication recipe',
                                     auto_now_add=True, db_index=True)
+    modified = models.DateTimeField(verbose_name='date of change recipe',
+                                    auto_now=True, db_index=True)
+    images_ready = models.BooleanField(default=False, editable=False,
+                                       verbose_name='images_ready')
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='favorites_count')
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='in_carts_count')
 
     class Meta:
         """Performs sorting."""
         ordering = ('-pub_date',)
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-favorites_count', '-pub_date', '-id'],
+                         name='recipe_favorites_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -124,12 +148,14 @@ class Follow(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='follower'
+        related_name='follower',
+        db_index=False
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='following'
+        related_name='following',
+        db_index=False
     )
 
     class Meta:
@@ -140,6 +166,10 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_follow')
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
 
 
 class Favorite(models.Model):
@@ -148,13 +178,15 @@ class Favorite(models.Model):
         User,
         on_delete=models.CASCADE,
         verbose_name='user_who_has_favorite_recipe',
-        related_name='fovorite'
+        related_name='fovorite',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         verbose_name='favorite_recipe',
-        related_name='fovorite'
+        related_name='fovorite',
+        db_index=False
     )
 
     class Meta:
@@ -164,6 +196,10 @@ class Favorite(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique_favorite_recipe')]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx'),
+        ]
 
 
 class Download(models.Model):
@@ -172,13 +208,15 @@ class Download(models.Model):
         User,
         on_delete=models.CASCADE,
         verbose_name='user_who_has_download_recipe',
-        related_name='download'
+        related_name='download',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         verbose_name='download_recipe',
-        related_name='download'
+        related_name='download',
+        db_index=False
     )
 
     class Meta:
@@ -188,3 +226,97 @@ class Download(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique_download_recipe')]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='download_recipe_user_idx'),
+        ]
+
+
+class ShoppingCartTotalsManager(models.Manager):
+    """Keeps ingredient totals of shopping carts up to date."""
+
+    def recipe_totals(self, recipe_id):
+        """Amount and number of rows of every ingredient in a recipe."""
+        rows = IngredientForRecipe.objects.filter(
+            recipe_id=recipe_id).values('ingredient_id').annotate(
+                total=Sum('amount'), entries=Count('id')).order_by()
+        return {row['ingredient_id']: (row['total'], row['entries'])
+                for row in rows}
+
+    def apply(self, user_ids, totals, sign=1):
+        """Add (sign=1) or subtract (sign=-1) totals for every user."""
+        user_ids = list(user_ids)
+        if not user_ids or not totals:
+            return
+        totals = {pk: (sign * amount, sign * entries)
+                  for pk, (amount, entries) in totals.items()}
+        with transaction.atomic():
+            existing = list(self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=totals))
+            for row in existing:
+                amount, entries = totals[row.ingredient_id]
+                row.amount = F('amount') + amount
+                row.entries = F('entries') + entries
+            self.bulk_update(existing, ('amount', 'entries'))
+            if any(entries < 0 for _, entries in totals.values()):
+                self.filter(user_id__in=user_ids, ingredient_id__in=totals,
+                            entries__lte=0).delete()
+            seen = {(row.user_id, row.ingredient_id) for row in existing}
+            self.bulk_create(
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=amount, entries=entries)
+                for user_id in user_ids
+                for ingredient_id, (amount, entries) in totals.items()
+                if entries > 0 and (user_id, ingredient_id) not in seen)
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        """Account a recipe put into (or taken out of) a user's cart."""
+        self.apply([user_id], self.recipe_totals(recipe_id), sign)
+
+    def change_recipe(self, recipe_id, totals, sign=1):
+        """Account changed recipe rows in every cart holding the recipe."""
+        user_ids = Download.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True)
+        self.apply(user_ids, totals, sign)
+
+    def remove_recipe(self, recipe_id):
+        """Account a recipe taken out of every cart holding it."""
+        user_ids = Download.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True)
+        self.apply(user_ids, self.recipe_totals(recipe_id), sign=-1)
+
+    def live_totals(self):
+        """Totals computed from the carts themselves."""
+        return IngredientForRecipe.objects.filter(
+            recipe__download__isnull=False
+        ).values('recipe__download__user', 'ingredient').annotate(
+            total=Sum('amount'), entries=Count('id')).order_by()
+
+
+class ShoppingCartTotals(models.Model):
+    """The model describes ingredient totals of the shopping cart."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='user_who_has_cart_totals',
+        related_name='cart_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='cart_totals_ingredient',
+        related_name='cart_totals'
+    )
+    amount = models.FloatField(default=0,
+                               verbose_name='cart_totals_amount')
+    entries = models.IntegerField(default=0,
+                                  verbose_name='cart_totals_entries')
+    objects = ShoppingCartTotalsManager()
+
+    class Meta:
+        """Performs sorting."""
+        verbose_name = 'Shopping_cart_totals'
+        verbose_name_plural = 'Shopping_cart_totals'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique_cart_totals_ingredient')]
@@ -0,0 +1,60 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Download, Favorite, Follow
+
+RELATIONS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'cart': (Download, 'recipe_id'),
+    'follows': (Follow, 'author_id'),
+}
+EMPTY = frozenset()
+
+
+def relation_key(user_id, name):
+    return f'relations:{user_id}:{name}'
+
+
+class UserRelations:
+    """Ids of the recipes a user favorited or put into the cart, and of
+    the authors the user follows."""
+
+    def __init__(self, favorites=EMPTY, cart=EMPTY, follows=EMPTY):
+        self.favorites = favorites
+        self.cart = cart
+        self.follows = follows
+
+
+def get_relations(user):
+    """Load the relation sets of a user, rebuilding missing ones.
+
+    Each set is cached as the bytes of a sorted array of ids, eight
+    bytes an id, and turned into a frozenset for O(1) membership.
+    """
+    if user.is_anonymous:
+        return UserRelations()
+    keys = {name: relation_key(user.pk, name) for name in RELATIONS}
+    stored = cache.get_many(keys.values())
+    missing = {}
+    sets = {}
+    for name, key in keys.items():
+        if key in stored:
+            sets[name] = frozenset(array('q', stored[key]))
+            continue
+        model, field = RELATIONS[name]
+        ids = array('q', sorted(model.objects.filter(
+            user=user).values_list(field, flat=True)))
+        missing[key] = ids.tobytes()
+        sets[name] = frozenset(ids)
+    if missing:
+        cache.set_many(missing, settings.USER_RELATIONS_TIMEOUT)
+    return UserRelations(**sets)
+
+
+def forget_relation(model, user_id):
+    """Drop the cached set a Favorite, Download or Follow row is in."""
+    for name, (relation_model, _) in RELATIONS.items():
+        if relation_model is model:
+            cache.delete(relation_key(user_id, name))
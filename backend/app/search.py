@@ -0,0 +1,149 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+TERM = re.compile(r'\w+')
+ORDERING = ('-pub_date', '-id')
+# Recipes written by one statement when they are given by id.
+INDEX_BATCH_SIZE = 500
+# Conditions on the recipe id column for index_recipes().
+WITH_IDS = '{column} IN %s'
+WITH_INGREDIENT = ('{column} IN (SELECT recipe_id '
+                   'FROM app_ingredientforrecipe WHERE ingredient_id = %s)')
+
+POSTGRESQL_DOCUMENT = (
+    "setweight(to_tsvector(%(config)s, app_recipe.name), 'A') || "
+    "setweight(to_tsvector(%(config)s, coalesce(("
+    "SELECT string_agg(app_ingredient.name, ' ') "
+    "FROM app_ingredientforrecipe JOIN app_ingredient "
+    "ON app_ingredient.id = app_ingredientforrecipe.ingredient_id "
+    "WHERE app_ingredientforrecipe.recipe_id = app_recipe.id), '')), 'B')"
+    " || "
+    "setweight(to_tsvector(%(config)s, app_recipe.text), 'C')"
+)
+POSTGRESQL_INDEX = 'UPDATE app_recipe SET search_vector = %s' % (
+    POSTGRESQL_DOCUMENT % {'config': '%s::regconfig'})
+POSTGRESQL_QUERY = 'to_tsquery(%s::regconfig, %s)'
+# Condition of the candidate subquery, where Django names the recipe
+# table by an alias; unqualified, the column resolves to it.
+POSTGRESQL_MATCH = 'search_vector @@ %s' % POSTGRESQL_QUERY
+POSTGRESQL_RANK = 'ts_rank(app_recipe.search_vector, %s)' % POSTGRESQL_QUERY
+
+SQLITE_DELETE = 'DELETE FROM app_recipe_search'
+SQLITE_INDEX = (
+    'INSERT INTO app_recipe_search (rowid, name, ingredients, text) '
+    "SELECT app_recipe.id, app_recipe.name, coalesce(("
+    "SELECT group_concat(app_ingredient.name, ' ') "
+    'FROM app_ingredientforrecipe JOIN app_ingredient '
+    'ON app_ingredient.id = app_ingredientforrecipe.ingredient_id '
+    "WHERE app_ingredientforrecipe.recipe_id = app_recipe.id), ''), "
+    'app_recipe.text FROM app_recipe'
+)
+SQLITE_MATCH = 'app_recipe_search MATCH %s'
+SQLITE_MATCHES = ('id IN (SELECT rowid FROM app_recipe_search '
+                  'WHERE app_recipe_search MATCH %s)')
+SQLITE_JOIN = 'app_recipe_search.rowid = app_recipe.id'
+SQLITE_RANK = 'app_recipe_search.rank'
+
+
+def search_terms(value):
+    """Words of a search string, at most SEARCH_MAX_TERMS of them."""
+    return TERM.findall(value.casefold())[:settings.SEARCH_MAX_TERMS]
+
+
+def placeholders(ids):
+    return '(%s)' % ', '.join(['%s'] * len(ids))
+
+
+def index_recipes(ids=None, ingredient=None):
+    """Write the search document of the given recipes, of the recipes
+    using an ingredient, or of all.
+
+    The document is the recipe name, the names of its ingredients and
+    its text, weighted in that order. PostgreSQL keeps it in the
+    search_vector column, SQLite in the app_recipe_search FTS5 table;
+    other databases have no index and are searched with icontains.
+    The signals reindex the recipes of a renamed or deleted ingredient.
+    """
+    if ingredient is not None:
+        write_documents(WITH_INGREDIENT, [ingredient])
+    elif ids is None:
+        write_documents(None, [])
+    else:
+        ids = list(ids)
+        for start in range(0, len(ids), INDEX_BATCH_SIZE):
+            batch = ids[start:start + INDEX_BATCH_SIZE]
+            write_documents(WITH_IDS % placeholders(batch), batch)
+
+
+def write_documents(condition, params):
+    def where(column):
+        if condition is None:
+            return ''
+        return ' WHERE ' + condition.format(column=column)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRESQL_INDEX + where('app_recipe.id'),
+                           [settings.SEARCH_CONFIG] * 3 + params)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(SQLITE_DELETE + where('rowid'), params)
+            cursor.execute(SQLITE_INDEX + where('app_recipe.id'), params)
+
+
+def forget_recipes(ids=None):
+    """Remove deleted recipes from the SQLite index.
+
+    PostgreSQL keeps the document in the recipe row itself.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    where = '' if ids is None else ' WHERE rowid IN %s' % placeholders(ids)
+    with connection.cursor() as cursor:
+        cursor.execute(SQLITE_DELETE + where, ids or [])
+
+
+def search_recipes(queryset, value):
+    """Filter recipes matching every word of value, best first.
+
+    The last word matches as a prefix, so results follow the user
+    while the word is typed. Ranking reads the document of every
+    match, so only the SEARCH_CANDIDATES newest matches are ranked and
+    counted: PostgreSQL finds them through the GIN index on
+    search_vector and ranks them with ts_rank, SQLite joins the FTS5
+    table and orders by its bm25 rank. Equal ranks go newest first.
+    """
+    terms = search_terms(value)
+    if not terms:
+        return queryset
+    if connection.vendor == 'postgresql':
+        query = (settings.SEARCH_CONFIG, ' & '.join(terms) + ':*')
+        candidates = queryset.extra(where=[POSTGRESQL_MATCH], params=query)
+        return queryset.filter(pk__in=newest(candidates)).extra(
+            select={'search_rank': POSTGRESQL_RANK}, select_params=query,
+            order_by=['-search_rank', *ORDERING])
+    if connection.vendor == 'sqlite':
+        query = (' '.join('"%s"' % term for term in terms) + '*',)
+        # Tables joined by the filters have an id too, so the matches
+        # are read from the recipe table alone.
+        matches = queryset.model.objects.extra(
+            where=[SQLITE_MATCHES], params=query).values('pk')
+        candidates = queryset.filter(pk__in=matches)
+        return queryset.filter(pk__in=newest(candidates)).extra(
+            tables=['app_recipe_search'],
+            where=[SQLITE_MATCH, SQLITE_JOIN], params=query,
+            select={'search_rank': SQLITE_RANK},
+            order_by=['search_rank', *ORDERING])
+    for term in terms:
+        queryset = queryset.filter(
+            Q(name__icontains=term) | Q(text__icontains=term)
+            | Q(ingredient__name__icontains=term))
+    return queryset.distinct()
+
+
+def newest(matches):
+    """Ids of the SEARCH_CANDIDATES newest of the matches."""
+    return matches.order_by(*ORDERING).values('pk')[
+        :settings.SEARCH_CANDIDATES]
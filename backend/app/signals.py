@@ -0,0 +1,229 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counters import COUNTERS, change_counter
+from .deletion import accounted
+from .feed import unpublish_recipe
+from .images import RECONCILE_KEY, reconcile_on_start, schedule_renditions
+from .models import (Download, Favorite, Follow, Ingredient,
+                     IngredientForRecipe, Recipe, ShoppingCartTotals, Tag)
+from .relations import forget_relation
+from .search import forget_recipes, index_recipes
+from .versions import bump_instance_versions, bump_version
+
+# Recipe fields that list pages and the ingredient index filter or sort
+# on: changing one outdates every recipe list, not only the recipe.
+LISTED_FIELDS = ('author_id', 'name', 'text', 'cooking_time', 'pub_date')
+
+
+@receiver(post_save, sender=Download)
+def add_cart_totals(sender, instance, created, **kwargs):
+    """Add the ingredients of a recipe put into the shopping cart."""
+    if created:
+        ShoppingCartTotals.objects.add_recipe(instance.user_id,
+                                              instance.recipe_id)
+
+
+@receiver(post_delete, sender=Download)
+def remove_cart_totals(sender, instance, **kwargs):
+    """Subtract the ingredients of a recipe taken out of the cart."""
+    if accounted(instance):
+        return
+    ShoppingCartTotals.objects.add_recipe(instance.user_id,
+                                          instance.recipe_id, sign=-1)
+
+
+@receiver(pre_save, sender=IngredientForRecipe)
+def remember_ingredient_row(sender, instance, **kwargs):
+    """Keep the stored values of a row that is about to change."""
+    stored = None
+    if instance.pk:
+        stored = IngredientForRecipe.objects.filter(
+            pk=instance.pk).values_list(
+                'recipe_id', 'ingredient_id', 'amount').first()
+    instance._stored_row = stored
+
+
+@receiver(post_save, sender=IngredientForRecipe)
+def update_cart_totals_row(sender, instance, **kwargs):
+    """Move cart totals from the stored row values to the new ones."""
+    if instance._stored_row is not None:
+        recipe_id, ingredient_id, amount = instance._stored_row
+        ShoppingCartTotals.objects.change_recipe(
+            recipe_id, {ingredient_id: (amount, 1)}, sign=-1)
+    ShoppingCartTotals.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: (instance.amount, 1)})
+
+
+@receiver(post_delete, sender=IngredientForRecipe)
+def remove_cart_totals_row(sender, instance, **kwargs):
+    """Subtract a deleted recipe row from the carts holding the recipe."""
+    if accounted(instance):
+        return
+    ShoppingCartTotals.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: (instance.amount, 1)},
+        sign=-1)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_reference_version(sender, **kwargs):
+    """Outdate cached reference data once the change is committed."""
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientForRecipe)
+@receiver(post_delete, sender=IngredientForRecipe)
+def bump_recipe_version(sender, instance, created=None, **kwargs):
+    """Outdate the cached responses showing the recipe once the change
+    is committed, and the ingredient index and every recipe list when
+    the recipe comes, goes or changes what it is listed by."""
+    recipe_id = instance.pk
+    listed = created is not False
+    if sender is IngredientForRecipe:
+        recipe_id = instance.recipe_id
+        if accounted(instance):
+            return
+        stored = getattr(instance, '_stored_row', None)
+        listed = listed or stored is None or (
+            stored[:2] != (recipe_id, instance.ingredient_id))
+        Recipe.objects.filter(pk=recipe_id).update(modified=timezone.now())
+    elif created is False:
+        listed = instance._listed_changed
+    transaction.on_commit(lambda: bump_recipe_versions([recipe_id], listed))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_retagged_recipe_version(sender, instance, action, reverse,
+                                 pk_set, **kwargs):
+    """Outdate the recipes given or losing a tag, and the lists."""
+    if action not in ('post_add', 'post_remove', 'post_clear') or (
+            action != 'post_clear' and not pk_set):
+        return
+    ids = list(pk_set or ()) if reverse else [instance.pk]
+    transaction.on_commit(lambda: bump_recipe_versions(ids, True))
+
+
+def bump_recipe_versions(ids, listed):
+    """Outdate the recipes, and every recipe list if listed."""
+    if listed:
+        bump_version(Recipe)
+    bump_instance_versions(Recipe, ids)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_user_version(sender, instance, **kwargs):
+    """Outdate the cached responses showing the user as an author."""
+    transaction.on_commit(
+        lambda: bump_instance_versions(sender, [instance.pk]))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Download)
+@receiver(post_delete, sender=Download)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def forget_user_relation(sender, instance, **kwargs):
+    """Drop the cached relation set of the user now and after commit.
+
+    The second drop discards a set another request may have rebuilt
+    from the data as it was before this transaction.
+    """
+    forget_relation(sender, instance.user_id)
+    transaction.on_commit(
+        lambda: forget_relation(sender, instance.user_id))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Download)
+@receiver(post_delete, sender=Download)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_relation(sender, instance, created=None, **kwargs):
+    """Keep the favorites, cart and followers counters in step."""
+    if created is False or accounted(instance):
+        return
+    _, field, _ = COUNTERS[sender]
+    change_counter(sender, getattr(instance, field),
+                   1 if created else -1)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_values(sender, instance, **kwargs):
+    """Reset the renditions of a recipe that gets a new image, and note
+    whether a listed field changes."""
+    stored = None
+    if instance.pk:
+        stored = Recipe.objects.filter(pk=instance.pk).values_list(
+            'image', *LISTED_FIELDS).first()
+    if stored is None:
+        stored = (None,) * (len(LISTED_FIELDS) + 1)
+    image, *listed = stored
+    instance._listed_changed = listed != [
+        getattr(instance, field) for field in LISTED_FIELDS]
+    instance._image_changed = image != instance.image.name
+    if instance._image_changed:
+        instance.images_ready = False
+
+
+@receiver(post_save, sender=Recipe)
+def make_recipe_renditions(sender, instance, **kwargs):
+    """Hand a new image over to the rendition workers."""
+    if instance._image_changed:
+        schedule_renditions(instance)
+
+
+request_started.connect(reconcile_on_start, dispatch_uid=RECONCILE_KEY)
+
+
+@receiver(pre_save, sender=Ingredient)
+def remember_ingredient_name(sender, instance, **kwargs):
+    """Keep the stored name of an ingredient that is about to change."""
+    instance._stored_name = None
+    if instance.pk:
+        instance._stored_name = Ingredient.objects.filter(
+            pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_renamed_ingredient(sender, instance, created, **kwargs):
+    """Rewrite the search documents of the recipes using a renamed
+    ingredient once the name is committed."""
+    if created or instance._stored_name == instance.name:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: index_recipes(ingredient=pk))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def reindex_deleted_ingredient(sender, instance, **kwargs):
+    """Rewrite the search documents of the recipes losing an ingredient
+    once its rows are deleted."""
+    ids = list(IngredientForRecipe.objects.filter(
+        ingredient=instance).values_list('recipe_id', flat=True))
+    if ids:
+        transaction.on_commit(lambda: index_recipes(ids))
+
+
+@receiver(post_delete, sender=Recipe)
+def unpublish_deleted_recipe(sender, instance, **kwargs):
+    """Take a deleted recipe out of the feeds once it is gone."""
+    pk, author_id = instance.pk, instance.author_id
+    transaction.on_commit(lambda: unpublish_recipe(pk, author_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_recipe_search(sender, instance, **kwargs):
+    """Drop a deleted recipe from the search index."""
+    forget_recipes([instance.pk])
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def version_key(model):
+    return f'version:{model._meta.label_lower}'
+
+
+def instance_version_key(model, pk):
+    return f'version:{model._meta.label_lower}:{pk}'
+
+
+def current_stamps(keys, timeout=None):
+    """Return the stamps under keys, starting missing ones now.
+
+    A stamp is the time of the last change in nanoseconds, so it also
+    serves as a Last-Modified date.
+    """
+    stamps = cache.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, timeout=timeout)
+        stamps.update(cache.get_many(missing))
+        # Without a reachable cache every stamp is new and nothing
+        # derived is reused.
+        for key in missing:
+            stamps.setdefault(key, now)
+    return stamps
+
+
+def current_versions(models):
+    """Return the version stamps of the models, starting missing ones."""
+    keys = [version_key(model) for model in models]
+    versions = current_stamps(keys)
+    return [versions[key] for key in keys]
+
+
+def current_version(model):
+    return current_versions([model])[0]
+
+
+def bump_version(model):
+    """Outdate everything derived from the model in every process."""
+    cache.set(version_key(model), time.time_ns(), timeout=None)
+
+
+def current_instance_versions(model, pks):
+    """Return {key: stamp} of the given rows of the model.
+
+    Stamps of single rows expire after INSTANCE_VERSION_TIMEOUT; one
+    started anew is newer than any stamp it replaces, so it outdates
+    what was derived before.
+    """
+    return current_stamps([instance_version_key(model, pk) for pk in pks],
+                          settings.INSTANCE_VERSION_TIMEOUT)
+
+
+def bump_instance_versions(model, pks):
+    """Outdate everything derived from the given rows of the model."""
+    now = time.time_ns()
+    cache.set_many({instance_version_key(model, pk): now for pk in pks},
+                   settings.INSTANCE_VERSION_TIMEOUT)
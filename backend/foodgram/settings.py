@@ -1,4 +1,5 @@
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -15,6 +16,8 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['*']
 
+TESTING = 'test' in sys.argv or 'pytest' in sys.modules
+
 
 # Application definition
 
@@ -37,6 +40,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
+    'api.profiling.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -108,6 +113,11 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+    # Same JSON as rest_framework.renderers.JSONRenderer, with orjson.
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 
@@ -135,3 +145,126 @@ DATABASES = {
         'PORT': os.getenv('DB_PORT', default='5432'),
     }
 }
+
+# The version stamps that outdate the per-worker snapshots live in this
+# cache, so every worker has to see the same one. Django's default
+# memory cache suits a single process only; infra/docker-compose.yml
+# points CACHE_BACKEND and CACHE_LOCATION at memcached, shared by the
+# workers and management commands. A file cache would do for one host,
+# but it culls a third of its entries, stamps included, once it holds
+# MAX_ENTRIES (300 by default).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+if TESTING:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+# Responses of these types are compressed by api.compression from this
+# many bytes: per request at COMPRESSION_LEVELS, cached reference data
+# once at COMPRESSION_STORED_LEVELS. HTML is left out: pages carrying a
+# CSRF token next to reflected input are open to BREACH when compressed.
+COMPRESSION_TYPES = ('application/json',)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVELS = {'br': 4, 'gzip': 6}
+COMPRESSION_STORED_LEVELS = {'br': 9, 'gzip': 9}
+USER_RELATIONS_TIMEOUT = 60 * 10
+# Anonymous recipe pages are cached until something they show changes.
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', default='true').lower() == 'true'
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+# Recipe lists and pages are built by api.fast_serializers rather than
+# ListRecipeSerializer; the JSON is the same.
+FAST_RECIPE_SERIALIZERS = os.getenv(
+    'FAST_RECIPE_SERIALIZERS', default='true').lower() == 'true'
+INSTANCE_VERSION_TIMEOUT = 60 * 60
+METRICS_FLUSH_INTERVAL = 10
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf')
+
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+INGREDIENT_CATALOGUE_CACHE = os.getenv(
+    'INGREDIENT_CATALOGUE_CACHE', default='true').lower() == 'true'
+
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+# Bounding box of every rendition and whether it is cropped to fill it.
+RECIPE_IMAGE_RENDITIONS = {
+    'card': (600, 400, True),
+    'detail': (1280, 1280, False),
+    'preview': (160, 160, True),
+}
+RECIPE_IMAGE_QUALITY = 80
+# Tests make the renditions inline, without the worker pool.
+RECIPE_IMAGE_WORKERS = 0 if TESTING else int(
+    os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+# Seconds between the reconcile passes that make the renditions left
+# unmade by a stopped process; see app.images.reconcile_on_start.
+RECIPE_IMAGE_RECONCILE_INTERVAL = 60 * 10
+# Seconds an image no recipe refers to is kept by collect_images.
+RECIPE_IMAGE_COLLECT_GRACE = 60 * 60 * 24
+
+# Text search configuration of PostgreSQL used for recipe search.
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', default='russian')
+SEARCH_MAX_TERMS = 8
+# Newest matches of a search that are ranked; older ones are left out.
+SEARCH_CANDIDATES = 1000
+
+RECIPE_INDEX_LIMIT = 10
+RECIPE_INDEX_MAX_LIMIT = 100
+RECIPE_INDEX_MAX_INGREDIENTS = 50
+# Seconds a refresh of the ingredient index looks back past the last one.
+RECIPE_INDEX_OVERLAP = 60
+# Share of emptied positions that makes the index get built anew.
+RECIPE_INDEX_EMPTY_SHARE = 0.2
+# Directory, private to the app user (mode 0700), where the workers of
+# one host share the ingredient index instead of each building its own.
+# Unset, every worker builds its own.
+RECIPE_INDEX_DIR = os.getenv('RECIPE_INDEX_DIR', default='')
+
+# Recipe ids kept in the feed timeline of a user.
+FEED_TIMELINE_LENGTH = 500
+FEED_TIMELINE_TIMEOUT = 60 * 60 * 24
+# Authors with more followers are read on demand instead of fanned out.
+FEED_FANOUT_LIMIT = 1000
+# Seconds the set of such authors is kept before it is computed anew.
+FEED_CELEBRITIES_TIMEOUT = 60 * 5
+
+# Queries a view may run per request, by view name, with the user's
+# cached relation sets missing. Going over is logged, or fails the
+# request with QUERY_BUDGET_STRICT, which is on in tests.
+QUERY_BUDGETS = {
+    'TagViewSet.list': 1,
+    'TagViewSet.retrieve': 1,
+    'IngredientViewSet.list': 2,
+    'IngredientViewSet.retrieve': 2,
+    'RecipeViewSet.list': 9,
+    'RecipeViewSet.retrieve': 8,
+    'RecipeViewSet.create': 22,
+    'RecipeViewSet.update': 32,
+    'RecipeViewSet.partial_update': 32,
+    'RecipeViewSet.destroy': 23,
+    'RecipeViewSet.favorite': 8,
+    'RecipeViewSet.shopping_cart': 15,
+    'RecipeViewSet.download_shopping_cart': 2,
+    'RecipeViewSet.what_to_cook': 12,
+    'RecipeViewSet.feed': 10,
+    'FollowAPI.post': 12,
+    'FollowAPI.delete': 8,
+    'FollowList.get': 7,
+    'UserViewSet.list': 6,
+    'UserViewSet.retrieve': 5,
+    'UserViewSet.me': 5,
+}
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGET_STRICT = TESTING
+# Requests slower than this many seconds are logged as warnings.
+SLOW_REQUEST_THRESHOLD = 0.5
+SERVER_TIMING = os.getenv(
+    'SERVER_TIMING', default=str(DEBUG)).lower() == 'true'
@@ -0,0 +1,104 @@
+import importlib
+
+import pytest
+from app import matching
+from app.models import Ingredient, IngredientForRecipe, Recipe, Tag
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+# The migrations of app lag behind its models, so the test database is
+# built from the models (--nomigrations in pytest.ini); the indexes
+# these migrations add by hand are added on top.
+RAW_INDEX_MIGRATIONS = (
+    ('0007_ingredient_name_search_idx', 'create_indexes'),
+    ('0012_recipe_search', 'create_search_index'),
+)
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip the tests marked postgresql on other databases."""
+    if connection.vendor == 'postgresql':
+        return
+    skip = pytest.mark.skip(reason='needs PostgreSQL')
+    for item in items:
+        if 'postgresql' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        with connection.schema_editor() as schema_editor:
+            for module, function in RAW_INDEX_MIGRATIONS:
+                migration = importlib.import_module(
+                    f'app.migrations.{module}')
+                getattr(migration, function)(None, schema_editor)
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path, monkeypatch):
+    """Media in a temporary directory, renditions made in place, an
+    empty cache and no ingredient index in memory or on disk for every
+    test."""
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.RECIPE_IMAGE_WORKERS = 0
+    settings.RECIPE_INDEX_DIR = ''
+    monkeypatch.setattr(matching, '_index', None)
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def client_for():
+    def make(user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+    return make
+
+
+@pytest.fixture
+def users(db):
+    return [User.objects.create_user(
+        username=f'user{number}', email=f'user{number}@example.com',
+        first_name='Имя', last_name='Фамилия', password='password')
+        for number in range(4)]
+
+
+@pytest.fixture
+def tags(db):
+    return [Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (('Завтрак', '#E26C2D', 'breakfast'),
+                                      ('Обед', '#49B64E', 'lunch'),
+                                      ('Ужин', '#8775D2', 'dinner'))]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('соль', 'г'), ('сахар', 'г'),
+                               ('мука', 'г'), ('молоко', 'мл'),
+                               ('яйца', 'шт'), ('масло', 'г'),
+                               ('рис', 'г'), ('сыр', 'г'))]
+
+
+@pytest.fixture
+def make_recipe(tags, ingredients):
+    """Create a recipe with a share of the tags and ingredients."""
+    def make(author, name='Рецепт', ingredient_count=3, tag_count=2,
+             **fields):
+        recipe = Recipe.objects.create(author=author, name=name, **{
+            'text': 'Текст рецепта', 'cooking_time': 10,
+            'image': 'media/recipe.png', **fields})
+        recipe.tags.set(tags[:tag_count])
+        for number, ingredient in enumerate(ingredients[:ingredient_count]):
+            IngredientForRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=number + 1)
+        return recipe
+    return make
@@ -0,0 +1,116 @@
+import io
+
+import pytest
+from app.deletion import delete_recipe
+from app.models import Download, IngredientForRecipe, ShoppingCartTotals
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+
+def totals(user):
+    return {row.ingredient_id: (row.amount, row.entries)
+            for row in ShoppingCartTotals.objects.filter(user=user)}
+
+
+def verify():
+    output = io.StringIO()
+    call_command('shopping_cart_totals', '--verify', stdout=output,
+                 stderr=io.StringIO())
+    return output.getvalue()
+
+
+@pytest.fixture
+def recipes(users, make_recipe):
+    """Two recipes sharing their first two ingredients."""
+    return (make_recipe(users[0], ingredient_count=3),
+            make_recipe(users[0], ingredient_count=2))
+
+
+def test_cart_recipes_add_up(users, ingredients, recipes):
+    first, second = recipes
+    Download.objects.create(user=users[1], recipe=first)
+    assert totals(users[1]) == {ingredients[0].pk: (1, 1),
+                                ingredients[1].pk: (2, 1),
+                                ingredients[2].pk: (3, 1)}
+    Download.objects.create(user=users[1], recipe=second)
+    assert totals(users[1]) == {ingredients[0].pk: (2, 2),
+                                ingredients[1].pk: (4, 2),
+                                ingredients[2].pk: (3, 1)}
+    assert totals(users[2]) == {}
+
+
+def test_removed_recipes_leave_no_rows(users, ingredients, recipes):
+    first, second = recipes
+    for recipe in recipes:
+        Download.objects.create(user=users[1], recipe=recipe)
+    Download.objects.get(user=users[1], recipe=first).delete()
+    assert totals(users[1]) == {ingredients[0].pk: (1, 1),
+                                ingredients[1].pk: (2, 1)}
+    Download.objects.get(user=users[1], recipe=second).delete()
+    assert not ShoppingCartTotals.objects.exists()
+
+
+def test_manager_adds_and_removes_recipes(users, ingredients, recipes):
+    first, _ = recipes
+    manager = ShoppingCartTotals.objects
+    manager.add_recipe(users[1].pk, first.pk)
+    manager.add_recipe(users[2].pk, first.pk)
+    assert totals(users[1]) == totals(users[2]) == {
+        ingredients[0].pk: (1, 1), ingredients[1].pk: (2, 1),
+        ingredients[2].pk: (3, 1)}
+    manager.add_recipe(users[1].pk, first.pk, sign=-1)
+    assert totals(users[1]) == {}
+    assert len(totals(users[2])) == 3
+
+
+def test_recipe_changed_in_carts(users, ingredients, recipes):
+    first, _ = recipes
+    for user in users[1:3]:
+        Download.objects.create(user=user, recipe=first)
+    rows = {row.ingredient_id: row for row in
+            IngredientForRecipe.objects.filter(recipe=first)}
+    rows[ingredients[0].pk].amount = 10
+    rows[ingredients[0].pk].save()
+    rows[ingredients[1].pk].ingredient = ingredients[5]
+    rows[ingredients[1].pk].save()
+    rows[ingredients[2].pk].delete()
+    IngredientForRecipe.objects.create(recipe=first,
+                                       ingredient=ingredients[6], amount=7)
+    for user in users[1:3]:
+        assert totals(user) == {ingredients[0].pk: (10, 1),
+                                ingredients[5].pk: (2, 1),
+                                ingredients[6].pk: (7, 1)}
+    assert 'Итоги совпадают, строк: 6' in verify()
+
+
+def test_deleted_recipe_leaves_every_cart(users, ingredients, recipes):
+    first, second = recipes
+    for user in users[1:3]:
+        Download.objects.create(user=user, recipe=first)
+    Download.objects.create(user=users[1], recipe=second)
+    delete_recipe(first)
+    assert totals(users[2]) == {}
+    assert totals(users[1]) == {ingredients[0].pk: (1, 1),
+                                ingredients[1].pk: (2, 1)}
+    verify()
+
+
+def test_verify_reports_drift_and_rebuild_fixes_it(users, ingredients,
+                                                   recipes):
+    first, _ = recipes
+    Download.objects.create(user=users[1], recipe=first)
+    verify()
+    ShoppingCartTotals.objects.filter(
+        user=users[1], ingredient=ingredients[0]).update(amount=5)
+    ShoppingCartTotals.objects.filter(
+        user=users[1], ingredient=ingredients[1]).delete()
+    ShoppingCartTotals.objects.create(
+        user=users[2], ingredient=ingredients[3], amount=1, entries=1)
+    with pytest.raises(CommandError, match='Расхождений: 3'):
+        verify()
+    call_command('shopping_cart_totals', stdout=io.StringIO())
+    assert totals(users[1]) == {ingredients[0].pk: (1, 1),
+                                ingredients[1].pk: (2, 1),
+                                ingredients[2].pk: (3, 1)}
+    assert totals(users[2]) == {}
+    verify()
@@ -0,0 +1,49 @@
+import pytest
+from app.catalogue import fold, get_catalogue
+from app.models import Ingredient
+from django.core.cache import cache
+from django.db import connection
+
+NAMES = ('Straße', 'strasse', 'ﬁлé', 'FILÉ', 'ёжевика', 'Ёлка', 'sıcak')
+
+
+@pytest.fixture
+def named(db):
+    return [Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in NAMES]
+
+
+def test_fold_keeps_characters_upper_would_expand():
+    assert fold('Straße') == 'STRAßE'
+    assert fold('ﬁлé') == 'ﬁЛÉ'
+    assert fold('ёжевика') == 'ЁЖЕВИКА'
+
+
+def test_expanded_characters_do_not_match(named):
+    found = {ingredient.name
+             for ingredient in get_catalogue().search(name='STRASS')}
+    assert found == {'strasse'}
+
+
+@pytest.fixture
+def unicode_upper(db):
+    """Skip where UPPER changes ASCII letters only, as in the C locale."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT UPPER('ё') = 'Ё'")
+        if not cursor.fetchone()[0]:
+            pytest.skip('the database locale upper-cases ASCII only')
+
+
+@pytest.mark.postgresql
+@pytest.mark.parametrize('name', ('strass', 'straß', 'STRAßE', 'ss', 'ße',
+                                  'ﬁ', 'fil', 'ёж', 'ЁЛ', 'SIC', 'ıca'))
+def test_catalogue_matches_database_filter(unicode_upper, named, client_for,
+                                           settings, name):
+    def found():
+        cache.clear()
+        response = client_for().get('/api/ingredients/', {'name': name})
+        return sorted(ingredient['id'] for ingredient in response.json())
+    catalogue = found()
+    settings.INGREDIENT_CATALOGUE_CACHE = False
+    settings.QUERY_BUDGET_STRICT = False
+    assert catalogue == found()
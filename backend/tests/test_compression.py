@@ -0,0 +1,22 @@
+import pytest
+from app.models import Tag
+
+
+@pytest.fixture
+def many_tags(db):
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {number}', color=f'#{number:06X}', slug=f'tag-{number}')
+        for number in range(40))
+
+
+def test_api_json_is_compressed(many_tags, client):
+    response = client.get('/api/tags/', HTTP_ACCEPT_ENCODING='gzip')
+    assert response['Content-Type'] == 'application/json'
+    assert response['Content-Encoding'] == 'gzip'
+
+
+def test_html_is_not_compressed(db, client):
+    response = client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip')
+    assert response['Content-Type'].startswith('text/html')
+    assert len(response.content) >= 1024
+    assert not response.has_header('Content-Encoding')
@@ -0,0 +1,89 @@
+import io
+
+import pytest
+from app.counters import change_counter
+from app.models import Favorite, Recipe
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+
+User = get_user_model()
+
+
+@pytest.fixture
+def recipe(users, make_recipe):
+    return make_recipe(users[1])
+
+
+def counts(recipe):
+    recipe = Recipe.objects.get(pk=recipe.pk)
+    return (recipe.favorites_count, recipe.in_carts_count,
+            User.objects.get(pk=recipe.author_id).followers_count)
+
+
+def reconcile(*args):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    call_command('reconcile_counters', *args, stdout=stdout, stderr=stderr)
+    return stdout.getvalue(), stderr.getvalue()
+
+
+def test_endpoints_keep_counters(recipe, users, client_for):
+    clients = [client_for(user) for user in (users[0], users[2])]
+    for client in clients:
+        for action in ('favorite', 'shopping_cart'):
+            response = client.post(f'/api/recipes/{recipe.pk}/{action}/')
+            assert response.status_code == 201
+        response = client.post(f'/api/users/{recipe.author_id}/subscribe/')
+        assert response.status_code == 201
+    assert counts(recipe) == (2, 2, 2)
+    for action in ('favorite', 'shopping_cart'):
+        response = clients[0].delete(f'/api/recipes/{recipe.pk}/{action}/')
+        assert response.status_code == 204
+    response = clients[0].delete(f'/api/users/{recipe.author_id}/subscribe/')
+    assert response.status_code == 204
+    assert counts(recipe) == (1, 1, 1)
+
+
+def test_repeated_requests_do_not_count_twice(recipe, users, client_for):
+    client = client_for(users[0])
+    client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    assert client.post(
+        f'/api/recipes/{recipe.pk}/favorite/').status_code == 400
+    client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+    assert client.delete(
+        f'/api/recipes/{recipe.pk}/favorite/').status_code == 400
+    assert counts(recipe)[0] == 0
+
+
+def test_counter_never_goes_below_zero(recipe):
+    change_counter(Favorite, recipe.pk, -1)
+    assert counts(recipe)[0] == 0
+    change_counter(Favorite, recipe.pk, 2)
+    change_counter(Favorite, recipe.pk, -3)
+    assert counts(recipe)[0] == 2
+
+
+def test_reconcile_fixes_drift(recipe, users):
+    Favorite.objects.create(user=users[0], recipe=recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(
+        favorites_count=7, in_carts_count=3)
+    User.objects.filter(pk=users[2].pk).update(followers_count=1)
+    with pytest.raises(CommandError, match='Расхождений: 3'):
+        reconcile('--verify')
+    assert counts(recipe)[:2] == (7, 3)
+    _, report = reconcile()
+    assert 'favorites_count: записано 7, на самом деле 1' in report
+    assert counts(recipe)[:2] == (1, 0)
+    assert User.objects.get(pk=users[2].pk).followers_count == 0
+    assert reconcile('--verify')[0].strip() == 'Расхождений: 0'
+
+
+def test_popular_recipes_come_first(users, make_recipe, client_for):
+    recipes = [make_recipe(users[1], name=f'Рецепт {number}')
+               for number in range(4)]
+    for user_count, recipe in zip((1, 3, 0, 1), recipes):
+        for user in users[:user_count]:
+            Favorite.objects.create(user=user, recipe=recipe)
+    response = client_for().get('/api/recipes/',
+                                {'ordering': '-favorites_count'})
+    assert [found['id'] for found in response.json()['results']] == [
+        recipes[1].pk, recipes[3].pk, recipes[0].pk, recipes[2].pk]
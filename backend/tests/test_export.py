@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+import os
+import re
+
+import pytest
+from app.models import Download, Ingredient, IngredientForRecipe
+from PIL import ImageFont
+
+PROPORTIONAL_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+ROWS = [('мука', 'г', 6.0), ('сахар', 'г', 4.0), ('соль', 'г', 2.0)]
+
+
+@pytest.fixture
+def cart(users, make_recipe):
+    """user0 has two recipes with the same three ingredients in the
+    cart, user1 has none."""
+    for number in range(2):
+        recipe = make_recipe(users[1], name=f'Рецепт {number}')
+        Download.objects.create(user=users[0], recipe=recipe)
+    return users[0]
+
+
+def download(client, file_type):
+    response = client.get('/api/recipes/download_shopping_cart/',
+                          {'type': file_type})
+    assert response.status_code == 200
+    assert response['Content-Disposition'] == (
+        f'attachment; filename="shopping_list.{file_type}"')
+    return b''.join(response.streaming_content)
+
+
+def parse_pdf(content):
+    """Objects of a PDF by number, after checking the xref points at
+    every one of them."""
+    assert content.startswith(b'%PDF-1.4') and content.endswith(b'%%EOF\n')
+    start = int(re.search(rb'startxref\n(\d+)', content).group(1))
+    offsets = re.findall(rb'(\d{10}) 00000 n', content[start:])
+    objects = {}
+    for number, offset in enumerate(offsets, 1):
+        body = content[int(offset):]
+        assert body.startswith(b'%d 0 obj\n' % number)
+        objects[number] = body[:body.index(b'endobj')]
+    return objects
+
+
+def page_text(objects):
+    """Lines shown on the pages, unescaped."""
+    return [re.sub(rb'\\(.)', rb'\1', line).decode('cp1251')
+            for body in objects.values()
+            for line in re.findall(rb'\((.*)\) Tj', body)]
+
+
+@pytest.mark.parametrize('file_type, parse', (
+    ('txt', lambda content: content.decode().splitlines()),
+    ('csv', lambda content: list(csv.reader(io.StringIO(content.decode())))),
+    ('json', lambda content: json.loads(content)),
+))
+def test_text_formats_list_cart_totals(cart, client_for, file_type, parse):
+    expected = {
+        'txt': [f'{name} : {amount} {unit}' for name, unit, amount in ROWS],
+        'csv': [['name', 'measurement_unit', 'amount']] + [
+            [name, unit, str(amount)] for name, unit, amount in ROWS],
+        'json': [{'name': name, 'measurement_unit': unit, 'amount': amount}
+                 for name, unit, amount in ROWS],
+    }
+    assert parse(download(client_for(cart), file_type)) == (
+        expected[file_type])
+
+
+@pytest.mark.parametrize('file_type, expected', (
+    ('txt', b''), ('csv', b'name,measurement_unit,amount\r\n'),
+    ('json', b'[]'),
+))
+def test_empty_cart(users, client_for, file_type, expected):
+    assert download(client_for(users[0]), file_type) == expected
+
+
+def test_pdf_lists_cart_totals(cart, client_for):
+    objects = parse_pdf(download(client_for(cart), 'pdf'))
+    assert page_text(objects) == ['Список покупок', ''] + [
+        f'{name} ({unit}) — {amount:g}' for name, unit, amount in ROWS]
+
+
+def test_pdf_of_empty_cart_has_one_page(users, client_for):
+    objects = parse_pdf(download(client_for(users[0]), 'pdf'))
+    assert b'/Count 1' in objects[2]
+    assert page_text(objects) == ['Список покупок', '']
+
+
+def test_long_list_runs_over_pages(users, make_recipe, client_for):
+    recipe = make_recipe(users[1], ingredient_count=0)
+    for number in range(120):
+        ingredient = Ingredient.objects.create(
+            name=f'продукт {number:03}', measurement_unit='г')
+        IngredientForRecipe.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=1)
+    Download.objects.create(user=users[0], recipe=recipe)
+    objects = parse_pdf(download(client_for(users[0]), 'pdf'))
+    assert b'/Count 3' in objects[2]
+    assert page_text(objects)[2:] == [
+        f'продукт {number:03} (г) — 1' for number in range(120)]
+
+
+@pytest.mark.skipif(not os.path.isfile(PROPORTIONAL_FONT),
+                    reason='needs DejaVu Sans')
+def test_pdf_widths_follow_each_glyph(settings, users, client_for):
+    settings.SHOPPING_LIST_PDF_FONT = PROPORTIONAL_FONT
+    font = parse_pdf(download(client_for(users[0]), 'pdf'))[3]
+    widths = [int(width) for width in re.search(
+        rb'/Widths \[([\d ]+)\]', font).group(1).split()]
+    reference = ImageFont.truetype(PROPORTIONAL_FONT, 1000)
+    for char in 'iW.Яж':
+        code = char.encode('cp1251')[0]
+        assert widths[code - 32] == round(reference.getlength(char))
+    assert b'/Flags 32 ' in parse_pdf(
+        download(client_for(users[0]), 'pdf'))[4]
+
+
+@pytest.mark.parametrize('file_type', ('xlsx', ''))
+def test_unknown_format_is_refused(users, client_for, file_type):
+    response = client_for(users[0]).get(
+        '/api/recipes/download_shopping_cart/', {'type': file_type})
+    assert response.status_code == 400
+
+
+def test_anonymous_has_no_cart(client_for):
+    response = client_for().get('/api/recipes/download_shopping_cart/')
+    assert response.status_code == 401
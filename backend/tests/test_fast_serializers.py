@@ -0,0 +1,63 @@
+import pytest
+from app.models import Download, Favorite, Follow
+from django.core.cache import cache
+
+
+@pytest.fixture
+def recipes(users, make_recipe):
+    """Recipes with and without image, tags and ingredients, one of
+    them favorited, put in the cart and its author followed by user0."""
+    made = [
+        make_recipe(users[1], name='Полный'),
+        make_recipe(users[2], name='Без изображения', image=''),
+        make_recipe(users[1], name='Без тегов', tag_count=0),
+        make_recipe(users[2], name='Пустой', tag_count=0,
+                    ingredient_count=0, image='', text='', cooking_time=1),
+    ]
+    Favorite.objects.create(user=users[0], recipe=made[0])
+    Download.objects.create(user=users[0], recipe=made[2])
+    Follow.objects.create(user=users[0], author=users[1])
+    return made
+
+
+def responses(settings, client, url, params=None):
+    """Bytes of the response with the fast serializers and without."""
+    contents = []
+    for fast in (True, False):
+        settings.FAST_RECIPE_SERIALIZERS = fast
+        cache.clear()
+        response = client.get(url, params)
+        assert response.status_code == 200, response.content
+        contents.append(response.content)
+    return contents
+
+
+@pytest.mark.parametrize('user', (None, 0), ids=('anonymous', 'user'))
+@pytest.mark.parametrize('url, params', (
+    ('/api/recipes/', None),
+    ('/api/recipes/', {'limit': 2, 'page': 2}),
+    ('/api/recipes/', {'pagination': 'cursor', 'limit': 3}),
+    ('/api/recipes/what_to_cook/', 'ingredients'),
+))
+def test_fast_serializers_render_same_bytes(settings, recipes, users,
+                                            ingredients, client_for, user,
+                                            url, params):
+    if params == 'ingredients':
+        params = {'ingredients': [ingredient.pk
+                                  for ingredient in ingredients[:2]]}
+    client = client_for(None if user is None else users[user])
+    fast, slow = responses(settings, client, url, params)
+    assert fast == slow
+    if user is not None and params is None:
+        assert b'"is_favorited":true' in fast
+        assert b'"is_in_shopping_cart":true' in fast
+        assert b'"is_subscribed":true' in fast
+
+
+@pytest.mark.parametrize('user', (None, 0), ids=('anonymous', 'user'))
+def test_recipe_pages_render_same_bytes(settings, recipes, users,
+                                        client_for, user):
+    client = client_for(None if user is None else users[user])
+    for recipe in recipes:
+        fast, slow = responses(settings, client, f'/api/recipes/{recipe.pk}/')
+        assert fast == slow
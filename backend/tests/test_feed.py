@@ -0,0 +1,68 @@
+import pytest
+from app.feed import (CELEBRITIES_KEY, get_celebrities, publish_recipe,
+                      timeline_key, unpack)
+from app.models import Follow
+from django.core.cache import cache
+
+
+@pytest.fixture
+def fanout_limit(settings):
+    settings.FEED_FANOUT_LIMIT = 1
+
+
+def feed_ids(client):
+    return [recipe['id']
+            for recipe in client.get('/api/recipes/feed/').json()['results']]
+
+
+def follow(user, author):
+    Follow.objects.create(user=user, author=author)
+
+
+def test_celebrities_follow_followers_count(fanout_limit, users):
+    author = users[3]
+    follow(users[0], author)
+    assert get_celebrities() == frozenset()
+    follow(users[1], author)
+    assert get_celebrities() == frozenset()
+    cache.delete(CELEBRITIES_KEY)
+    assert get_celebrities() == {author.pk}
+    Follow.objects.filter(user=users[1]).delete()
+    cache.delete(CELEBRITIES_KEY)
+    assert get_celebrities() == frozenset()
+
+
+def test_demoted_author_is_fanned_out_again(fanout_limit, users,
+                                            make_recipe, client_for):
+    author = users[3]
+    follow(users[0], author)
+    follow(users[1], author)
+    old = make_recipe(author, name='Старый')
+    client = client_for(users[0])
+    assert feed_ids(client) == [old.pk]
+    new = make_recipe(author, name='Новый')
+    publish_recipe(new)
+    assert feed_ids(client) == [new.pk, old.pk]
+    Follow.objects.filter(user=users[1]).delete()
+    cache.delete(CELEBRITIES_KEY)
+    assert feed_ids(client) == [new.pk, old.pk]
+    assert list(unpack(cache.get(timeline_key(users[0].pk)))) == [
+        new.pk, old.pk]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('followers', (1, 2), ids=('author', 'celebrity'))
+def test_deleted_recipe_leaves_timelines(fanout_limit, users, make_recipe,
+                                         client_for, followers):
+    author = users[3]
+    for user in users[:followers]:
+        follow(user, author)
+    kept = make_recipe(author, name='Остается')
+    client = client_for(users[0])
+    feed_ids(client)
+    deleted = make_recipe(author, name='Удаляемый')
+    publish_recipe(deleted)
+    assert feed_ids(client) == [deleted.pk, kept.pk]
+    deleted.delete()
+    assert feed_ids(client) == [kept.pk]
+    assert client.get('/api/recipes/feed/').json()['count'] == 1
@@ -0,0 +1,46 @@
+import pytest
+from api import filter as recipe_filters
+
+
+@pytest.fixture
+def tagged(users, tags, make_recipe):
+    """Recipes tagged breakfast, lunch, both and none."""
+    recipes = {}
+    for name, recipe_tags in (('breakfast', tags[:1]), ('lunch', tags[1:2]),
+                              ('both', tags[:2]), ('none', ())):
+        recipes[name] = make_recipe(users[1], name=name, tag_count=0)
+        recipes[name].tags.set(recipe_tags)
+    return recipes
+
+
+def names(client, **params):
+    response = client.get('/api/recipes/', params)
+    assert response.status_code == 200
+    return sorted(recipe['name'] for recipe in response.json()['results'])
+
+
+@pytest.mark.parametrize('slugs, expected', (
+    (['breakfast'], ['both', 'breakfast']),
+    (['breakfast', 'lunch'], ['both', 'breakfast', 'lunch']),
+    (['dinner'], []),
+))
+def test_tags_match_any_without_repeats(tagged, client_for, slugs,
+                                        expected):
+    assert names(client_for(), tags=slugs) == expected
+
+
+def test_tag_deleted_after_validation_matches_nothing(
+        tagged, tags, client_for, monkeypatch):
+    """The slugs are valid choices, but breakfast is gone by the time
+    the recipes are filtered."""
+    slugs = {tag.slug: tag.pk for tag in tags}
+    get_tags = recipe_filters.FilterForRecipeFilter.get_tags
+
+    def delete_breakfast(self, *args):
+        slugs.pop('breakfast')
+        return get_tags(self, *args)
+    monkeypatch.setattr(recipe_filters, 'tag_slugs', lambda: dict(slugs))
+    monkeypatch.setattr(recipe_filters.FilterForRecipeFilter, 'get_tags',
+                        delete_breakfast)
+    assert names(client_for(), tags=['breakfast', 'lunch']) == [
+        'both', 'lunch']
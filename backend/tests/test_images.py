@@ -0,0 +1,117 @@
+import io
+import os
+import time
+
+import pytest
+from app import images
+from app.images import (RECONCILE_KEY, collect_images, image_storage,
+                        reconcile_on_start, rendition_name)
+from app.models import Recipe
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.signals import request_started
+from PIL import Image
+
+
+def png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='photo.png')
+
+
+def age(name, seconds):
+    path = image_storage().path(name)
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+@pytest.fixture
+def save_image(db):
+    def save(color=(200, 40, 40)):
+        return image_storage().save('media/photo.png', png(color))
+    return save
+
+
+def test_same_content_is_stored_once(save_image):
+    assert save_image() == save_image()
+    assert save_image() != save_image((10, 10, 10))
+
+
+def test_deleted_recipe_keeps_image_until_collected(users, make_recipe,
+                                                    save_image):
+    name = save_image()
+    recipe = make_recipe(users[0], image=name)
+    make_recipe(users[1], image=name)
+    recipe.delete()
+    age(name, 3600)
+    assert collect_images(grace=60) == []
+    Recipe.objects.all().delete()
+    assert image_storage().exists(name)
+    assert collect_images(grace=60) == [name]
+    assert not image_storage().exists(name)
+
+
+def test_collect_keeps_recent_images(save_image):
+    name = save_image()
+    assert collect_images(grace=60) == []
+    age(name, 3600)
+    save_image()
+    assert collect_images(grace=60) == []
+    assert image_storage().exists(name)
+
+
+def test_collect_deletes_renditions(save_image):
+    name = save_image()
+    renditions = [rendition_name(name, rendition)
+                  for rendition in settings.RECIPE_IMAGE_RENDITIONS]
+    for rendition in renditions:
+        default_storage.save(rendition, ContentFile(b'rendition'))
+    age(name, 3600)
+    call_command('collect_images', grace=60, stdout=io.StringIO())
+    assert not any(default_storage.exists(rendition)
+                   for rendition in renditions)
+
+
+def test_command_makes_renditions_of_lost_jobs(users, make_recipe,
+                                               save_image):
+    """Outside a transaction test the on_commit job never runs, as if
+    the process had stopped before making the renditions."""
+    name = save_image()
+    recipe = make_recipe(users[0], image=name)
+    recipe.refresh_from_db()
+    assert not recipe.images_ready
+    call_command('recipe_images', stdout=io.StringIO())
+    recipe.refresh_from_db()
+    assert recipe.images_ready
+    assert all(default_storage.exists(rendition_name(name, rendition))
+               for rendition in settings.RECIPE_IMAGE_RENDITIONS)
+
+
+@pytest.fixture
+def executor(db, settings, monkeypatch):
+    """A worker pool recording the jobs it is given."""
+    settings.RECIPE_IMAGE_WORKERS = 2
+    jobs = []
+
+    class Executor:
+        def submit(self, job, *args):
+            jobs.append(job)
+    monkeypatch.setattr(images, 'get_executor', Executor)
+    yield jobs
+    request_started.connect(reconcile_on_start, dispatch_uid=RECONCILE_KEY)
+
+
+def test_started_processes_reconcile_once(executor, client_for):
+    client_for().get('/api/tags/')
+    client_for().get('/api/tags/')
+    assert executor == [images.reconcile_in_worker]
+    request_started.connect(reconcile_on_start, dispatch_uid=RECONCILE_KEY)
+    client_for().get('/api/tags/')
+    assert len(executor) == 1
+    cache.delete(RECONCILE_KEY)
+    request_started.connect(reconcile_on_start, dispatch_uid=RECONCILE_KEY)
+    client_for().get('/api/tags/')
+    assert len(executor) == 2
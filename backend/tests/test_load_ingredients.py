@@ -0,0 +1,48 @@
+import io
+
+import pytest
+from app.models import Ingredient
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+
+ROWS = ('name,measurement_unit\n'
+        'соль,г\n'
+        'соль,щепотка\n'
+        ' соль , г \n'
+        'молоко,мл\n')
+
+
+@pytest.fixture
+def catalogue(db, tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(ROWS, encoding='utf-8')
+    return str(path)
+
+
+def load(path, *args):
+    call_command('load_ingredients', path, *args, stdout=io.StringIO())
+    return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+
+@pytest.mark.parametrize('copy', (True, False), ids=('copy', 'bulk'))
+def test_repeated_pairs_are_loaded_once(catalogue, copy):
+    loaded = load(catalogue, *(() if copy else ('--no-copy',)))
+    assert loaded == {('соль', 'г'), ('соль', 'щепотка'), ('молоко', 'мл')}
+    assert Ingredient.objects.count() == 3
+
+
+@pytest.mark.parametrize('copy', (True, False), ids=('copy', 'bulk'))
+def test_same_file_loads_once(catalogue, copy):
+    args = () if copy else ('--no-copy',)
+    Ingredient.objects.create(name='соль', measurement_unit='г')
+    load(catalogue, *args)
+    output = io.StringIO()
+    call_command('load_ingredients', catalogue, *args, stdout=output)
+    assert Ingredient.objects.count() == 3
+    assert 'добавлено: 0,' in output.getvalue()
+
+
+def test_pairs_are_unique(db):
+    Ingredient.objects.create(name='соль', measurement_unit='г')
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Ingredient.objects.create(name='соль', measurement_unit='г')
@@ -0,0 +1,139 @@
+import io
+import stat
+
+import pytest
+from app import matching
+from app.matching import RecipeIndex, load_index
+from app.models import IngredientForRecipe, Recipe
+from app.versions import current_version
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+@pytest.fixture
+def cookbook(users, tags, ingredients, make_recipe):
+    """Recipes by name: salted uses 0-1, sweet 0-1-3 and is slow,
+    dairy 4-5 and has the dinner tag only."""
+    recipes = {}
+    for name, used, tag, cooking_time in (
+            ('salted', (0, 1), 0, 10), ('sweet', (0, 1, 3), 1, 60),
+            ('dairy', (4, 5), 2, 10)):
+        recipe = make_recipe(users[0], name=name, ingredient_count=0,
+                             tag_count=0, cooking_time=cooking_time)
+        recipe.tags.set([tags[tag]])
+        for number in used:
+            IngredientForRecipe.objects.create(
+                recipe=recipe, ingredient=ingredients[number], amount=1)
+        recipes[name] = recipe.pk
+    return recipes
+
+
+def what_to_cook(client, ingredients, **params):
+    response = client.get('/api/recipes/what_to_cook/', {
+        'ingredients': [ingredients[number].pk for number in (0, 1, 2)],
+        **params})
+    assert response.status_code == 200, response.content
+    return [(recipe['id'], recipe['match_ratio'],
+             recipe['matched_ingredients']) for recipe in response.json()]
+
+
+def test_recipes_rank_by_share_of_ingredients_given(
+        cookbook, ingredients, client_for):
+    assert what_to_cook(client_for(), ingredients) == [
+        (cookbook['salted'], 1.0, 2), (cookbook['sweet'], 2 / 3, 2)]
+
+
+@pytest.mark.parametrize('params, expected', (
+    ({'tags': 'lunch'}, ['sweet']),
+    ({'tags': 'dinner'}, []),
+    ({'tags': 'unknown'}, []),
+    ({'cooking_time': 30}, ['salted']),
+    ({'limit': 1}, ['salted']),
+))
+def test_filters_and_limit(cookbook, ingredients, client_for, params,
+                           expected):
+    assert [pk for pk, _, _ in what_to_cook(
+        client_for(), ingredients, **params)] == [
+        cookbook[name] for name in expected]
+
+
+def test_refresh_reloads_changed_recipes(cookbook, ingredients):
+    index = RecipeIndex(current_version(Recipe))
+    IngredientForRecipe.objects.filter(
+        recipe_id=cookbook['sweet'], ingredient=ingredients[3]).delete()
+    Recipe.objects.filter(pk=cookbook['sweet']).update(cooking_time=5)
+    index.refresh('changed')
+    assert index.search([ingredient.pk for ingredient in ingredients[:2]],
+                        max_cooking_time=5) == [(1.0, 2, cookbook['sweet'])]
+
+
+@pytest.fixture
+def index_dir(settings, tmp_path):
+    directory = tmp_path / 'index'
+    settings.RECIPE_INDEX_DIR = str(directory)
+    return directory
+
+
+def test_workers_share_one_build(settings, index_dir, cookbook,
+                                 ingredients):
+    """A second process loads the snapshot the first one built and
+    reloads only the recipes changed since."""
+    settings.RECIPE_INDEX_EMPTY_SHARE = 1
+    version = current_version(Recipe)
+    built = load_index(version)
+    assert stat.S_IMODE(index_dir.stat().st_mode) == 0o700
+    with CaptureQueriesContext(connection) as queries:
+        loaded = load_index(version)
+    assert len(queries) == 0
+    assert loaded.search([ingredients[4].pk]) == built.search(
+        [ingredients[4].pk])
+    IngredientForRecipe.objects.filter(
+        recipe_id=cookbook['dairy'], ingredient=ingredients[5]).update(
+        ingredient=ingredients[2])
+    Recipe.objects.filter(pk=cookbook['dairy']).update(
+        modified=timezone.now())
+    with CaptureQueriesContext(connection) as queries:
+        loaded = load_index('changed')
+    assert all('WHERE' in query['sql'] for query in queries)
+    assert loaded.search([ingredients[2].pk]) == [
+        (0.5, 1, cookbook['dairy'])]
+
+
+def test_snapshot_keeps_every_field(settings, cookbook, tags):
+    settings.RECIPE_INDEX_EMPTY_SHARE = 1
+    index = RecipeIndex(current_version(Recipe))
+    Recipe.objects.filter(pk=cookbook['sweet']).update(
+        modified=timezone.now())
+    index.refresh('changed')
+    file = io.BytesIO()
+    index.dump(file)
+    file.seek(0)
+    restored = RecipeIndex.restore(file)
+    assert vars(restored) == vars(index)
+    assert restored.search([], [tags[1].pk]) == index.search(
+        [], [tags[1].pk])
+
+
+def test_broken_snapshot_is_built_anew(index_dir, cookbook, ingredients):
+    load_index(current_version(Recipe))
+    snapshot = index_dir / 'recipe_index'
+    snapshot.write_bytes(snapshot.read_bytes()[:-8])
+    index = load_index(current_version(Recipe))
+    assert len(index) == len(cookbook)
+    assert RecipeIndex.restore(snapshot.open('rb')).recipe_ids == (
+        index.recipe_ids)
+
+
+def test_shared_directory_is_refused(index_dir, cookbook):
+    index_dir.mkdir(mode=0o777)
+    index_dir.chmod(0o777)
+    assert len(load_index(current_version(Recipe))) == len(cookbook)
+    assert list(index_dir.iterdir()) == []
+
+
+def test_snapshot_is_off_by_default(cookbook, ingredients, tmp_path):
+    assert matching.match_recipes([ingredients[0].pk], limit=1) == [
+        (0.5, 1, cookbook['salted'])]
+    assert not any(path.name.startswith('recipe_index')
+                   for path in tmp_path.rglob('*'))
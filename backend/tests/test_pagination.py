@@ -0,0 +1,50 @@
+import pytest
+from app.models import Recipe
+from django.utils import timezone
+
+
+@pytest.fixture
+def recipes(users, make_recipe):
+    """Seven recipes, five of them published at the same moment, newest
+    first."""
+    made = [make_recipe(users[0], name=f'Рецепт {number}', tag_count=0,
+                        ingredient_count=0) for number in range(7)]
+    moment = timezone.now()
+    Recipe.objects.filter(pk__in=[recipe.pk for recipe in made[1:6]]
+                          ).update(pub_date=moment)
+    Recipe.objects.filter(pk=made[6].pk).update(
+        pub_date=moment + timezone.timedelta(minutes=1))
+    return list(Recipe.objects.order_by('-pub_date', '-id')
+                .values_list('id', flat=True))
+
+
+def walk(client, url, link):
+    pages = []
+    while url:
+        page = client.get(url).json()
+        pages.append([recipe['id'] for recipe in page['results']])
+        url = page[link]
+    return pages
+
+
+def test_cursor_walks_recipes_sharing_pub_date(recipes, client_for):
+    client = client_for()
+    forward = walk(client, '/api/recipes/?pagination=cursor&limit=2', 'next')
+    assert forward == [recipes[:2], recipes[2:4], recipes[4:6], recipes[6:]]
+    last = client.get('/api/recipes/?pagination=cursor&limit=2').json()
+    while last['next']:
+        last = client.get(last['next']).json()
+    backward = walk(client, last['previous'], 'previous')
+    assert backward == [recipes[4:6], recipes[2:4], recipes[:2]]
+
+
+def test_cursor_counts_on_request(recipes, client_for):
+    page = client_for().get(
+        '/api/recipes/', {'pagination': 'cursor', 'count': 'true'}).json()
+    assert page['count'] == len(recipes)
+    assert page['previous'] is None
+
+
+def test_broken_cursor_is_not_found(recipes, client_for):
+    response = client_for().get('/api/recipes/', {'cursor': 'cD14IDE%3D'})
+    assert response.status_code == 404
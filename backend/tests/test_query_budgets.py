@@ -0,0 +1,95 @@
+import base64
+import io
+
+import pytest
+from api.profiling import QueryBudgetError
+from app.models import Download, Favorite, Follow
+from django.conf import settings
+from PIL import Image
+
+# View name, method and URL of a request in every budgeted view; the
+# user is the author of the recipe edited and deleted.
+SCENARIOS = (
+    ('TagViewSet.list', 'get', '/api/tags/'),
+    ('TagViewSet.retrieve', 'get', '/api/tags/{tag}/'),
+    ('IngredientViewSet.list', 'get', '/api/ingredients/?name=са'),
+    ('IngredientViewSet.retrieve', 'get', '/api/ingredients/{ingredient}/'),
+    ('RecipeViewSet.list', 'get', '/api/recipes/?tags=breakfast'),
+    ('RecipeViewSet.retrieve', 'get', '/api/recipes/{recipe}/'),
+    ('RecipeViewSet.create', 'post', '/api/recipes/'),
+    ('RecipeViewSet.update', 'put', '/api/recipes/{own}/'),
+    ('RecipeViewSet.partial_update', 'patch', '/api/recipes/{own}/'),
+    ('RecipeViewSet.destroy', 'delete', '/api/recipes/{own}/'),
+    ('RecipeViewSet.favorite', 'post', '/api/recipes/{recipe}/favorite/'),
+    ('RecipeViewSet.shopping_cart', 'post',
+     '/api/recipes/{recipe}/shopping_cart/'),
+    ('RecipeViewSet.download_shopping_cart', 'get',
+     '/api/recipes/download_shopping_cart/'),
+    ('RecipeViewSet.what_to_cook', 'get',
+     '/api/recipes/what_to_cook/?ingredients={ingredient}'),
+    ('RecipeViewSet.feed', 'get', '/api/recipes/feed/'),
+    ('FollowAPI.post', 'post', '/api/users/{stranger}/subscribe/'),
+    ('FollowAPI.delete', 'delete', '/api/users/{author}/subscribe/'),
+    ('FollowList.get', 'get', '/api/users/subscriptions/?recipes_limit=2'),
+    ('UserViewSet.list', 'get', '/api/users/'),
+    ('UserViewSet.retrieve', 'get', '/api/users/{author}/'),
+    ('UserViewSet.me', 'get', '/api/users/me/'),
+)
+
+
+def test_every_budget_is_tested():
+    assert set(settings.QUERY_BUDGETS) == {
+        view for view, _, _ in SCENARIOS}
+
+
+def test_strict_budget_fails_the_request(settings, tags, client_for):
+    settings.QUERY_BUDGET_STRICT = True
+    settings.QUERY_BUDGETS = {'TagViewSet.list': 0}
+    with pytest.raises(QueryBudgetError):
+        client_for().get('/api/tags/')
+
+
+@pytest.fixture
+def image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 24), (220, 120, 40)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@pytest.fixture
+def params(users, tags, ingredients, make_recipe):
+    """A user following an author, with favorites, a cart and a recipe
+    of their own."""
+    user, author, stranger, _ = users
+    recipes = [make_recipe(author, name=f'Рецепт {number}',
+                           ingredient_count=5, tag_count=3)
+               for number in range(4)]
+    own = make_recipe(user, ingredient_count=5, tag_count=3)
+    Follow.objects.create(user=user, author=author)
+    for recipe in recipes[1:]:
+        Favorite.objects.create(user=user, recipe=recipe)
+        Download.objects.create(user=user, recipe=recipe)
+    return {'tag': tags[0].pk, 'ingredient': ingredients[0].pk,
+            'recipe': recipes[0].pk, 'own': own.pk, 'author': author.pk,
+            'stranger': stranger.pk}
+
+
+@pytest.mark.parametrize('view, method, url', SCENARIOS,
+                         ids=[view for view, _, _ in SCENARIOS])
+def test_view_keeps_to_query_budget(settings, users, ingredients, tags,
+                                    params, image, client_for, view,
+                                    method, url):
+    """QueryBudgetMiddleware fails the request when it goes over."""
+    settings.QUERY_BUDGET_STRICT = True
+    payload = {
+        'name': 'Новый рецепт', 'text': 'Текст', 'cooking_time': 15,
+        'image': image, 'tags': [tag.pk for tag in tags[:2]],
+        'ingredients': [{'id': ingredient.pk, 'amount': 10}
+                        for ingredient in ingredients[2:8]],
+    }
+    response = getattr(client_for(users[0]), method)(
+        url.format(**params), payload if method in ('post', 'put', 'patch')
+        else None, format='json')
+    assert response.status_code < 300, response.content
+    assert response.wsgi_request.profile.view == view
@@ -0,0 +1,53 @@
+import pytest
+from app.models import Download, Favorite, Follow
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+pytestmark = pytest.mark.postgresql
+
+QUERY_SHAPES = (
+    ('feed', '/api/recipes/'),
+    ('feed, cursor', '/api/recipes/?pagination=cursor'),
+    ('tag filter', '/api/recipes/?tags=breakfast'),
+    ('author filter', '/api/recipes/?author={author}'),
+    ('favorites', '/api/recipes/?is_favorited=1'),
+    ('shopping cart', '/api/recipes/?is_in_shopping_cart=1'),
+    ('subscriptions', '/api/users/subscriptions/?recipes_limit=3'),
+    ('search', '/api/recipes/?search=рецепт'),
+    ('popular', '/api/recipes/?ordering=-favorites_count'),
+)
+
+
+@pytest.fixture
+def follower(users, make_recipe):
+    """A user following two authors, with favorites and a cart."""
+    user, *authors = users
+    recipes = [make_recipe(author, name=f'Рецепт {number}')
+               for number, author in enumerate(authors * 3)]
+    for author in authors[:2]:
+        Follow.objects.create(user=user, author=author)
+    for recipe in recipes[:4]:
+        Favorite.objects.create(user=user, recipe=recipe)
+        Download.objects.create(user=user, recipe=recipe)
+    return user
+
+
+@pytest.mark.parametrize('name, url', QUERY_SHAPES,
+                         ids=[name for name, _ in QUERY_SHAPES])
+def test_query_shape_uses_indexes(follower, users, client_for, name, url):
+    """With enable_seqscan off the planner still falls back to a
+    sequential scan when no index can serve a query, so a Seq Scan
+    left in a plan marks a missing index."""
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+    with CaptureQueriesContext(connection) as queries:
+        response = client_for(follower).get(url.format(author=users[1].pk))
+    assert response.status_code == 200
+    for query in queries:
+        sql = query['sql']
+        if not sql.startswith('SELECT'):
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        assert 'Seq Scan' not in plan, f'{sql}\n{plan}'
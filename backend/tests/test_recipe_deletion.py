@@ -0,0 +1,60 @@
+import pytest
+from app.models import Download, Favorite, Recipe, ShoppingCartTotals
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def stored_totals():
+    return {(row.user_id, row.ingredient_id): (row.amount, row.entries)
+            for row in ShoppingCartTotals.objects.all()}
+
+
+def live_totals():
+    return {(row['recipe__download__user'], row['ingredient']):
+            (row['total'], row['entries'])
+            for row in ShoppingCartTotals.objects.live_totals()}
+
+
+@pytest.fixture
+def carts(users, make_recipe):
+    """A recipe of user0 and one of user1, both in every cart."""
+    doomed = make_recipe(users[0], name='Удаляемый', ingredient_count=5)
+    kept = make_recipe(users[1], name='Остается', ingredient_count=4)
+    for user in users[1:]:
+        for recipe in (doomed, kept):
+            Download.objects.create(user=user, recipe=recipe)
+        Favorite.objects.create(user=user, recipe=kept)
+    return doomed, kept
+
+
+def test_destroy_takes_recipe_out_of_carts(carts, users, client_for):
+    doomed, kept = carts
+    response = client_for(users[0]).delete(f'/api/recipes/{doomed.pk}/')
+    assert response.status_code == 204
+    assert not Recipe.objects.filter(pk=doomed.pk).exists()
+    assert stored_totals() == live_totals()
+    kept.refresh_from_db()
+    assert (kept.in_carts_count, kept.favorites_count) == (3, 3)
+
+
+@pytest.mark.parametrize('delete', (
+    lambda recipe: Recipe.objects.filter(pk=recipe.pk).delete(),
+    lambda recipe: recipe.author.delete(),
+), ids=('queryset', 'author'))
+def test_other_deletes_keep_carts_right(carts, delete):
+    delete(carts[0])
+    assert stored_totals() == live_totals()
+
+
+def test_destroy_queries_do_not_grow(users, make_recipe, client_for):
+    def count_queries(ingredient_count, cart_count):
+        recipe = make_recipe(users[0], ingredient_count=ingredient_count)
+        for user in users[1:cart_count + 1]:
+            Download.objects.create(user=user, recipe=recipe)
+            Favorite.objects.create(user=user, recipe=recipe)
+        client = client_for(users[0])
+        client.get('/api/users/me/')
+        with CaptureQueriesContext(connection) as queries:
+            client.delete(f'/api/recipes/{recipe.pk}/')
+        return len(queries)
+    assert count_queries(1, 1) == count_queries(8, 3)
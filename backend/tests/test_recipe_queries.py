@@ -0,0 +1,50 @@
+import pytest
+from app.models import Favorite, Follow
+
+# Count, page, author, tags and ingredients; the cached relation sets
+# of a user (favorites, cart, follows) cost one query each when cold.
+LIST_QUERIES = 5
+DETAIL_QUERIES = 4
+RELATION_QUERIES = 3
+
+
+@pytest.mark.parametrize('recipe_count', (1, 6))
+@pytest.mark.parametrize('authenticated', (False, True))
+def test_recipe_list_queries_do_not_grow(
+        users, make_recipe, client_for, django_assert_num_queries,
+        recipe_count, authenticated):
+    for number in range(recipe_count):
+        make_recipe(users[number % 3 + 1], name=f'Рецепт {number}',
+                    ingredient_count=5, tag_count=3)
+    client = client_for(users[0] if authenticated else None)
+    with django_assert_num_queries(
+            LIST_QUERIES + RELATION_QUERIES * authenticated):
+        response = client.get('/api/recipes/')
+    results = response.json()['results']
+    assert len(results) == recipe_count
+    assert all(len(recipe['ingredients']) == 5 and len(recipe['tags']) == 3
+               for recipe in results)
+
+
+@pytest.mark.parametrize('authenticated', (False, True))
+def test_recipe_detail_queries(users, make_recipe, client_for,
+                               django_assert_num_queries, authenticated):
+    recipe = make_recipe(users[1], ingredient_count=8, tag_count=3)
+    client = client_for(users[0] if authenticated else None)
+    with django_assert_num_queries(
+            DETAIL_QUERIES + RELATION_QUERIES * authenticated):
+        response = client.get(f'/api/recipes/{recipe.pk}/')
+    assert len(response.json()['ingredients']) == 8
+
+
+def test_recipe_flags_come_from_relation_sets(
+        users, make_recipe, client_for):
+    liked, other = make_recipe(users[1]), make_recipe(users[2])
+    Favorite.objects.create(user=users[0], recipe=liked)
+    Follow.objects.create(user=users[0], author=users[1])
+    results = {recipe['id']: recipe for recipe in client_for(
+        users[0]).get('/api/recipes/').json()['results']}
+    assert results[liked.pk]['is_favorited'] is True
+    assert results[liked.pk]['author']['is_subscribed'] is True
+    assert results[other.pk]['is_favorited'] is False
+    assert results[other.pk]['author']['is_subscribed'] is False
@@ -0,0 +1,88 @@
+import base64
+import io
+
+import pytest
+from app.deletion import accounted
+from app.models import Download, IngredientForRecipe, ShoppingCartTotals
+from django.db.models.signals import post_delete
+from PIL import Image
+
+
+def stored_totals():
+    return {(row.user_id, row.ingredient_id): (row.amount, row.entries)
+            for row in ShoppingCartTotals.objects.all()}
+
+
+def live_totals():
+    return {(row['recipe__download__user'], row['ingredient']):
+            (row['total'], row['entries'])
+            for row in ShoppingCartTotals.objects.live_totals()}
+
+
+@pytest.mark.parametrize('kept, added', (
+    (range(0, 5), ()),
+    (range(2, 5), ()),
+    (range(1, 4), range(5, 8)),
+    ((), range(5, 8)),
+), ids=('unchanged', 'removed', 'mixed', 'replaced'))
+def test_edit_keeps_cart_totals(users, tags, ingredients, make_recipe,
+                                client_for, kept, added):
+    recipe = make_recipe(users[0], ingredient_count=5)
+    for user in users[1:]:
+        Download.objects.create(user=user, recipe=recipe)
+    rows = [{'id': ingredients[number].pk, 'amount': 10 + number}
+            for number in (*kept, *added)]
+    response = client_for(users[0]).patch(f'/api/recipes/{recipe.pk}/', {
+        'name': recipe.name, 'text': recipe.text, 'cooking_time': 5,
+        'tags': [tags[0].pk], 'ingredients': rows}, format='json')
+    assert response.status_code == 200, response.content
+    assert set(IngredientForRecipe.objects.filter(
+        recipe=recipe).values_list('ingredient_id', 'amount')) == {
+            (row['id'], row['amount']) for row in rows}
+    assert stored_totals() == live_totals()
+
+
+def test_removed_rows_skip_their_handlers(users, tags, ingredients,
+                                          make_recipe, client_for):
+    recipe = make_recipe(users[0], ingredient_count=5)
+    Download.objects.create(user=users[1], recipe=recipe)
+    deleted = []
+
+    def record(sender, instance, **kwargs):
+        deleted.append((instance.ingredient_id, accounted(instance)))
+
+    post_delete.connect(record, sender=IngredientForRecipe)
+    try:
+        response = client_for(users[0]).patch(
+            f'/api/recipes/{recipe.pk}/', {
+                'name': recipe.name, 'text': recipe.text, 'cooking_time': 5,
+                'tags': [tags[0].pk],
+                'ingredients': [{'id': ingredients[4].pk, 'amount': 10}]},
+            format='json')
+    finally:
+        post_delete.disconnect(record, sender=IngredientForRecipe)
+    assert response.status_code == 200, response.content
+    assert sorted(deleted) == [(ingredients[number].pk, True)
+                               for number in range(4)]
+    assert stored_totals() == live_totals()
+
+
+@pytest.mark.parametrize('author, expected', ((True, 200), (False, 403)),
+                         ids=('author', 'stranger'))
+def test_only_author_replaces_recipe(users, tags, ingredients, make_recipe,
+                                     client_for, author, expected):
+    recipe = make_recipe(users[0])
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 24)).save(buffer, 'PNG')
+    response = client_for(users[0] if author else users[1]).put(
+        f'/api/recipes/{recipe.pk}/', {
+            'name': 'Новое название', 'text': recipe.text,
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(buffer.getvalue()).decode(),
+            'cooking_time': 5, 'tags': [tags[2].pk],
+            'ingredients': [{'id': ingredients[3].pk, 'amount': 4}]},
+        format='json')
+    assert response.status_code == expected, response.content
+    recipe.refresh_from_db()
+    assert (recipe.name == 'Новое название') is author
+    assert list(recipe.tags.all()) == ([tags[2]] if author else tags[:2])
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+from api import renderers
+
+pytest.importorskip('orjson')
+
+DATA = {'count': 2, 'results': [
+    renderers.Fragment(b'{"id":1,"name":"\\u0441"}'),
+    renderers.Fragment(b'[1,2.5,null]'),
+]}
+
+
+@pytest.mark.parametrize('fragments', (True, False),
+                         ids=('orjson fragments', 'older orjson'))
+def test_fragments_render_as_the_stdlib_encoder(monkeypatch, fragments):
+    if not fragments:
+        monkeypatch.setattr(renderers, 'orjson_fragment', None)
+    rendered = renderers.ORJSONRenderer().render(DATA)
+    assert json.loads(rendered) == json.loads(
+        json.dumps(DATA, cls=renderers.FragmentEncoder))
+
+
+def test_ingredient_list_renders_without_orjson_fragments(
+        monkeypatch, ingredients, client_for):
+    monkeypatch.setattr(renderers, 'orjson_fragment', None)
+    response = client_for().get('/api/ingredients/', {'name': 'с'})
+    assert response.status_code == 200
+    assert {ingredient['name'] for ingredient in response.json()} == {
+        'соль', 'сахар', 'сыр'}
@@ -0,0 +1,89 @@
+import pytest
+from app.models import Favorite
+from app.search import index_recipes
+from django.db import connection
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor not in ('postgresql', 'sqlite'),
+    reason='no full-text index on this database')
+
+
+def search(client, value, **params):
+    return client.get('/api/recipes/', {'search': value, **params})
+
+
+def test_best_match_is_first_however_old(users, make_recipe, client_for):
+    best = make_recipe(
+        users[1], name='Шафрановый плов',
+        text='Плов с шафраном: шафран замачивают, шафран добавляют.')
+    for number in range(5):
+        make_recipe(users[1], name=f'Суп {number}',
+                    text=f'Много разных слов, среди них шафран {number}.')
+    index_recipes()
+    results = search(client_for(), 'шафран').json()
+    assert results['count'] == 6
+    assert results['results'][0]['id'] == best.pk
+
+
+def test_cursor_is_refused_for_search(users, make_recipe, client_for):
+    make_recipe(users[1], name='Плов')
+    index_recipes()
+    response = search(client_for(), 'плов', pagination='cursor')
+    assert response.status_code == 400
+    assert search(client_for(), 'плов').status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_renamed_ingredient_is_reindexed(users, make_recipe, ingredients,
+                                         client_for):
+    recipe = make_recipe(users[1], name='Каша', ingredient_count=1)
+    index_recipes()
+    ingredient = ingredients[0]
+    ingredient.name = 'шафран'
+    ingredient.save()
+    results = search(client_for(), 'шафран').json()['results']
+    assert [found['id'] for found in results] == [recipe.pk]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deleted_ingredient_is_unindexed(users, make_recipe, ingredients,
+                                         client_for):
+    make_recipe(users[1], name='Каша', ingredient_count=1)
+    index_recipes()
+    name = ingredients[0].name
+    assert search(client_for(), name).json()['count'] == 1
+    ingredients[0].delete()
+    assert search(client_for(), name).json()['count'] == 0
+
+
+def test_only_newest_candidates_are_ranked(settings, users, make_recipe,
+                                           client_for):
+    settings.SEARCH_CANDIDATES = 3
+    make_recipe(users[1], name='Шафран шафран шафран')
+    recipes = [make_recipe(users[1], name=f'Суп {number}',
+                           text='Суп с шафраном.') for number in range(4)]
+    index_recipes()
+    results = search(client_for(), 'шафран').json()
+    assert results['count'] == 3
+    assert sorted(found['id'] for found in results['results']) == sorted(
+        recipe.pk for recipe in recipes[1:])
+
+
+def test_candidates_keep_earlier_filters(settings, users, tags, make_recipe,
+                                         client_for):
+    settings.SEARCH_CANDIDATES = 2
+    tagged = make_recipe(users[1], name='шафран', tag_count=1)
+    for number in range(3):
+        make_recipe(users[1], name=f'шафран {number}', tag_count=0)
+    index_recipes()
+    results = search(client_for(), 'шафран', tags=tags[0].slug).json()
+    assert [found['id'] for found in results['results']] == [tagged.pk]
+
+
+def test_search_joins_other_filters(users, make_recipe, client_for):
+    favorite = make_recipe(users[1], name='шафран')
+    make_recipe(users[1], name='шафран и рис')
+    Favorite.objects.create(user=users[0], recipe=favorite)
+    index_recipes()
+    results = search(client_for(users[0]), 'шафран', is_favorited=1).json()
+    assert [found['id'] for found in results['results']] == [favorite.pk]
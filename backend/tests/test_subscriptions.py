@@ -0,0 +1,57 @@
+import warnings
+
+import pytest
+from app.models import Follow
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.fixture
+def subscriptions(users, make_recipe):
+    """user0 follows the others, who have 1, 4 and 6 recipes."""
+    recipes = {}
+    for author, count in zip(users[1:], (1, 4, 6)):
+        Follow.objects.create(user=users[0], author=author)
+        recipes[author.pk] = [
+            make_recipe(author, name=f'Рецепт {number}').pk
+            for number in range(count)][::-1]
+    return recipes
+
+
+@pytest.mark.parametrize('limit', (None, 0, 1, 3, 10))
+def test_preview_holds_latest_recipes(subscriptions, users, client_for,
+                                      limit):
+    params = {} if limit is None else {'recipes_limit': limit}
+    response = client_for(users[0]).get('/api/users/subscriptions/', params)
+    assert response.status_code == 200
+    for author in response.json()['results']:
+        latest = subscriptions[author['id']]
+        assert author['recipes_count'] == len(latest)
+        assert [recipe['id'] for recipe in author['recipes']] == (
+            latest[:limit] if limit is not None else latest)
+
+
+def test_preview_reads_authors_on_page_only(subscriptions, users,
+                                            client_for):
+    with CaptureQueriesContext(connection) as queries:
+        response = client_for(users[0]).get(
+            '/api/users/subscriptions/', {'limit': 1, 'recipes_limit': 2})
+    author = response.json()['results'][0]['id']
+    preview = [query['sql'] for query in queries
+               if 'LIMIT 2' in query['sql']]
+    assert len(preview) == 1
+    assert f'"author_id" IN ({author})' in preview[0]
+
+
+def test_pages_follow_author_ids(subscriptions, users, client_for):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        pages = [client_for(users[0]).get('/api/users/subscriptions/', {
+            'limit': 2, 'page': page}).json()['results']
+            for page in (1, 2)]
+    assert [author['id'] for page in pages for author in page] == sorted(
+        subscriptions)
+    assert not [warning for warning in caught
+                if issubclass(warning.category, UnorderedObjectListWarning)
+                or 'Meta.ordering' in str(warning.message)]
@@ -0,0 +1,90 @@
+import pytest
+from app.models import IngredientForRecipe, Recipe
+from app.versions import current_instance_versions, current_version
+from django.test import override_settings
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def recipe(users, make_recipe):
+    return make_recipe(users[0], ingredient_count=3)
+
+
+@pytest.fixture
+def edit(recipe, tags, ingredients, client_for):
+    """PATCH the recipe with the fields it has, changed by overrides."""
+    def patch(**overrides):
+        data = {
+            'name': recipe.name, 'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'tags': [tag.pk for tag in tags[:2]],
+            'ingredients': [{'id': ingredient.pk, 'amount': number + 1}
+                            for number, ingredient
+                            in enumerate(ingredients[:3])],
+            **overrides,
+        }
+        response = client_for(recipe.author).patch(
+            f'/api/recipes/{recipe.pk}/', data, format='json')
+        assert response.status_code == 200, response.content
+    return patch
+
+
+def stamps(recipe):
+    return current_version(Recipe), list(current_instance_versions(
+        Recipe, [recipe.pk]).values())[0]
+
+
+def rows(ingredients, *amounts):
+    return [{'id': ingredient.pk, 'amount': amount}
+            for ingredient, amount in zip(ingredients, amounts) if amount]
+
+
+CHANGES = {
+    'unchanged': (lambda tags, ingredients: {}, False),
+    'amount': (lambda tags, ingredients: {
+        'ingredients': rows(ingredients, 5, 2, 3)}, False),
+    'name': (lambda tags, ingredients: {'name': 'Другое название'}, True),
+    'cooking time': (lambda tags, ingredients: {'cooking_time': 90}, True),
+    'tags': (lambda tags, ingredients: {'tags': [tags[2].pk]}, True),
+    'ingredients': (lambda tags, ingredients: {
+        'ingredients': rows(ingredients, 1, 0, 0, 2)}, True),
+}
+
+
+@pytest.mark.parametrize('change', CHANGES)
+def test_only_listed_changes_outdate_lists(recipe, tags, ingredients, edit,
+                                           change):
+    overrides, listed = CHANGES[change]
+    model, instance = stamps(recipe)
+    edit(**overrides(tags, ingredients))
+    new_model, new_instance = stamps(recipe)
+    assert new_instance != instance
+    assert (new_model != model) is listed
+
+
+def test_new_and_deleted_recipes_outdate_lists(recipe, users, make_recipe):
+    model, _ = stamps(recipe)
+    make_recipe(users[1])
+    assert current_version(Recipe) != model
+    model = current_version(Recipe)
+    recipe.delete()
+    assert current_version(Recipe) != model
+
+
+def test_row_edits_outdate_lists_by_ingredient(recipe, ingredients):
+    row = IngredientForRecipe.objects.filter(recipe=recipe).first()
+    model, _ = stamps(recipe)
+    row.amount += 1
+    row.save()
+    assert current_version(Recipe) == model
+    row.ingredient = ingredients[7]
+    row.save()
+    assert current_version(Recipe) != model
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+def test_unreachable_cache_gives_new_stamps(recipe):
+    model, row = stamps(recipe)
+    assert stamps(recipe) > (model, row)
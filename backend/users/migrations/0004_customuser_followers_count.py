@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_followers(apps, schema_editor):
+    follows = apps.get_model('app', 'Follow').objects.filter(
+        author=OuterRef('pk')).order_by().values('author').annotate(
+            count=Count('pk')).values('count')
+    apps.get_model('users', 'CustomUser').objects.update(
+        followers_count=Coalesce(Subquery(follows), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_auto_20220202_1658'),
+        ('app', '0014_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='followers_count'),
+        ),
+        migrations.RunPython(count_followers, migrations.RunPython.noop),
+    ]
@@ -60,6 +60,8 @@ class CustomUser(AbstractUser):
         verbose_name='role'
     )
     is_admin = models.BooleanField(default=False)
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='followers_count')
     objects = MyUserManager()
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']